@@ -1,14 +1,53 @@
 from abc import ABC, abstractmethod
 from typing import Any
 
+from sample_format import SampleFormat
+
 
 class AudioBackend(ABC):
     def __init__(self, samplerate: int, buffersize: int) -> None:
         self.samplerate: int = samplerate
         self.buffersize: int = buffersize
+        self.sample_format: SampleFormat = SampleFormat.INT16_STEREO
+
+    # Sample formats write accepts
+    def get_sample_formats(self) -> list[SampleFormat]:
+        return [SampleFormat.INT16_STEREO]
 
     @abstractmethod
-    def write(self, data: bytes) -> None:
+    def write(self, data: bytes | memoryview) -> None:
+        pass
+
+    # Seconds until data written now is heard
+    def get_latency(self) -> float:
+        return 0.0
+
+    # Make a blocked write or drain return early, called from other threads
+    def interrupt(self) -> None:
+        pass
+
+    # Let writes block again after interrupt
+    def clear_interrupt(self) -> None:
+        pass
+
+    # Wait until all written data has been played
+    def drain(self) -> None:
+        pass
+
+    # Stop and continue playback without dropping written data, writes don't
+    # start playback while paused
+    def pause(self) -> None:
+        pass
+
+    def resume(self) -> None:
+        pass
+
+    # Drop written data that has not been played yet
+    def flush(self) -> None:
+        pass
+
+    # Release the output device, for backends that outlive a single song
+    def close(self) -> None:
         pass
 
     @abstractmethod
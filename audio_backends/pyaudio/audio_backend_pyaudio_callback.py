@@ -0,0 +1,274 @@
+import contextlib
+import ctypes
+import threading
+from typing import Optional
+
+from loguru import logger
+from pyaudio import PyAudio, Stream, paContinue, paFloat32, paInt16
+
+from audio_backends.audio_backend import AudioBackend
+from audio_backends.ring_buffer import RingBuffer
+from sample_format import SampleFormat
+
+
+# PyAudio backend in callback mode, the player thread fills a ring buffer ahead
+# of playback and PortAudio pulls from it, so rendering hiccups shorter than the
+# buffered time don't cause underruns
+#
+# The backend is meant to live as long as the application: PortAudio stays
+# initialized and the stream is only reopened when the output format changes.
+class AudioBackendPyAudioCallback(AudioBackend):
+    def __init__(
+        self,
+        samplerate: int = 48000,
+        buffersize: int = 1024,
+        ahead_ms: int = 250,
+        sample_format: SampleFormat = SampleFormat.INT16_STEREO,
+    ) -> None:
+        self.samplerate: int = samplerate
+        self.buffersize: int = buffersize
+        self.ahead_ms: int = ahead_ms
+        self.sample_format: SampleFormat = sample_format
+
+        self.frame_size: int = sample_format.frame_size
+        self.allocate_output()
+        self.ring = RingBuffer(self.ring_capacity())
+
+        # Set by the callback whenever it made room in the ring, and by resume,
+        # pause and interrupt, waiting writes and drains block on it
+        self.space_available = threading.Event()
+
+        # Set to make a waiting write or drain give up
+        self.interrupted = threading.Event()
+
+        self.underruns: int = 0
+
+        # The stream is started and stopped from the player thread and, for
+        # pausing, from the GUI thread
+        self.stream_lock = threading.Lock()
+        self.started: bool = False
+        self.paused: bool = False
+
+        with contextlib.redirect_stdout(None):
+            self.p: PyAudio = PyAudio()
+
+        try:
+            self.max_channels: int = int(
+                self.p.get_default_output_device_info()["maxOutputChannels"]
+            )
+        except IOError:
+            self.max_channels = 2
+
+        self.stream: Optional[Stream] = None
+        self.open_stream()
+
+    def ring_capacity(self) -> int:
+        # Keep at least two callback periods buffered
+        ahead_frames = max(
+            self.samplerate * self.ahead_ms // 1000, self.buffersize * 2
+        )
+        return ahead_frames * self.frame_size
+
+    # Output handed to PortAudio in every callback, PyAudio only takes buffers
+    # that need no release, which rules out bytearray but not ctypes arrays
+    def allocate_output(self) -> None:
+        size = self.buffersize * self.frame_size
+        self.buffer = (ctypes.c_char * size)()
+        self.buffer_view = memoryview(self.buffer).cast("B")
+        self.silence = memoryview(bytes(size))
+
+    def open_stream(self) -> None:
+        with contextlib.redirect_stdout(None):
+            self.stream = self.p.open(
+                format=paFloat32 if self.sample_format.is_float else paInt16,
+                channels=self.sample_format.channels,
+                rate=self.samplerate,
+                output=True,
+                frames_per_buffer=self.buffersize,
+                stream_callback=self.callback,
+                start=False,
+            )
+        self.started = False
+
+        logger.debug(
+            "PyAudio callback AudioBackend opened stream with samplerate: {}, buffersize: {}, ahead: {} ms, format: {}",
+            self.samplerate,
+            self.buffersize,
+            self.ahead_ms,
+            self.sample_format.name,
+        )
+
+    def close_stream(self) -> None:
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        self.started = False
+
+    # PortAudio converts float samples itself, quad needs a device with enough channels
+    def get_sample_formats(self) -> list[SampleFormat]:
+        return [f for f in SampleFormat if f.channels <= self.max_channels]
+
+    # Apply new settings, the stream is only reopened if they actually changed
+    def configure(
+        self,
+        samplerate: int,
+        buffersize: int,
+        ahead_ms: int,
+        sample_format: SampleFormat = SampleFormat.INT16_STEREO,
+    ) -> None:
+        if (
+            self.stream
+            and samplerate == self.samplerate
+            and buffersize == self.buffersize
+            and ahead_ms == self.ahead_ms
+            and sample_format == self.sample_format
+        ):
+            return
+
+        self.close_stream()
+
+        self.samplerate = samplerate
+        self.buffersize = buffersize
+        self.ahead_ms = ahead_ms
+        self.sample_format = sample_format
+        self.frame_size = sample_format.frame_size
+        self.allocate_output()
+        self.ring = RingBuffer(self.ring_capacity())
+
+        self.open_stream()
+
+    # Called from the PortAudio thread, must not block
+    def callback(self, in_data, frame_count, time_info, status):
+        # The stream is opened with frames_per_buffer, so frame_count always
+        # matches the buffer
+        out = self.buffer_view
+        count = self.ring.read_into(out)
+
+        if count < len(out):
+            # Silence instead of what was played last time
+            out[count:] = self.silence[count:]
+            self.underruns += 1
+
+        self.space_available.set()
+
+        # PyAudio copies the data before this returns, the buffer is reused
+        return self.buffer, paContinue
+
+    # Data is copied straight into the ring, memoryviews are not copied before
+    def write(self, data: bytes | memoryview) -> None:
+        if not self.stream:
+            self.open_stream()
+
+        data = memoryview(data).cast("B")
+
+        while len(data) > 0 and not self.interrupted.is_set():
+            self.space_available.clear()
+            count = self.ring.write(data)
+
+            if count == 0:
+                # Ring is full, playback can start now that it is primed
+                if not self.started:
+                    self.start()
+
+                # No callbacks while paused, only resume or interrupt wake this
+                self.space_available.wait()
+            else:
+                data = data[count:]
+
+    # Does nothing while paused, resume starts the stream again
+    def start(self) -> None:
+        with self.stream_lock:
+            if self.stream and not self.started and not self.paused:
+                self.stream.start_stream()
+                self.started = True
+
+    # Stop playback right away, buffered data is kept for resume
+    def pause(self) -> None:
+        with self.stream_lock:
+            self.paused = True
+
+            if self.stream and self.started:
+                self.stream.stop_stream()
+                self.started = False
+
+        # A waiting write or drain checks again and then waits for resume
+        self.space_available.set()
+
+    def resume(self) -> None:
+        with self.stream_lock:
+            self.paused = False
+
+        # Otherwise write starts the stream once the ring is primed
+        if self.ring.available() > 0:
+            self.start()
+
+        self.space_available.set()
+
+    # Buffered data still to be played plus PortAudio's own latency
+    def get_latency(self) -> float:
+        latency = self.ring.available() / self.frame_size / self.samplerate
+
+        if self.stream and self.started:
+            latency += self.stream.get_output_latency()
+        return latency
+
+    # Wait until everything written so far has been played
+    def drain(self) -> None:
+        if not self.stream:
+            return
+
+        if not self.started:
+            self.start()
+
+        while True:
+            # Cleared before checking, so a wake up in between isn't missed
+            self.space_available.clear()
+
+            if (
+                self.ring.available() == 0
+                or not (self.paused or self.stream.is_active())
+                or self.interrupted.is_set()
+            ):
+                break
+
+            self.space_available.wait()
+
+        # Let PortAudio play out its own buffers too
+        self.interrupted.wait(self.stream.get_output_latency())
+
+    def interrupt(self) -> None:
+        self.interrupted.set()
+        self.space_available.set()
+
+    def clear_interrupt(self) -> None:
+        self.interrupted.clear()
+
+    # Drop everything not played yet, used on track changes and seeks, the
+    # stream starts again once the ring is primed with new data
+    def flush(self) -> None:
+        with self.stream_lock:
+            if self.stream and self.started:
+                self.stream.stop_stream()
+                self.started = False
+
+        self.ring.clear()
+
+    def stop(self) -> None:
+        self.flush()
+        self.paused = False
+
+        if self.underruns:
+            logger.debug("PyAudio callback AudioBackend had {} underruns", self.underruns)
+            self.underruns = 0
+
+        logger.debug("PyAudio callback AudioBackend stopped")
+
+    # Release the stream and PortAudio, only on shutdown
+    def close(self) -> None:
+        self.close_stream()
+        self.p.terminate()
+        logger.debug("PyAudio callback AudioBackend closed")
+
+    def get_buffer(self) -> ctypes.Array:
+        return self.buffer
@@ -4,12 +4,14 @@ from loguru import logger
 from pyaudio import PyAudio, Stream, get_format_from_width
 
 from audio_backends.audio_backend import AudioBackend
+from sample_format import SampleFormat
 
 
 class AudioBackendPyAudio(AudioBackend):
     def __init__(self, samplerate: int = 48000, buffersize: int = 1024) -> None:
         self.samplerate: int = samplerate
         self.buffersize: int = buffersize
+        self.sample_format: SampleFormat = SampleFormat.INT16_STEREO
         self.buffer: bytes = bytes(self.buffersize * 2 * 2)
 
         with contextlib.redirect_stdout(None):
@@ -27,7 +29,10 @@ class AudioBackendPyAudio(AudioBackend):
             buffersize,
         )
 
-    def write(self, data: bytes) -> None:
+    def write(self, data: bytes | memoryview) -> None:
+        # PyAudio only takes read-only buffers
+        if isinstance(data, memoryview):
+            data = data.tobytes()
         self.stream.write(data)
 
     def stop(self) -> None:
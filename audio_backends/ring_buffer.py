@@ -0,0 +1,60 @@
+# Single producer/single consumer byte ring buffer
+#
+# The producer only ever advances write_pos and the consumer only ever advances
+# read_pos, both are plain ints that keep counting up, so no lock is needed
+# between the player thread and the audio callback.
+class RingBuffer:
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = capacity
+        self.data = bytearray(capacity)
+        self.view = memoryview(self.data)
+        self.write_pos: int = 0
+        self.read_pos: int = 0
+
+    def available(self) -> int:
+        return self.write_pos - self.read_pos
+
+    def free(self) -> int:
+        return self.capacity - (self.write_pos - self.read_pos)
+
+    # Copy as much of data as fits, returns the number of bytes written
+    def write(self, data) -> int:
+        data = memoryview(data).cast("B")
+        count = min(len(data), self.free())
+
+        if count == 0:
+            return 0
+
+        start = self.write_pos % self.capacity
+        first = min(count, self.capacity - start)
+
+        self.view[start : start + first] = data[:first]
+
+        if first < count:
+            self.view[: count - first] = data[first:count]
+
+        # Publish only after the data is in place
+        self.write_pos += count
+        return count
+
+    # Fill out with buffered data, returns the number of bytes copied
+    def read_into(self, out: memoryview) -> int:
+        count = min(len(out), self.available())
+
+        if count == 0:
+            return 0
+
+        start = self.read_pos % self.capacity
+        first = min(count, self.capacity - start)
+
+        out[:first] = self.view[start : start + first]
+
+        if first < count:
+            out[first:count] = self.view[: count - first]
+
+        self.read_pos += count
+        return count
+
+    # Drop all buffered data, only safe while the consumer is not running
+    def clear(self) -> None:
+        self.read_pos = self.write_pos
@@ -0,0 +1,104 @@
+import os
+import threading
+
+from loguru import logger
+
+from player_backends.player_backend import PlayerBackend
+
+
+# Decides in which order player backends should try to load a file, based on
+# the backends' header probes and on what worked before, so a file doesn't
+# have to go through a full failing load in every other backend first
+class BackendProbe:
+    log_prefix = "[BackendProbe] "
+
+    # Enough for libopenmpt's recommended probe size and UADE's file magic
+    header_size = 8192
+
+    def __init__(self, player_backends: dict[str, type[PlayerBackend]]) -> None:
+        self.player_backends = player_backends
+        self.lock = threading.Lock()
+
+        # Backend order per file identity (path, mtime, size)
+        self.orders: dict[tuple[str, int, int], list[str]] = {}
+
+        # Backend that last loaded a file, per file identity and per extension
+        self.verdicts: dict[tuple[str, int, int], str] = {}
+        self.extension_verdicts: dict[str, str] = {}
+
+    def file_identity(self, filename: str) -> tuple[str, int, int]:
+        stat = os.stat(filename)
+        return (filename, stat.st_mtime_ns, stat.st_size)
+
+    # Backend names to try for filename, most promising first
+    def order(self, filename: str, preferred: str = "") -> list[str]:
+        try:
+            identity = self.file_identity(filename)
+        except OSError:
+            return list(self.player_backends)
+
+        with self.lock:
+            verdict = self.verdicts.get(identity)
+            order = self.orders.get(identity)
+
+        if order is None:
+            order = self.probe(filename, identity[2])
+
+            with self.lock:
+                self.orders[identity] = order
+
+        # Known good backends go first
+        for name in (preferred, verdict):
+            if name and name in self.player_backends:
+                order = [name] + [n for n in order if n != name]
+
+        return order
+
+    def probe(self, filename: str, filesize: int) -> list[str]:
+        try:
+            with open(filename, "rb") as f:
+                header = f.read(self.header_size)
+        except OSError:
+            return list(self.player_backends)
+
+        recognized: list[str] = []
+        undecided: list[str] = []
+
+        for name, backend_class in self.player_backends.items():
+            try:
+                result = backend_class.probe(header, filename, filesize)
+            except Exception as e:
+                logger.warning(f"{self.log_prefix}Probing {filename} with {name} failed: {e}")
+                result = None
+
+            if result:
+                recognized.append(name)
+            elif result is None:
+                undecided.append(name)
+
+        # Among undecided backends, prefer the one that handled this extension before
+        with self.lock:
+            extension_verdict = self.extension_verdicts.get(
+                os.path.splitext(filename)[1].lower()
+            )
+
+        if extension_verdict in undecided:
+            undecided.remove(extension_verdict)
+            undecided.insert(0, extension_verdict)
+
+        logger.debug(
+            f"{self.log_prefix}{filename}: recognized by {recognized}, undecided {undecided}"
+        )
+
+        return recognized + undecided
+
+    # Remember which backend actually loaded filename
+    def remember(self, filename: str, backend_name: str) -> None:
+        try:
+            identity = self.file_identity(filename)
+        except OSError:
+            return
+
+        with self.lock:
+            self.verdicts[identity] = backend_name
+            self.extension_verdicts[os.path.splitext(filename)[1].lower()] = backend_name
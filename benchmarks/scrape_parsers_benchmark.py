@@ -0,0 +1,61 @@
+# Benchmark of the scraping parsers over saved result pages
+#
+# Usage: python benchmarks/scrape_parsers_benchmark.py [iterations]
+#
+# If BeautifulSoup with html5lib is installed, the previous parsing approach
+# is timed as well for comparison.
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scrape_parsers import parse_modarchive, parse_modland, parse_msm
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load(name: str) -> bytes:
+    with open(os.path.join(fixtures, name), "rb") as f:
+        return f.read()
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    modland = load("modland_search.html")
+    msm = load("msm_module.html")
+    modarchive = load("modarchive_search.xml")
+
+    # Make sure the fixtures still parse as expected
+    assert parse_modland(modland, "Author") == "Jester"
+    assert parse_msm(msm)["name"] == "elysium.mod"
+    assert len(parse_msm(msm)["urls"]) == 3
+    assert parse_modarchive(modarchive) == (1, "Jester")
+
+    cases = [
+        ("modland", lambda: parse_modland(modland, "Author")),
+        ("msm", lambda: parse_msm(msm)),
+        ("modarchive", lambda: parse_modarchive(modarchive)),
+    ]
+
+    try:
+        from bs4 import BeautifulSoup
+
+        BeautifulSoup("", "html5lib")
+    except Exception:
+        print("BeautifulSoup/html5lib not installed, skipping comparison")
+    else:
+        cases += [
+            ("modland (html5lib)", lambda: BeautifulSoup(modland, "html5lib")),
+            ("msm (html5lib)", lambda: BeautifulSoup(msm, "html5lib")),
+        ]
+
+    for name, case in cases:
+        seconds = timeit.timeit(case, number=iterations)
+        print(f"{name:20} {seconds / iterations * 1e6:10.1f} us per page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# Benchmark of the credits extraction in songinfo
+#
+# Usage: python benchmarks/songinfo_benchmark.py [module directory] [iterations]
+#
+# Without a module directory the parsers are timed on generated ProTracker,
+# DigiBooster and custom modules. With a directory every file in it is
+# identified once with uade_filemagic, then the parsing of the credits for the
+# file is timed on the data process_module reads for it.
+
+import os
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from player_backends.libuade import songinfo
+from player_backends.libuade.songinfo import Credits
+
+
+def empty_credits(filename: str = "") -> Credits:
+    return {
+        "song_title": "",
+        "max_positions": 0,
+        "instruments": [],
+        "modulename": "",
+        "authorname": "",
+        "specialinfo": "",
+        "file_name": filename,
+        "file_length": "",
+        "file_prefix": "",
+    }
+
+
+# 31 instrument ProTracker module with a sample data tail of padding bytes
+def ptk_module(padding: int) -> bytes:
+    header = bytearray(b"benchmark song".ljust(20, b"\x00"))
+
+    for i in range(31):
+        header += songinfo.PTK_INSTRUMENT.pack(
+            f"instrument {i + 1}".encode(), 0x1000, 0, 64, 0, 1
+        )
+
+    header += bytes([64, 127]) + bytes(128) + b"M.K."
+    return bytes(header) + bytes(1024) + b"\x55" * padding
+
+
+def digi_module(padding: int) -> bytes:
+    buf = bytearray(songinfo.DIGI_NAMES_OFFSET + 0x30 * songinfo.DIGI_NAME_LENGTH)
+    buf[:20] = b"DIGI Booster module\x00"
+    buf[47] = 12
+
+    for i in range(songinfo.DIGI_INSTRUMENTS):
+        struct.pack_into(">I", buf, songinfo.DIGI_SIZES_OFFSET + i * 4, 0x2000)
+        buf[songinfo.DIGI_VOLUMES_OFFSET + i] = 64
+        name = f"instrument {i + 1}".encode()
+        offset = songinfo.DIGI_NAMES_OFFSET + i * songinfo.DIGI_NAME_LENGTH
+        buf[offset : offset + len(name)] = name
+
+    title = b"benchmark song"
+    offset = songinfo.DIGI_TITLE_OFFSET
+    buf[offset : offset + len(title)] = title
+    return bytes(buf) + b"\x55" * padding
+
+
+# Custom module with the start pattern and tag table after a block of code
+def custom_module(padding: int) -> bytes:
+    code = struct.pack(">I", 0x3F3) + b"\x4e\x71" * (padding // 2)
+    hunk = bytearray(b"\x70\xff\x4e\x75" + b"DELIRIUM")
+    hunk += struct.pack(">I", 64)
+    hunk += b"$VER: benchmark 1.0\x00"
+    hunk = hunk.ljust(64, b"\x00")
+    hunk += struct.pack(">IIII", 0x8000445A, 96, 0, 0)
+    hunk = hunk.ljust(96, b"\x00")
+    hunk += b"benchmark author\x00"
+    return code + bytes(hunk)
+
+
+def generated_cases() -> list[tuple[str, object]]:
+    cases = []
+
+    for size in (1 << 16, 1 << 20):
+        ptk = ptk_module(size)
+        digi = digi_module(size)
+        custom = custom_module(size)
+
+        # Make sure the generated modules still parse as expected
+        credits = empty_credits()
+        songinfo.process_ptk_mod(credits, 31, ptk)
+        assert credits["song_title"] == "benchmark song"
+        assert len(credits["instruments"]) == 31
+        assert credits["instruments"][0]["size"] == 0x2000
+
+        credits = empty_credits()
+        songinfo.process_digi_mod(credits, digi)
+        assert credits["song_title"] == "benchmark song"
+        assert credits["instruments"][30]["name"] == "instrument 31"
+
+        credits = empty_credits()
+        songinfo.process_custom(credits, custom)
+        assert credits["specialinfo"] == "benchmark 1.0"
+        assert credits["authorname"] == "benchmark author"
+
+        cases += [
+            (
+                f"ptk {size >> 10} KiB",
+                lambda ptk=ptk: songinfo.process_ptk_mod(empty_credits(), 31, ptk),
+            ),
+            (
+                f"digi {size >> 10} KiB",
+                lambda digi=digi: songinfo.process_digi_mod(empty_credits(), digi),
+            ),
+            (
+                f"custom {size >> 10} KiB",
+                lambda custom=custom: songinfo.process_custom(empty_credits(), custom),
+            ),
+        ]
+    return cases
+
+
+def corpus_cases(directory: str) -> list[tuple[str, object]]:
+    cases = []
+
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        if not entry.is_file():
+            continue
+
+        # Same reads as songinfo.process_module, the header first and the
+        # whole file only for formats that need it
+        buf = songinfo.read_header(entry.path)
+
+        if not buf:
+            continue
+
+        prefix = songinfo.file_prefix(buf, entry.path, entry.stat().st_size)
+
+        if prefix not in songinfo.HEADER_PREFIXES:
+            with open(entry.path, "rb") as f:
+                buf = f.read()
+
+        try:
+            songinfo.parse_credits(empty_credits(entry.path), prefix, buf)
+        except ValueError as e:
+            print(f"Skipping {entry.name} ({prefix}): {e}")
+            continue
+
+        cases.append(
+            (
+                f"{entry.name} ({prefix})",
+                lambda prefix=prefix, buf=buf, path=entry.path: songinfo.parse_credits(
+                    empty_credits(path), prefix, buf
+                ),
+            )
+        )
+    return cases
+
+
+def main() -> None:
+    directory = sys.argv[1] if len(sys.argv) > 1 else ""
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    cases = corpus_cases(directory) if directory else generated_cases()
+    total = 0.0
+
+    for name, case in cases:
+        seconds = timeit.timeit(case, number=iterations)
+        total += seconds
+        print(f"{name:40} {seconds / iterations * 1e6:10.1f} us per module")
+
+    if cases:
+        print(f"{'average':40} {total / iterations / len(cases) * 1e6:10.1f} us per module")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
 import configparser
 import glob
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 
 from loguru import logger
 from platformdirs import user_config_dir
 from PySide6 import QtCore
 
-from playlist import PlaylistTreeView
+from playlist import PlaylistExport, PlaylistModel, PlaylistTreeView
+from playlist_file import (
+    PLAYLIST_EXTENSION,
+    playlist_id_from_filename,
+    write_playlist,
+)
+
+
+def playlist_filenames(directory: str, extension: str) -> list[str]:
+    filenames = glob.glob(os.path.join(directory, "playlist-*" + extension))
+
+    return sorted(filenames, key=playlist_id_from_filename)
 
 
 class ConfigManager:
@@ -17,6 +30,9 @@ class ConfigManager:
         self.config = configparser.ConfigParser()
         self.settings = QtCore.QSettings(appauthor, appname)
 
+        # Playlists are written in the background, one at a time
+        self.saver = ThreadPoolExecutor(max_workers=1)
+
     def read_config(self, main_window) -> None:
         self.config["window"] = {}
         self.config["files"] = {}
@@ -30,26 +46,62 @@ class ConfigManager:
             int(window_config.get("height", "600")),
         )
 
-        playlist_filenames = glob.glob(
-            os.path.join(user_config_dir(self.appname), "playlist-*.json")
-        )
-        playlist_filenames.sort()
+        filenames = playlist_filenames(user_config_dir(self.appname), PLAYLIST_EXTENSION)
+
+        if not filenames:
+            # Migrate playlists from the old jsonpickle format
+            filenames = playlist_filenames(user_config_dir(self.appname), ".json")
+
+        # Restore tab order, files are named by playlist id
+        tab_order = [
+            int(playlist_id)
+            for playlist_id in files_config.get("tab_order", "").split(",")
+            if playlist_id.isnumeric()
+        ]
+
+        def tab_position(filename: str) -> tuple[int, int]:
+            playlist_id = playlist_id_from_filename(filename)
 
-        if len(playlist_filenames) > 0:
-            for playlist_filename in playlist_filenames:
+            if playlist_id in tab_order:
+                return (tab_order.index(playlist_id), playlist_id)
+            return (len(tab_order), playlist_id)
+
+        filenames.sort(key=tab_position)
+
+        current_tab_index = int(files_config.get("current_tab", "0"))
+        current_item_row = int(files_config.get("current_item", "0"))
+
+        if len(filenames) > 0:
+            for t, playlist_filename in enumerate(filenames):
                 try:
-                    main_window.load_playlist_as_tab(playlist_filename)
-                except Exception as e:
-                    logger.error(
-                        f"{main_window.log_prefix}Error while loading playlist {playlist_filename}: {e}"
+                    # Only the current tab is loaded right away
+                    main_window.load_playlist_as_tab(
+                        playlist_filename, lazy=t != current_tab_index
                     )
-                    main_window.add_tab("Default")
+                except Exception as e:
+                    message = f"Error while loading playlist {playlist_filename}: {e}"
+                    logger.error(f"{main_window.log_prefix}{message}")
+
+                    # The placeholder keeps the playlist id, so the file is neither
+                    # overwritten nor removed as obsolete
+                    playlist_id = playlist_id_from_filename(playlist_filename)
+                    tabs = [
+                        tab
+                        for tab in main_window.get_tabs()
+                        if tab.playlist_id == playlist_id
+                    ]
+
+                    if tabs:
+                        tab = tabs[0]
+                    else:
+                        tab = main_window.add_tab(
+                            os.path.basename(playlist_filename), playlist_id
+                        )
+
+                    main_window.mark_tab_failed(tab, message)
         else:
             main_window.add_tab("Default")
 
-        current_tab_index = int(files_config.get("current_tab", "0"))
-        current_item_row = int(files_config.get("current_item", "0"))
-
         if current_tab_index >= 0:
             main_window.playlist_tabs.setCurrentIndex(current_tab_index)
 
@@ -87,17 +139,73 @@ class ConfigManager:
             for c in range(current_tab.model().columnCount()):
                 window_config[f"col{str(c)}_width"] = str(current_tab.columnWidth(c))
 
+        files_config["tab_order"] = ",".join(
+            str(tab.playlist_id) for tab in main_window.get_tabs()
+        )
+
         with open(
             os.path.join(user_config_dir(self.appname), "config.ini"), "w"
         ) as config_file:
             self.config.write(config_file)
 
-        existing_playlists = glob.glob(
-            os.path.join(user_config_dir(self.appname), "playlist-*.json")
-        )
+        # Wait for the playlists to be written before quitting
+        self.save_playlists(main_window).result()
+
+    # Write modified playlists in the background, returns a future that is done
+    # once all of them are written
+    def save_playlists(self, main_window) -> Future:
+        user_config_path = Path(user_config_dir(self.appname))
+        user_config_path.mkdir(parents=True, exist_ok=True)
+
+        playlist_ids: list[int] = []
+
+        for tab in main_window.get_tabs():
+            model = tab.model()
+            filename = main_window.playlist_filename(tab.playlist_id)
+            playlist_ids.append(tab.playlist_id)
+
+            # Keep the file of a playlist that could not be read as it is
+            if tab.load_error:
+                continue
 
-        for playlist in existing_playlists:
-            os.remove(playlist)
+            if isinstance(model, PlaylistModel):
+                if model.dirty or not os.path.exists(filename):
+                    # Take a snapshot in the GUI thread, the writing happens in the saver
+                    playlist = main_window.playlist_from_tab(
+                        main_window.playlist_tabs.indexOf(tab)
+                    )
+                    model.dirty = False
+                    self.saver.submit(self.write_playlist, filename, playlist, model)
+
+        return self.saver.submit(
+            self.remove_obsolete_playlists, str(user_config_path), playlist_ids
+        )
 
-        for t in range(0, main_window.playlist_tabs.count()):
-            main_window.write_playlist_file(t)
+    def write_playlist(
+        self, filename: str, playlist: PlaylistExport, model: Optional[PlaylistModel]
+    ) -> None:
+        try:
+            write_playlist(filename, playlist)
+            logger.debug(f"Playlist {filename} saved")
+        except Exception as e:
+            logger.error(f"Error while saving playlist {filename}: {e}")
+
+            # Try again next time
+            if model:
+                model.dirty = True
+
+    def remove_obsolete_playlists(self, directory: str, playlist_ids: list[int]) -> None:
+        for filename in playlist_filenames(directory, PLAYLIST_EXTENSION):
+            if playlist_id_from_filename(filename) not in playlist_ids:
+                os.remove(filename)
+
+        # Old jsonpickle playlists are gone once all tabs are saved in the new format,
+        # a tab that failed to load has no binary file, so they are kept then
+        if all(
+            os.path.exists(
+                os.path.join(directory, f"playlist-{playlist_id}{PLAYLIST_EXTENSION}")
+            )
+            for playlist_id in playlist_ids
+        ):
+            for filename in playlist_filenames(directory, ".json"):
+                os.remove(filename)
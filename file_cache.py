@@ -0,0 +1,76 @@
+import ctypes
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import Union
+
+from loguru import logger
+
+FileData = Union[bytes, mmap.mmap]
+
+
+# Process wide LRU cache of module file contents, so scanning, metadata,
+# hashing and playback of the same file only hit the disk once
+#
+# Files up to mmap_threshold are read into memory, larger ones are mapped
+# (copy-on-write, so ctypes can take pointers into them without copying).
+# Entries are keyed by path, mtime and size, so changed files are read again.
+class FileCache:
+    log_prefix = "[FileCache] "
+
+    def __init__(self, max_bytes: int = 64 << 20, mmap_threshold: int = 1 << 20) -> None:
+        self.max_bytes = max_bytes
+        self.mmap_threshold = mmap_threshold
+
+        self.entries: OrderedDict[tuple[str, int, int], FileData] = OrderedDict()
+        self.size: int = 0
+        self.lock = threading.Lock()
+
+    def get(self, filename: str) -> FileData:
+        stat = os.stat(filename)
+        key = (filename, stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            data = self.entries.get(key)
+
+            if data is not None:
+                self.entries.move_to_end(key)
+                return data
+
+        with open(filename, "rb") as f:
+            if stat.st_size >= self.mmap_threshold:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+            else:
+                data = f.read()
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = data
+                self.size += len(data)
+                self.evict()
+
+        return data
+
+    def evict(self) -> None:
+        # Called with lock held, mappings are not closed here as callers may still
+        # use them, they go away once the last reference is gone
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            key, data = self.entries.popitem(last=False)
+            self.size -= len(data)
+            logger.trace(f"{self.log_prefix}Evicted {key[0]}")
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+# Pointer to file data for C functions, without copying
+def c_buffer(data: FileData) -> Union[bytes, ctypes.Array]:
+    if isinstance(data, mmap.mmap):
+        return (ctypes.c_char * len(data)).from_buffer(data)
+    return data
+
+
+file_cache = FileCache()
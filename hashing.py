@@ -0,0 +1,148 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+from loguru import logger
+
+from file_cache import file_cache
+
+SCHEMA_VERSION = 1
+
+
+class FileDigests:
+    def __init__(self, md5: str = "", sha1: str = "") -> None:
+        self.md5: str = md5
+        self.sha1: str = sha1
+
+
+# Persistent md5/sha1 digests keyed by path, mtime and size
+class HashIndex:
+    log_prefix = "[HashIndex] "
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+        if version != SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS digests")
+            self.connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS digests (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                md5 TEXT NOT NULL,
+                sha1 TEXT NOT NULL
+            )"""
+        )
+        self.connection.commit()
+
+    def get(self, filename: str, stat: os.stat_result) -> Optional[FileDigests]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT mtime_ns, size, md5, sha1 FROM digests WHERE path=?",
+                (filename,),
+            ).fetchone()
+
+        if row and row[0] == stat.st_mtime_ns and row[1] == stat.st_size:
+            return FileDigests(row[2], row[3])
+        return None
+
+    def put(self, filename: str, stat: os.stat_result, digests: FileDigests) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO digests (path, mtime_ns, size, md5, sha1) VALUES (?, ?, ?, ?, ?)",
+                (filename, stat.st_mtime_ns, stat.st_size, digests.md5, digests.sha1),
+            )
+            self.connection.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+# Computes md5 and sha1 of module files together in a single pass, results are
+# kept in a HashIndex if one is set
+class HashService:
+    log_prefix = "[HashService] "
+
+    # Data is fed to both hashes in blocks, hashlib releases the GIL for these
+    block_size = 1 << 20
+
+    def __init__(self, index: Optional[HashIndex] = None, workers: int = 0) -> None:
+        self.index = index
+        self.workers: int = workers if workers > 0 else (os.cpu_count() or 1)
+
+    def set_index(self, index: Optional[HashIndex]) -> None:
+        self.index = index
+
+    # Digests of filename, None if the file can't be read or is empty
+    def digests(self, filename: str) -> Optional[FileDigests]:
+        try:
+            stat = os.stat(filename)
+        except OSError as e:
+            logger.error(f"{self.log_prefix}Can not hash {filename}: {e}")
+            return None
+
+        if self.index:
+            digests = self.index.get(filename, stat)
+
+            if digests:
+                return digests
+
+        try:
+            data = file_cache.get(filename)
+        except OSError as e:
+            logger.error(f"{self.log_prefix}Can not hash {filename}: {e}")
+            return None
+
+        if not data:
+            return None
+
+        md5 = hashlib.md5()
+        sha1 = hashlib.sha1()
+
+        with memoryview(data) as view:
+            for offset in range(0, len(view), self.block_size):
+                block = view[offset : offset + self.block_size]
+                md5.update(block)
+                sha1.update(block)
+
+        digests = FileDigests(md5.hexdigest(), sha1.hexdigest())
+
+        if self.index:
+            self.index.put(filename, stat, digests)
+
+        return digests
+
+    # md5 of filename, modulemd5 as determined by libuade is used if known
+    def md5(self, filename: str, modulemd5: str = "") -> str:
+        if modulemd5:
+            return modulemd5
+
+        digests = self.digests(filename)
+        return digests.md5 if digests else ""
+
+    def sha1(self, filename: str) -> str:
+        digests = self.digests(filename)
+        return digests.sha1 if digests else ""
+
+    # Hash many files in parallel, yields (filename, digests) in the order of filenames
+    def digests_batch(
+        self, filenames: Iterable[str]
+    ) -> Iterator[tuple[str, Optional[FileDigests]]]:
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            yield from executor.map(lambda f: (f, self.digests(f)), filenames)
+
+
+hash_service = HashService()
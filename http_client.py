@@ -0,0 +1,133 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+
+# On-disk cache of successful responses, one file per URL named by its sha1
+class ResponseCache:
+    log_prefix = "[ResponseCache] "
+
+    def __init__(self, directory: str, max_age: float = 7 * 24 * 3600) -> None:
+        self.directory = directory
+        self.max_age = max_age
+
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url: str) -> str:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, url: str) -> Optional[bytes]:
+        path = self.path(url)
+
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, url: str, content: bytes) -> None:
+        path = self.path(url)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(temp_path, "wb") as f:
+                f.write(content)
+
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"{self.log_prefix}Can not cache {url}: {e}")
+
+
+# Shared HTTP connection pool for all scraping, with a limit on concurrent
+# requests and a minimum interval between requests per host
+class HttpClient:
+    log_prefix = "[HttpClient] "
+
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        max_per_host: int = 4,
+        min_interval: float = 0.1,
+        timeout: float = 15.0,
+    ) -> None:
+        self.cache = cache
+        self.max_per_host = max_per_host
+        self.min_interval = min_interval
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max_per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.lock = threading.Lock()
+        self.host_semaphores: dict[str, threading.Semaphore] = {}
+        self.host_next_request: dict[str, float] = {}
+
+    def host_semaphore(self, host: str) -> threading.Semaphore:
+        with self.lock:
+            semaphore = self.host_semaphores.get(host)
+
+            if not semaphore:
+                semaphore = threading.Semaphore(self.max_per_host)
+                self.host_semaphores[host] = semaphore
+            return semaphore
+
+    def wait_for_host(self, host: str) -> None:
+        # Reserve the next free request slot for host and sleep until it's due
+        with self.lock:
+            now = time.monotonic()
+            due = max(now, self.host_next_request.get(host, now))
+            self.host_next_request[host] = due + self.min_interval
+
+        if due > now:
+            time.sleep(due - now)
+
+    # Content of url, None if the request failed
+    def get(self, url: str) -> Optional[bytes]:
+        if self.cache:
+            content = self.cache.get(url)
+
+            if content is not None:
+                return content
+
+        host = urlsplit(url).netloc
+
+        with self.host_semaphore(host):
+            self.wait_for_host(host)
+
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                logger.error(f"{self.log_prefix}Request to {url} failed: {e}")
+                return None
+
+        if response.status_code != 200:
+            logger.warning(
+                f"{self.log_prefix}Request to {url} returned {response.status_code}"
+            )
+            return None
+
+        if self.cache:
+            self.cache.put(url, response.content)
+
+        return response.content
+
+    def close(self) -> None:
+        self.session.close()
+
+
+http_client = HttpClient()
@@ -0,0 +1,230 @@
+import heapq
+import itertools
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from loguru import logger
+from PySide6.QtCore import QThread, Signal
+
+from scan_cache import ScanCache
+from scanner import init_worker, measure_subsong
+from uade import Song, Subsong
+from worker_pool import WorkerPool
+
+PRIORITY_VISIBLE = 0
+PRIORITY_NORMAL = 1
+
+
+# Determines deferred subsong lengths in the background, songs in visible
+# playlist rows are handled first
+class LengthResolver(QThread):
+    # Song with its length now known and the owners it was requested for
+    length_resolved = Signal(object, list)
+
+    log_prefix = "[LengthResolver] "
+
+    def __init__(self, parent, scan_cache: ScanCache, workers: int = 0) -> None:
+        super().__init__(parent)
+
+        self.scan_cache = scan_cache
+        self.workers: int = workers if workers > 0 else max((os.cpu_count() or 1) // 2, 1)
+
+        # Seconds spent on all subsongs of a file (0 = no limit)
+        self.time_budget: float = 0.0
+
+        # Seconds spent measuring the subsongs of a file this session, by filename,
+        # once the budget is used up its remaining subsongs stay deferred
+        self.spent: dict[str, float] = {}
+
+        self.queue: list[tuple[int, int, Song]] = []
+        self.counter = itertools.count()
+        self.priorities: dict[Song, int] = {}
+
+        # Playlists that requested a song, only those contain it
+        self.owners: dict[Song, list[object]] = {}
+
+        # Songs being measured when a worker crashed, each is measured alone
+        # afterwards to find the one that crashes it
+        self.suspects: set[Song] = set()
+
+        # Songs whose length can't be measured, not tried again this session
+        self.failed: set[Song] = set()
+        self.condition = threading.Condition()
+        self.stop_flag: bool = False
+
+    def request(
+        self, song: Song, priority: int = PRIORITY_NORMAL, owner: Optional[object] = None
+    ) -> None:
+        with self.condition:
+            if owner is not None:
+                owners = self.owners.setdefault(song, [])
+
+                if not any(o is owner for o in owners):
+                    owners.append(owner)
+
+            if song in self.failed or self.budget_used_up(song):
+                return
+
+            # Only requeue if the priority rises, stale entries are skipped later
+            if self.priorities.get(song, priority + 1) <= priority:
+                return
+
+            self.priorities[song] = priority
+            heapq.heappush(self.queue, (priority, next(self.counter), song))
+            self.condition.notify()
+
+    def prioritize(self, songs: list[Song]) -> None:
+        for song in songs:
+            if song.length_unknown():
+                self.request(song, PRIORITY_VISIBLE)
+
+    def next_song(self) -> Optional[Song]:
+        # Called with condition held
+        while self.queue:
+            priority, _, song = heapq.heappop(self.queue)
+
+            # Requeued with a higher priority since
+            if self.priorities.get(song) != priority:
+                continue
+
+            del self.priorities[song]
+
+            if song.length_unknown() and not self.budget_used_up(song):
+                return song
+        return None
+
+    # Seconds left for measuring the subsongs of the song's file (0 = no limit),
+    # only time actually spent measuring counts
+    def remaining_budget(self, song: Song) -> float:
+        # Called with condition held
+        if self.time_budget <= 0:
+            return 0.0
+
+        return self.time_budget - self.spent.get(song.song_file.filename, 0.0)
+
+    def budget_used_up(self, song: Song) -> bool:
+        # Called with condition held
+        return self.time_budget > 0 and self.remaining_budget(song) <= 0
+
+    def run(self) -> None:
+        pool = WorkerPool(self.workers, init_worker, (10,))
+        in_flight: dict[Future, Song] = {}
+
+        try:
+            while True:
+                with self.condition:
+                    while not self.stop_flag and not self.queue and not in_flight:
+                        self.condition.wait()
+
+                    if self.stop_flag:
+                        break
+
+                    self.submit_songs(pool, in_flight)
+
+                if not in_flight:
+                    continue
+
+                done, _ = wait(in_flight, timeout=0.1, return_when=FIRST_COMPLETED)
+                broken = False
+
+                for future in done:
+                    song = in_flight.pop(future)
+
+                    try:
+                        subsong, seconds = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+
+                        if song in self.suspects:
+                            # Measured alone, so it crashed the worker itself
+                            logger.error(
+                                f"{self.log_prefix}Determining length of {song.song_file.filename}, subsong {song.subsong.nr} crashes the worker"
+                            )
+                            self.song_failed(song)
+                        else:
+                            self.requeue_suspect(song)
+                        continue
+                    except Exception as e:
+                        logger.error(
+                            f"{self.log_prefix}Determining length of {song.song_file.filename}, subsong {song.subsong.nr} failed: {e}"
+                        )
+                        self.song_failed(song)
+                        continue
+
+                    self.suspects.discard(song)
+                    self.song_measured(song, subsong, seconds)
+
+                # A crash fails every song of the pool, the ones still in flight
+                # are measured again by new workers
+                if broken:
+                    for song in in_flight.values():
+                        self.requeue_suspect(song)
+
+                    in_flight.clear()
+                    pool.restart()
+        finally:
+            pool.shutdown()
+
+    def submit_songs(self, pool: WorkerPool, in_flight: dict[Future, Song]) -> None:
+        # Called with condition held
+        while len(in_flight) < self.workers:
+            # Suspects are measured alone
+            if any(song in self.suspects for song in in_flight.values()):
+                return
+
+            song = self.next_song()
+
+            if not song:
+                return
+
+            # Put back until the songs in flight are done
+            if song in self.suspects and in_flight:
+                self.request(song, PRIORITY_VISIBLE)
+                return
+
+            future = pool.submit_or_fail(
+                measure_subsong,
+                song.song_file,
+                song.subsong.nr,
+                self.remaining_budget(song),
+            )
+            in_flight[future] = song
+
+    def requeue_suspect(self, song: Song) -> None:
+        self.suspects.add(song)
+        self.request(song, PRIORITY_VISIBLE)
+
+    def song_failed(self, song: Song) -> None:
+        # The song keeps its unknown length, it isn't stored as measured
+        self.suspects.discard(song)
+
+        with self.condition:
+            self.failed.add(song)
+            self.owners.pop(song, None)
+
+    # A subsong cut off by the time budget is stored as estimated, its length
+    # is only a lower bound
+    def song_measured(self, song: Song, subsong: Subsong, seconds: float) -> None:
+        filename = song.song_file.filename
+
+        self.scan_cache.put_subsong_length(
+            filename, song.subsong.nr, subsong.bytes, subsong.estimated
+        )
+
+        song.subsong.bytes = subsong.bytes
+        song.subsong.deferred = False
+        song.subsong.estimated = subsong.estimated
+
+        with self.condition:
+            self.spent[filename] = self.spent.get(filename, 0.0) + seconds
+            owners = self.owners.pop(song, [])
+
+        self.length_resolved.emit(song, owners)
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stop_flag = True
+            self.condition.notify()
@@ -1,34 +1,66 @@
+import time
+
 import debugpy
-from PySide6.QtCore import Qt, QThread, Signal
-from PySide6.QtWidgets import QProgressDialog
+from PySide6.QtCore import QThread, Signal
+
+from scan_cache import ScanCache
+from scanner import Scanner
 
 
 class LoaderThread(QThread):
     finished = Signal()
+    progress_changed = Signal(int)  # Number of files scanned so far
+    songs_loaded = Signal(list)  # Batch of scanned songs, in filename order
+
+    # Songs are handed to the GUI in batches to keep model updates rare
+    batch_rows = 500
+    batch_interval = 0.05
 
-    def __init__(self, parent) -> None:
+    def __init__(self, parent, scan_cache: ScanCache) -> None:
         super().__init__(parent)
 
         self.filenames: list[str] = []
+        self.scan_cache = scan_cache
+        self.cancel_flag: bool = False
 
     def run(self):
         # debugpy.debug_this_thread()
 
-        from mainwindow import MainWindow
+        self.cancel_flag = False
+
+        # Subsong lengths are left to the LengthResolver, so rows show up right away
+        scanner = Scanner(measure=False)
+
+        batch: list = []
+        batch_start = time.monotonic()
+
+        for i, (filename, songs) in enumerate(
+            scanner.scan(self.filenames, self.scan_cache)
+        ):
+            if self.cancel_flag:
+                break
+
+            batch.extend(songs)
+
+            if (
+                len(batch) >= self.batch_rows
+                or time.monotonic() - batch_start >= self.batch_interval
+            ):
+                if batch:
+                    self.songs_loaded.emit(batch)
+
+                self.progress_changed.emit(i + 1)
+                batch = []
+                batch_start = time.monotonic()
 
-        main_window = self.parent()
+        if batch:
+            self.songs_loaded.emit(batch)
 
-        if isinstance(main_window, MainWindow) and len(self.filenames) > 0:
-            progress = QProgressDialog(
-                "Scanning files...", "Cancel", 0, len(self.filenames), main_window
-            )
-            progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.progress_changed.emit(len(self.filenames))
 
-            for i, filename in enumerate(self.filenames):
-                progress.setValue(i)
-                if progress.wasCanceled():
-                    break
+        scanner.shutdown()
 
-                main_window.load_file(filename)
+        self.finished.emit()
 
-            progress.setValue(len(self.filenames))
+    def cancel(self) -> None:
+        self.cancel_flag = True
@@ -1,15 +1,13 @@
 import configparser
 import datetime
-import ntpath
 import os
-import resource
 import webbrowser
 from pathlib import Path
 from typing import Optional
 
 import jsonpickle
 import psutil
-from appdirs import user_config_dir
+from appdirs import user_cache_dir, user_config_dir
 from loguru import logger
 from PySide6 import QtCore, QtWidgets
 from PySide6.QtCore import (
@@ -19,11 +17,14 @@ from PySide6.QtCore import (
     QModelIndex,
     QSize,
     Qt,
+    QThread,
+    QTimer,
 )
 from PySide6.QtGui import QAction, QIcon, QKeyEvent, QKeySequence
 from PySide6.QtWidgets import (
     QLabel,
     QMenu,
+    QProgressDialog,
     QSlider,
     QStatusBar,
     QSystemTrayIcon,
@@ -32,7 +33,13 @@ from PySide6.QtWidgets import (
 
 import configmanager
 
-from audio_backends.pyaudio.audio_backend_pyuadio import AudioBackendPyAudio
+from audio_backends.pyaudio.audio_backend_pyaudio_callback import (
+    AudioBackendPyAudioCallback,
+)
+from backend_probe import BackendProbe
+from hashing import HashIndex, hash_service
+from http_client import ResponseCache, http_client
+from length_resolver import LengthResolver
 from loader_thread import LoaderThread
 from options import Options
 from player_backends.libopenmpt.player_backend_libopenmpt import PlayerBackendLibOpenMPT
@@ -41,13 +48,34 @@ from player_backends.player_backend import PlayerBackend
 from player_thread import PlayerThread
 from playlist import (
     PlaylistExport,
-    PlaylistItem,
     PlaylistModel,
     PlaylistTab,
+    PlaylistTabBar,
     PlaylistTreeView,
 )
-from scraping import lookup_msm, scrape_modarchive, scrape_modland, scrape_msm
+from playlist_file import (
+    PLAYLIST_EXTENSION,
+    playlist_id_from_filename,
+    read_playlist,
+    read_playlist_name,
+    write_playlist,
+)
+from sample_format import (
+    SampleFormat,
+    negotiate_sample_format,
+    preferred_sample_formats,
+)
+from scan_cache import ScanCache
+from scanner import scan_file
+from scrape_thread import (
+    SOURCE_MODARCHIVE,
+    SOURCE_MODLAND,
+    SOURCE_MSM,
+    SOURCE_MSM_MODARCHIVE,
+    ScrapeThread,
+)
 from song_info_dialog import SongInfoDialog
+from track_preloader import PreloadedTrack, TrackPreloader, load_player_backend
 from uade import Song, uade
 from util import TREEVIEWCOL
 
@@ -71,19 +99,71 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.setup_gui()
 
+        user_config_path = Path(user_config_dir(self.appname))
+        user_config_path.mkdir(parents=True, exist_ok=True)
+        self.scan_cache = ScanCache(str(user_config_path / "scan_cache.sqlite"))
+        self.hash_index = HashIndex(str(user_config_path / "hash_index.sqlite"))
+        hash_service.set_index(self.hash_index)
+
+        # Metadata lookups run concurrently in the background, responses are cached
+        http_client.cache = ResponseCache(
+            str(Path(user_cache_dir(self.appname)) / "responses")
+        )
+        self.scrape_thread = ScrapeThread(self, http_client, self.appname)
+        self.scrape_thread.song_scraped.connect(self.song_scraped)
+        self.scrape_thread.url_found.connect(self.url_found)
+        self.scrape_thread.progress_changed.connect(self.scrape_progress_changed)
+        self.scrape_thread.finished.connect(self.scrape_finished)
+        self.scrape_progress: Optional[QProgressDialog] = None
+
+        # Tab the running lookup updates
+        self.scrape_tab: Optional[PlaylistTreeView] = None
+
         self.player_thread: Optional[PlayerThread] = None
-        self.loader_thread = LoaderThread(self)
+        self.loader_thread = LoaderThread(self, self.scan_cache)
         self.loader_thread.finished.connect(self.loader_finished)
+        self.loader_thread.songs_loaded.connect(self.songs_loaded)
+        self.loader_thread.progress_changed.connect(self.loader_progress_changed)
+        self.loader_progress: Optional[QProgressDialog] = None
+
+        # Tab the currently running scan adds its songs to
+        self.loader_tab: Optional[PlaylistTreeView] = None
+
+        # Subsong lengths are determined in the background, visible rows first
+        self.length_resolver = LengthResolver(self, self.scan_cache)
+        self.length_resolver.length_resolved.connect(self.length_resolved)
+        self.apply_scan_settings()
+        self.length_resolver.start(QThread.Priority.LowPriority)
+
+        self.prioritize_timer = QTimer(self)
+        self.prioritize_timer.setSingleShot(True)
+        self.prioritize_timer.setInterval(100)
+        self.prioritize_timer.timeout.connect(self.prioritize_visible_rows)
+        self.playlist_tabs.currentChanged.connect(self.visible_rows_changed)
 
         self.config_manager = configmanager.ConfigManager(self.appname, self.appauthor)
         self.config_manager.read_config(self)
 
+        # Tabs not shown on startup are loaded when they get selected
+        self.playlist_tabs.currentChanged.connect(self.current_tab_changed)
+        self.current_tab_changed(self.playlist_tabs.currentIndex())
+
+        # Periodically save modified playlists
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.apply_autosave_settings()
+
         self.player_backends = {
             "LibUADE": PlayerBackendLibUADE,
             "LibOpenMPT": PlayerBackendLibOpenMPT,
         }
-        self.player_backend: Optional[PlayerBackend]
-        self.audio_backend: Optional[AudioBackendPyAudio] = None
+        self.backend_probe = BackendProbe(self.player_backends)
+        self.player_backend: Optional[PlayerBackend] = None
+        self.audio_backend: Optional[AudioBackendPyAudioCallback] = None
+
+        # Next playlist entry prepared in gapless mode
+        self.track_preloader: Optional[TrackPreloader] = None
+        self.preload_row: int = -1
 
     def filenames_from_paths(self, paths: list[str]) -> list[str]:
         file_paths = []
@@ -110,53 +190,119 @@ class MainWindow(QtWidgets.QMainWindow):
             filenames = [url.toLocalFile() for url in event.mimeData().urls()]
             self.scan_and_load_files(filenames)
 
-    def load_playlist_as_tab(self, filename: str) -> None:
+    # Load playlist file into a new tab, with lazy set only the tab is created and
+    # the songs are loaded when the tab is shown for the first time
+    def load_playlist_as_tab(self, filename: str, lazy: bool = False) -> None:
         try:
             if os.stat(filename).st_size != 0:
-                with open(filename, "r") as playlist_file:
-                    playlist_export = jsonpickle.decode(playlist_file.read())
+                playlist_id = playlist_id_from_filename(filename)
+
+                if filename.endswith(".json"):
+                    # Old jsonpickle playlist, gets saved in binary format next time
+                    with open(filename, "r") as playlist_file:
+                        playlist_export = jsonpickle.decode(playlist_file.read())
 
                     if isinstance(playlist_export, PlaylistExport):
-                        tree = self.add_tab(playlist_export.name)
+                        tree = self.add_tab(playlist_export.name, playlist_id)
 
                         if playlist_export.songs:
-                            for song in playlist_export.songs:
-                                self.load_song(song, tree)
+                            self.add_songs(playlist_export.songs, tree)
+
+                        model = tree.model()
+
+                        if isinstance(model, PlaylistModel):
+                            model.dirty = False
+                else:
+                    tree = self.add_tab(read_playlist_name(filename), playlist_id)
+                    tree.pending_filename = filename
+
+                    if not lazy:
+                        self.load_pending_tab(tree)
             else:
                 raise Exception("Playlist file is empty.")
         except FileNotFoundError as e:
             raise Exception(f"Error while reading playlist file: {str(e)}")
 
+    def load_pending_tab(self, tab: PlaylistTreeView) -> None:
+        if not tab.pending_filename:
+            return
+
+        filename = tab.pending_filename
+        tab.pending_filename = None
+
+        try:
+            playlist_export = read_playlist(filename)
+        except Exception as e:
+            logger.error(
+                f"{self.log_prefix}Error while loading playlist {filename}: {e}"
+            )
+            self.mark_tab_failed(tab, f"Error while loading playlist {filename}: {e}")
+            return
+
+        if playlist_export.songs:
+            self.add_songs(playlist_export.songs, tab)
+
+        model = tab.model()
+
+        if isinstance(model, PlaylistModel):
+            model.dirty = False
+
+    def mark_tab_failed(self, tab: PlaylistTreeView, message: str) -> None:
+        tab.load_error = message
+
+        index = self.playlist_tabs.indexOf(tab)
+        tab_bar = self.playlist_tabs.tabBar()
+        tab_bar.setTabTextColor(index, Qt.GlobalColor.red)
+        tab_bar.setTabToolTip(index, message)
+
+        self.statusBar().showMessage(message)
+
+    @QtCore.Slot()
+    def current_tab_changed(self, index: int) -> None:
+        tab = self.playlist_tabs.widget(index)
+
+        if isinstance(tab, PlaylistTreeView):
+            self.load_pending_tab(tab)
+
     def playlist_from_tab(self, tab_nr: int) -> PlaylistExport:
         songs: list[Song] = []
 
         tab = self.playlist_tabs.widget(tab_nr)
         tab_name = "Unnamed Tab"
 
-        current_tab = self.get_current_tab()
+        if isinstance(tab, PlaylistTreeView):
+            self.load_pending_tab(tab)
 
-        if current_tab:
-            model = current_tab.model()
+            model = tab.model()
 
             if isinstance(model, PlaylistModel):
-                if isinstance(tab, PlaylistTreeView):
-                    for row in range(model.rowCount()):
-                        song: Song = model.itemFromIndex(model.index(row, 0)).data(
-                            Qt.ItemDataRole.UserRole
-                        )
-
-                        songs.append(song)
-                    tab_name = self.playlist_tabs.tabBar().tabText(tab_nr)
+                songs = model.songs()
+                tab_name = self.playlist_tabs.tabBar().tabText(tab_nr)
         return PlaylistExport(tab_name, songs)
 
+    def playlist_filename(self, playlist_id: int) -> str:
+        return os.path.join(
+            user_config_dir(self.appname),
+            "playlist-" + str(playlist_id) + PLAYLIST_EXTENSION,
+        )
+
     def write_playlist_file(self, tab_nr: int) -> None:
-        with open(
-            os.path.join(
-                user_config_dir(self.appname), "playlist-" + str(tab_nr) + ".json"
-            ),
-            "w",
-        ) as playlist:
-            playlist.write(str(jsonpickle.encode(self.playlist_from_tab(tab_nr))))
+        tab = self.playlist_tabs.widget(tab_nr)
+
+        if isinstance(tab, PlaylistTreeView):
+            if tab.load_error:
+                logger.error(f"{self.log_prefix}Not saving unreadable playlist: {tab.load_error}")
+                self.statusBar().showMessage(f"Not saved: {tab.load_error}")
+                return
+
+            model = tab.model()
+
+            write_playlist(
+                self.playlist_filename(tab.playlist_id), self.playlist_from_tab(tab_nr)
+            )
+
+            if isinstance(model, PlaylistModel):
+                model.dirty = False
 
     def setup_gui(self) -> None:
         self.icon_filenames = {"play", "pause", "stop", "prev", "next"}
@@ -225,6 +371,10 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.playlist_tabs.addtabButton.clicked.connect(self.new_tab)
 
+        tab_bar = self.playlist_tabs.tabBar()
+        if isinstance(tab_bar, PlaylistTabBar):
+            tab_bar.renamed.connect(self.tab_renamed)
+
     def setup_actions(self) -> None:
         self.load_action = QAction("Load", self)
         self.load_action.setStatusTip("Load")
@@ -320,10 +470,45 @@ class MainWindow(QtWidgets.QMainWindow):
         options = Options(self, self.settings)
 
         if options.exec():
+            self.apply_scan_settings()
+            self.apply_autosave_settings()
             return True
         else:
             return False
 
+    def apply_scan_settings(self) -> None:
+        time_budget = self.settings.value("scan_time_budget", type=int)
+
+        if not isinstance(time_budget, int):
+            time_budget = 60
+
+        self.length_resolver.time_budget = time_budget
+
+    def apply_autosave_settings(self) -> None:
+        autosave_interval = self.settings.value("autosave_interval", type=int)
+
+        if not isinstance(autosave_interval, int):
+            autosave_interval = 5
+
+        if autosave_interval > 0:
+            self.autosave_timer.start(autosave_interval * 60 * 1000)
+        else:
+            self.autosave_timer.stop()
+
+    @QtCore.Slot()
+    def autosave(self) -> None:
+        self.config_manager.save_playlists(self)
+
+    @QtCore.Slot()
+    def tab_renamed(self, index: int) -> None:
+        tab = self.playlist_tabs.widget(index)
+
+        if isinstance(tab, PlaylistTreeView):
+            model = tab.model()
+
+            if isinstance(model, PlaylistModel):
+                model.dirty = True
+
     def setup_toolbar(self) -> None:
         toolbar: QToolBar = QToolBar("Toolbar")
         toolbar.setIconSize(QSize(16, 16))
@@ -389,15 +574,24 @@ class MainWindow(QtWidgets.QMainWindow):
         edit_menu.addAction(self.new_tab_action)
         edit_menu.addAction(self.close_tab_action)
 
-    def add_tab(self, name: str = "") -> PlaylistTreeView:
+    def add_tab(
+        self, name: str = "", playlist_id: Optional[int] = None
+    ) -> PlaylistTreeView:
         tree = PlaylistTreeView(self)
-        model = PlaylistModel(0, len(TREEVIEWCOL))
-        model.setHorizontalHeaderLabels(self.labels)
+
+        if playlist_id is None:
+            playlist_id = (
+                max((tab.playlist_id for tab in self.get_tabs()), default=-1) + 1
+            )
+
+        tree.playlist_id = playlist_id
+        model = PlaylistModel(self.labels, self.icons["play"], tree)
 
         tree.setModel(model)
 
         tree.doubleClicked.connect(self.item_double_clicked)
         tree.customContextMenuRequested.connect(self.open_context_menu)
+        tree.verticalScrollBar().valueChanged.connect(self.visible_rows_changed)
 
         self.playlist_tabs.addTab(tree, name)
         return tree
@@ -415,53 +609,14 @@ class MainWindow(QtWidgets.QMainWindow):
             model = current_tab.model()
 
             if isinstance(model, PlaylistModel):
-                if current_tab:
-                    col = model.itemFromIndex(current_tab.model().index(row, 0))
-
-                    if enable:
-                        col.setData(self.icons["play"], Qt.ItemDataRole.DecorationRole)
-                    else:
-                        col.setData(QIcon(), Qt.ItemDataRole.DecorationRole)
+                model.set_playing(row, enable)
 
     # Add subsong to playlist
     def load_song(self, song: Song, tab=None) -> None:
-        tree_cols: list[PlaylistItem] = []
-
-        if hasattr(song, "subsong"):
-            duration = datetime.timedelta(seconds=song.subsong.bytes / 176400)
-            subsong_nr = song.subsong.nr
-        else:
-            duration = datetime.timedelta(seconds=song.song_file.duration)
-            subsong_nr = 1
-
-        for col in TREEVIEWCOL:
-            item = PlaylistItem()
-
-            # Store song data in first column
-            if col == 0:
-                item.setData(song, Qt.ItemDataRole.UserRole)
-
-            match col:
-                case TREEVIEWCOL.PLAYING:
-                    item.setText("")
-                    # item.setData(QIcon(path + "/play.png"), Qt.DecorationRole)
-                case TREEVIEWCOL.FILENAME:
-                    item.setText(ntpath.basename(song.song_file.filename))
-                case TREEVIEWCOL.SONGNAME:
-                    item.setText(song.song_file.modulename)
-                case TREEVIEWCOL.DURATION:
-                    item.setText(str(duration).split(".")[0])
-                case TREEVIEWCOL.PLAYER:
-                    item.setText(song.song_file.playername)
-                case TREEVIEWCOL.PATH:
-                    item.setText(song.song_file.filename)
-                case TREEVIEWCOL.SUBSONG:
-                    item.setText(str(subsong_nr))
-                case TREEVIEWCOL.AUTHOR:
-                    item.setText(song.song_file.author)
-
-            tree_cols.append(item)
+        self.add_songs([song], tab)
 
+    # Add subsongs to playlist in one go
+    def add_songs(self, songs: list[Song], tab=None) -> None:
         if not tab:
             tab = self.get_current_tab()
 
@@ -469,27 +624,20 @@ class MainWindow(QtWidgets.QMainWindow):
             model = tab.model()
 
             if isinstance(model, PlaylistModel):
-                model.appendRow(tree_cols)
-
-    def load_file(self, filename: str) -> None:
-        try:
-            song_file = uade.scan_song_file(filename)
-        except:
-            logger.error(
-                f'{self.log_prefix}Loading {filename.encode("utf-8", "surrogateescape").decode("ISO-8859-1")} failed, song skipped'
-            )
-        else:
-            print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
-            # self.song_files.append(song_file)
+                model.add_songs(songs)
 
-            subsongs = uade.split_subsongs(song_file)
+                for song in songs:
+                    if song.length_unknown():
+                        self.length_resolver.request(song, owner=model)
 
-            # Scrape metadata
+    def load_file(self, filename: str) -> None:
+        songs = self.scan_cache.get_songs(filename)
 
-            # subsongs[0] = self.scrape_modland(subsongs[0], "Author(s)")
+        if songs is None:
+            songs = scan_file(filename)
+            self.scan_cache.put_songs(filename, songs)
 
-            for subsong in subsongs:
-                self.load_song(subsong)
+        self.add_songs(songs)
 
     def scan_and_load_folder(self, dir) -> bool:
         filenames = sorted(
@@ -511,12 +659,34 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.enable_ui(False)
 
+        self.loader_progress = QProgressDialog(
+            "Scanning files...", "Cancel", 0, len(filenames), self
+        )
+        self.loader_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.loader_progress.canceled.connect(self.loader_thread.cancel)
+
+        self.loader_tab = self.get_current_tab()
         self.loader_thread.filenames = filenames
         self.loader_thread.start()
         return True
 
     def closeEvent(self, event: QEvent):
         self.config_manager.write_config(self)
+        self.stop()
+
+        if self.audio_backend:
+            self.audio_backend.close()
+            self.audio_backend = None
+
+        self.scrape_thread.cancel()
+        self.scrape_thread.wait()
+        http_client.close()
+
+        self.length_resolver.stop()
+        self.length_resolver.wait()
+        self.scan_cache.close()
+        hash_service.set_index(None)
+        self.hash_index.close()
 
     def get_current_tab(self) -> Optional[PlaylistTreeView]:
         # return self.playlist_tabs.widget(self.playlist_tabs.tabBar().currentIndex())
@@ -526,6 +696,16 @@ class MainWindow(QtWidgets.QMainWindow):
             return widget
         return None
 
+    def get_tabs(self) -> list[PlaylistTreeView]:
+        tabs = []
+
+        for t in range(0, self.playlist_tabs.count()):
+            tab = self.playlist_tabs.widget(t)
+
+            if isinstance(tab, PlaylistTreeView):
+                tabs.append(tab)
+        return tabs
+
     def get_current_tab_index(self) -> int:
         return self.playlist_tabs.tabBar().currentIndex()
 
@@ -586,9 +766,10 @@ class MainWindow(QtWidgets.QMainWindow):
             model = current_tab.model()
 
             if isinstance(model, PlaylistModel):
-                song: Song = model.itemFromIndex(
-                    current_tab.model().index(row, 0)
-                ).data(Qt.ItemDataRole.UserRole)
+                song = model.song(row)
+
+                if not song:
+                    return
 
                 dialog = SongInfoDialog(song)
                 dialog.setWindowTitle(f"Song info for {song.song_file.filename}")
@@ -603,11 +784,7 @@ class MainWindow(QtWidgets.QMainWindow):
             row = index.row()
 
             if isinstance(model, PlaylistModel):
-                song: Song = model.itemFromIndex(
-                    current_tab.model().index(row, 0)
-                ).data(Qt.ItemDataRole.UserRole)
-
-                return song
+                return model.song(row)
         return None
 
     def get_selected_songs(self) -> list[Song]:
@@ -626,53 +803,74 @@ class MainWindow(QtWidgets.QMainWindow):
 
     @QtCore.Slot()
     def scrape_modarchive_clicked(self) -> None:
-        songs = self.get_selected_songs()
+        self.scrape_songs(self.get_selected_songs(), SOURCE_MODARCHIVE)
 
-        updated_songs = []
+    @QtCore.Slot()
+    def scrape_modland_clicked(self) -> None:
+        self.scrape_songs(self.get_selected_songs(), SOURCE_MODLAND)
+
+    def scrape_songs(self, songs: list[Song], source: str) -> None:
+        if not songs:
+            return
+
+        if self.scrape_thread.isRunning():
+            logger.warning(f"{self.log_prefix}Lookup already running")
+            return
+
+        # Not modal, the playlist stays usable while looking up
+        self.scrape_progress = QProgressDialog(
+            "Looking up songs...", "Cancel", 0, len(songs), self
+        )
+        self.scrape_progress.canceled.connect(self.scrape_thread.cancel)
+        self.scrape_progress.show()
+
+        self.scrape_tab = self.get_current_tab()
 
-        if songs:
-            for song in songs:
-                updated_songs.append(scrape_modarchive(self.appname, song))
+        self.scrape_thread.songs = songs
+        self.scrape_thread.source = source
+        self.scrape_thread.start()
 
     @QtCore.Slot()
-    def scrape_modland_clicked(self) -> None:
-        songs = self.get_selected_songs()
+    def song_scraped(self, song: Song, author: str) -> None:
+        song.song_file.author = author
 
-        updated_songs = []
+        if self.scrape_tab:
+            model = self.scrape_tab.model()
 
-        if songs:
-            for song in songs:
-                updated_songs.append(scrape_modland(song, "Author"))
+            if isinstance(model, PlaylistModel):
+                model.dirty = True
+                model.column_changed(TREEVIEWCOL.AUTHOR)
 
     @QtCore.Slot()
-    def lookup_modland_clicked(self):
-        # Experimental lookup in modland database via MSM
+    def url_found(self, song: Song, url: str) -> None:
+        webbrowser.open(url, new=2)
 
-        # song.song_file.author = self.scrape_modland(song, "Author(s)")
-        # Get MSM data
-        songs = self.get_selected_songs()
+    @QtCore.Slot()
+    def scrape_progress_changed(self, value: int) -> None:
+        if self.scrape_progress:
+            self.scrape_progress.setValue(value)
 
-        if len(songs) > 0:
-            song = songs[0]
-            data = scrape_msm(song)
+    @QtCore.Slot()
+    def scrape_finished(self) -> None:
+        if self.scrape_progress:
+            self.scrape_progress.close()
+            self.scrape_progress.deleteLater()
+            self.scrape_progress = None
 
-            # Check for url containing modarchive.org
-            if "urls" in data:
-                for url in data["urls"]:
-                    if "modarchive.org" in url:
-                        webbrowser.open(url, new=2)
-                        break
+        self.scrape_tab = None
 
-            # self.get_current_tab().model().itemFromIndex(self.get_current_tab().model().index(
-            #     row, TREEVIEWCOL.AUTHOR)).setText(song.song_file.author)
+    @QtCore.Slot()
+    def lookup_modland_clicked(self):
+        # Experimental lookup in modland database via MSM
+
+        # song.song_file.author = self.scrape_modland(song, "Author(s)")
+        # Opens the ModArchive page linked in MSM, looked up in the scrape thread
+        self.scrape_songs(self.get_selected_songs()[:1], SOURCE_MSM_MODARCHIVE)
 
     @QtCore.Slot()
     def lookup_msm_clicked(self) -> None:
         # Experimental lookup in .Mod Sample Master database
-        url = lookup_msm(self.get_selected_songs()[0])
-
-        if url:
-            webbrowser.open(url, new=2)
+        self.scrape_songs(self.get_selected_songs()[:1], SOURCE_MSM)
 
     @QtCore.Slot()
     def quit_clicked(self):
@@ -718,16 +916,11 @@ class MainWindow(QtWidgets.QMainWindow):
             10000,
         )
 
-    def find_player(self, filename) -> str:
+    def find_player(self, filename, preferred: str = "") -> str:
         # Try to load the module by going through the available player backends
-        for backend_name, backend_class in self.player_backends.items():
-            logger.debug(f"Trying player backend: {backend_name}")
-
-            player_backend = backend_class()
-            if player_backend is not None:
-                if player_backend.load_module(filename):
-                    self.player_backend = player_backend
-                    break
+        backend_name, self.player_backend = load_player_backend(
+            self.player_backends, filename, self.backend_probe, preferred
+        )
 
         if self.player_backend is None:
             raise ValueError("No player backend could load the module, skipping")
@@ -762,7 +955,11 @@ class MainWindow(QtWidgets.QMainWindow):
 
             if song:
                 # self.playManager.play(song)
-                backend_name = self.find_player(song.song_file.filename)
+                backend_name = self.find_player(
+                    song.song_file.filename,
+                    getattr(song.song_file, "player_backend", ""),
+                )
+                self.remember_player_backend(model, song, backend_name)
 
                 # Set timeline and duration
                 self.timeline.setMaximum(int(song.song_file.duration * 100))
@@ -784,40 +981,51 @@ class MainWindow(QtWidgets.QMainWindow):
                 if not isinstance(samplerate, int):
                     samplerate = 44100
 
-                self.audio_backend = AudioBackendPyAudio(samplerate, buffer)
+                buffer_ahead = self.settings.value("buffer_ahead", type=int)
+
+                if not isinstance(buffer_ahead, int):
+                    buffer_ahead = 250
+
+                # The audio backend is kept across songs
+                if not self.audio_backend:
+                    self.audio_backend = AudioBackendPyAudioCallback(
+                        samplerate, buffer, buffer_ahead
+                    )
+
+                sample_format = SampleFormat.INT16_STEREO
+
+                if self.player_backend is not None:
+                    sample_format = negotiate_sample_format(
+                        preferred_sample_formats(
+                            self.settings.value("float_output", False, type=bool),
+                            self.settings.value("quad_output", False, type=bool),
+                        ),
+                        self.player_backend.get_sample_formats(),
+                        self.audio_backend.get_sample_formats(),
+                    )
+                    self.player_backend.set_sample_format(sample_format)
+
+                self.audio_backend.configure(
+                    samplerate, buffer, buffer_ahead, sample_format
+                )
 
                 if self.player_backend is not None:
                     self.player_thread = PlayerThread(
-                        self.player_backend, self.audio_backend
+                        self.player_backend,
+                        self.audio_backend,
+                        self.settings.value("seek_history", 60, type=int),
                     )
                     self.player_thread.song_finished.connect(self.next_clicked)
+                    self.player_thread.track_changed.connect(self.track_changed)
                     self.player_thread.position_changed.connect(
                         self.timeline_update_seconds
                     )
                     self.player_thread.start()
 
-                # Show notification
-                self.show_song_notification(song)
-
-                logger.info(f"{self.log_prefix}Now playing {song.song_file.filename}")
-                self.current_row = row
-
-                # Update UI
-                self.tray.setToolTip(f"Playing {song.song_file.filename}")
-
-                if isinstance(model, PlaylistModel):
-                    #         if not continue_:
-                    #             self.play_file_thread(song)
-                    current_tab.current_row = row
-
-                    # Select playing track
-                    current_tab.selectionModel().select(
-                        current_tab.model().index(current_tab.current_row, 0),
-                        QItemSelectionModel.SelectionFlag.SelectCurrent
-                        | QItemSelectionModel.SelectionFlag.Rows,
-                    )
+                self.show_now_playing(current_tab, row, song)
 
-                self.set_play_status(row, True)
+                if self.settings.value("gapless", False, type=bool):
+                    self.preload_next(row)
 
                 #             # bytes = 0
 
@@ -845,17 +1053,127 @@ class MainWindow(QtWidgets.QMainWindow):
     # def paused(self) -> None:
     #     self.play_action.setIcon(self.icons["pause"])
 
+    def show_now_playing(self, current_tab: PlaylistTreeView, row: int, song: Song) -> None:
+        # Show notification
+        self.show_song_notification(song)
+
+        logger.info(f"{self.log_prefix}Now playing {song.song_file.filename}")
+        self.current_row = row
+
+        # Update UI
+        self.tray.setToolTip(f"Playing {song.song_file.filename}")
+
+        if isinstance(current_tab.model(), PlaylistModel):
+            #         if not continue_:
+            #             self.play_file_thread(song)
+            current_tab.current_row = row
+
+            # Select playing track
+            current_tab.selectionModel().select(
+                current_tab.model().index(current_tab.current_row, 0),
+                QItemSelectionModel.SelectionFlag.SelectCurrent
+                | QItemSelectionModel.SelectionFlag.Rows,
+            )
+
+        self.set_play_status(row, True)
+
+    # Store the backend with the playlist entry, so it is tried first next time
+    def remember_player_backend(self, model, song: Song, backend_name: str) -> None:
+        if getattr(song.song_file, "player_backend", "") != backend_name:
+            song.song_file.player_backend = backend_name
+
+            if isinstance(model, PlaylistModel):
+                model.dirty = True
+
+    # Load and prerender the entry after row in the background (gapless mode)
+    def preload_next(self, row: int) -> None:
+        self.preload_row = -1
+        current_tab = self.get_current_tab()
+
+        if not current_tab or not self.audio_backend:
+            return
+
+        model = current_tab.model()
+
+        if row + 1 >= model.rowCount(current_tab.rootIndex()):
+            return
+
+        song = self.song_from_index(model.index(row + 1, 0))
+
+        if not song:
+            return
+
+        self.preload_row = row + 1
+        self.track_preloader = TrackPreloader(
+            self,
+            self.player_backends,
+            self.backend_probe,
+            PreloadedTrack(
+                row + 1,
+                song.song_file.filename,
+                getattr(song.song_file, "player_backend", ""),
+            ),
+            self.audio_backend.samplerate,
+            self.audio_backend.buffersize,
+            self.audio_backend.sample_format,
+        )
+        self.track_preloader.preloaded.connect(self.track_preloaded)
+        self.track_preloader.finished.connect(self.track_preloader.deleteLater)
+        self.track_preloader.start(QThread.Priority.LowPriority)
+
+    @QtCore.Slot()
+    def track_preloaded(self, track: PreloadedTrack) -> None:
+        if (
+            track.row == self.preload_row
+            and self.player_thread
+            and self.player_thread.isRunning()
+        ):
+            self.player_thread.queue_next(track)
+        else:
+            # Playback moved on in the meantime
+            track.free()
+
+    # PlayerThread continued with the preloaded track
+    @QtCore.Slot()
+    def track_changed(self, track: PreloadedTrack) -> None:
+        current_tab = self.get_current_tab()
+
+        self.player_backend = track.player_backend
+
+        if not current_tab:
+            return
+
+        self.set_play_status(current_tab.current_row, False)
+
+        song = self.song_from_index(current_tab.model().index(track.row, 0))
+
+        if song:
+            self.remember_player_backend(
+                current_tab.model(), song, track.backend_name
+            )
+            self.timeline.setMaximum(int(song.song_file.duration * 100))
+            self.time_total.setText(
+                str(datetime.timedelta(seconds=song.song_file.duration)).split(".")[0]
+            )
+            self.show_now_playing(current_tab, track.row, song)
+
+        self.preload_next(track.row)
+
     def stop(self) -> None:
+        # Drop any preloaded track
+        self.preload_row = -1
+
         if self.player_thread:
             logger.debug("Stopping player thread")
+            # Stopping wakes the thread from pause and from waiting on the
+            # audio backend, so it always ends after the chunk it's rendering
             self.player_thread.stop()
-            if not self.player_thread.wait(5000):
-                self.player_thread.terminate()
-                self.player_thread.wait()
+            self.player_thread.wait()
+
+            self.player_thread.queue_next(None)
 
             if self.player_backend:
                 self.player_backend.free_module()
-            self.audio_backend = None
 
             # self.play_button.setIcon(
             #     self.style().standardIcon(QStyle.StandardPixmap.SP_MediaPlay)
@@ -942,8 +1260,10 @@ class MainWindow(QtWidgets.QMainWindow):
     @QtCore.Slot()
     def timeline_released(self):
         self.timeline_tracking = True
-        # uade.seek(self.timeline.sliderPosition())
-        uade.seek_seconds(self.timeline.sliderPosition() / 100)
+
+        # The player thread seeks in the backend that is actually playing
+        if self.player_thread and self.player_thread.isRunning():
+            self.player_thread.seek(self.timeline.sliderPosition() / 100)
 
     @QtCore.Slot()
     def delete_clicked(self):
@@ -1017,6 +1337,66 @@ class MainWindow(QtWidgets.QMainWindow):
         self.modarchive_action.setEnabled(enable)
         self.songinfo_action.setEnabled(enable)
 
+    @QtCore.Slot()
+    def songs_loaded(self, songs: list[Song]) -> None:
+        self.add_songs(songs, self.loader_tab)
+
+        self.prioritize_timer.start()
+
+    @QtCore.Slot()
+    def length_resolved(self, song: Song, models: list) -> None:
+        # The playlists the song was added to store its length, durations are
+        # read from the songs on demand, so a repaint shows it
+        for model in models:
+            if isinstance(model, PlaylistModel):
+                model.dirty = True
+                model.column_changed(TREEVIEWCOL.DURATION)
+
+    @QtCore.Slot()
+    def visible_rows_changed(self) -> None:
+        # Wait for scrolling to settle
+        self.prioritize_timer.start()
+
+    @QtCore.Slot()
+    def prioritize_visible_rows(self) -> None:
+        current_tab = self.get_current_tab()
+
+        if not current_tab:
+            return
+
+        model = current_tab.model()
+        viewport = current_tab.viewport().rect()
+
+        first = current_tab.indexAt(viewport.topLeft()).row()
+        last = current_tab.indexAt(viewport.bottomLeft()).row()
+
+        if first < 0:
+            return
+
+        if last < 0:
+            last = model.rowCount() - 1
+
+        songs = []
+
+        for row in range(first, last + 1):
+            song = self.song_from_index(model.index(row, 0))
+
+            if song:
+                songs.append(song)
+
+        self.length_resolver.prioritize(songs)
+
+    @QtCore.Slot()
+    def loader_progress_changed(self, value: int) -> None:
+        if self.loader_progress:
+            self.loader_progress.setValue(value)
+
     @QtCore.Slot()
     def loader_finished(self):
+        if self.loader_progress:
+            self.loader_progress.close()
+            self.loader_progress.deleteLater()
+            self.loader_progress = None
+
+        self.loader_tab = None
         self.enable_ui(True)
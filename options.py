@@ -41,6 +41,83 @@ class OptionsGeneral(QtWidgets.QWidget):
         hbox.addWidget(self.samplerate_edit)
         hbox.addStretch()
 
+        buffer_ahead = self.settings.value("buffer_ahead", 250)
+        self.buffer_ahead_edit = QtWidgets.QLineEdit(str(buffer_ahead), self)
+        self.buffer_ahead_edit.setValidator(QIntValidator(0, 10000, self))
+
+        buffer_ahead_label = QtWidgets.QLabel("Buffer ahead (ms):", self)
+        buffer_ahead_label.setBuddy(self.buffer_ahead_edit)
+
+        hbox.addWidget(buffer_ahead_label)
+        hbox.addWidget(self.buffer_ahead_edit)
+        hbox.addStretch()
+
+        hbox = QtWidgets.QHBoxLayout()
+        audio_layout.addLayout(hbox)
+
+        seek_history = self.settings.value("seek_history", 60)
+        self.seek_history_edit = QtWidgets.QLineEdit(str(seek_history), self)
+        self.seek_history_edit.setValidator(QIntValidator(0, 600, self))
+
+        seek_history_label = QtWidgets.QLabel("Backward seek history (s):", self)
+        seek_history_label.setBuddy(self.seek_history_edit)
+
+        hbox.addWidget(seek_history_label)
+        hbox.addWidget(self.seek_history_edit)
+        hbox.addStretch()
+
+        self.gapless_checkbox = QtWidgets.QCheckBox("Gapless playback", self)
+        self.gapless_checkbox.setChecked(self.settings.value("gapless", False, type=bool))
+        audio_layout.addWidget(self.gapless_checkbox)
+
+        self.float_output_checkbox = QtWidgets.QCheckBox("Float output", self)
+        self.float_output_checkbox.setChecked(
+            self.settings.value("float_output", False, type=bool)
+        )
+        audio_layout.addWidget(self.float_output_checkbox)
+
+        self.quad_output_checkbox = QtWidgets.QCheckBox("Quad output (4 channels)", self)
+        self.quad_output_checkbox.setChecked(
+            self.settings.value("quad_output", False, type=bool)
+        )
+        audio_layout.addWidget(self.quad_output_checkbox)
+
+        scanning_group = QtWidgets.QGroupBox("Scanning", self)
+        scanning_layout = QtWidgets.QVBoxLayout(scanning_group)
+        layout.addWidget(scanning_group)
+
+        hbox = QtWidgets.QHBoxLayout()
+        scanning_layout.addLayout(hbox)
+
+        scan_time_budget = self.settings.value("scan_time_budget", 60)
+        self.scan_time_budget_edit = QtWidgets.QLineEdit(str(scan_time_budget), self)
+        self.scan_time_budget_edit.setValidator(QIntValidator(0, 3600, self))
+
+        scan_time_budget_label = QtWidgets.QLabel("Time budget per file (s):", self)
+        scan_time_budget_label.setBuddy(self.scan_time_budget_edit)
+
+        hbox.addWidget(scan_time_budget_label)
+        hbox.addWidget(self.scan_time_budget_edit)
+        hbox.addStretch()
+
+        playlists_group = QtWidgets.QGroupBox("Playlists", self)
+        playlists_layout = QtWidgets.QVBoxLayout(playlists_group)
+        layout.addWidget(playlists_group)
+
+        hbox = QtWidgets.QHBoxLayout()
+        playlists_layout.addLayout(hbox)
+
+        autosave_interval = self.settings.value("autosave_interval", 5)
+        self.autosave_interval_edit = QtWidgets.QLineEdit(str(autosave_interval), self)
+        self.autosave_interval_edit.setValidator(QIntValidator(0, 1440, self))
+
+        autosave_interval_label = QtWidgets.QLabel("Autosave interval (min, 0 = off):", self)
+        autosave_interval_label.setBuddy(self.autosave_interval_edit)
+
+        hbox.addWidget(autosave_interval_label)
+        hbox.addWidget(self.autosave_interval_edit)
+        hbox.addStretch()
+
 
 class Options(QtWidgets.QDialog):
     def __init__(self, parent, settings: QtCore.QSettings):
@@ -70,4 +147,25 @@ class Options(QtWidgets.QDialog):
         self.general.settings.setValue(
             "samplerate", int(self.general.samplerate_edit.text())
         )
+        self.general.settings.setValue(
+            "buffer_ahead", int(self.general.buffer_ahead_edit.text())
+        )
+        self.general.settings.setValue(
+            "seek_history", int(self.general.seek_history_edit.text())
+        )
+        self.general.settings.setValue(
+            "gapless", self.general.gapless_checkbox.isChecked()
+        )
+        self.general.settings.setValue(
+            "float_output", self.general.float_output_checkbox.isChecked()
+        )
+        self.general.settings.setValue(
+            "quad_output", self.general.quad_output_checkbox.isChecked()
+        )
+        self.general.settings.setValue(
+            "scan_time_budget", int(self.general.scan_time_budget_edit.text())
+        )
+        self.general.settings.setValue(
+            "autosave_interval", int(self.general.autosave_interval_edit.text())
+        )
         super().accept()
@@ -7,8 +7,18 @@ from loguru import logger
 
 sys.path.append("./libopenmpt_py")
 
+from file_cache import c_buffer, file_cache
 from libopenmpt_py import libopenmpt
 from player_backends.player_backend import PlayerBackend, SongMetadata
+from sample_format import SampleFormat
+
+# libopenmpt render function for each sample format
+SAMPLE_FORMAT_READERS = {
+    SampleFormat.INT16_STEREO: libopenmpt.openmpt_module_read_interleaved_stereo,
+    SampleFormat.FLOAT32_STEREO: libopenmpt.openmpt_module_read_interleaved_float_stereo,
+    SampleFormat.INT16_QUAD: libopenmpt.openmpt_module_read_interleaved_quad,
+    SampleFormat.FLOAT32_QUAD: libopenmpt.openmpt_module_read_interleaved_float_quad,
+}
 
 
 def error_callback():
@@ -48,8 +58,38 @@ def print_error(
 class PlayerBackendLibOpenMPT(PlayerBackend):
     def __init__(self) -> None:
         super().__init__()
+
+        # ctypes view of the last buffer passed to read_chunk_into
+        self.chunk_source: Optional[memoryview] = None
+        self.chunk_format: Optional[SampleFormat] = None
+        self.chunk_array: Optional[ctypes.Array] = None
+
         logger.debug("PlayerBackendLibOpenMPT initialized")
 
+    @classmethod
+    def probe(cls, header: bytes, filename: str, filesize: int) -> Optional[bool]:
+        error = ctypes.c_int()
+        error_message = ctypes.c_char_p()
+
+        result = libopenmpt.openmpt_probe_file_header(
+            libopenmpt.OPENMPT_PROBE_FILE_HEADER_FLAGS_DEFAULT,
+            header,
+            len(header),
+            filesize,
+            None,
+            None,
+            None,
+            None,
+            ctypes.byref(error),
+            ctypes.byref(error_message),
+        )
+
+        if result == libopenmpt.OPENMPT_PROBE_FILE_HEADER_RESULT_SUCCESS:
+            return True
+        if result == libopenmpt.OPENMPT_PROBE_FILE_HEADER_RESULT_FAILURE:
+            return False
+        return None
+
     def load_module(self, module_filename: str) -> bool:
         openmpt_log_func = ctypes.CFUNCTYPE(
             None, ctypes.c_void_p, ctypes.c_int, ctypes.c_char_p
@@ -63,12 +103,12 @@ class PlayerBackendLibOpenMPT(PlayerBackend):
         error = ctypes.c_int()
         error_message = ctypes.c_char_p()
 
-        self.module_data = open(module_filename, "rb").read()
+        self.module_data = file_cache.get(module_filename)
         self.module_size = len(self.module_data)
 
         logger.debug("Loading module")
         self.mod = load_mod(
-            self.module_data,  # const void * filedata
+            c_buffer(self.module_data),  # const void * filedata
             self.module_size,  # size_t filesize
             openmpt_log_func(log_callback),  # openmpt_log_func logfunc
             None,  # void * loguser
@@ -97,10 +137,32 @@ class PlayerBackendLibOpenMPT(PlayerBackend):
         return libopenmpt.openmpt_module_get_duration_seconds(self.mod)
 
     def read_chunk(self, samplerate: int, buffersize: int) -> tuple[int, bytes]:
+        buffer = bytearray(buffersize * self.sample_format.frame_size)
+        count = self.read_chunk_into(samplerate, memoryview(buffer))
+        return count // self.sample_format.frame_size, bytes(buffer)
+
+    def get_sample_formats(self) -> list[SampleFormat]:
+        return list(SAMPLE_FORMAT_READERS)
+
+    def read_chunk_into(self, samplerate: int, buffer: memoryview) -> int:
+        sample_format = self.sample_format
+
+        # Wrap the caller's memory once instead of allocating a new array per chunk
+        if buffer is not self.chunk_source or sample_format is not self.chunk_format:
+            sample_type = ctypes.c_float if sample_format.is_float else ctypes.c_short
+
+            self.chunk_source = buffer
+            self.chunk_format = sample_format
+            self.chunk_array = (
+                sample_type * (len(buffer) // sample_format.sample_size)
+            ).from_buffer(buffer)
+
         libopenmpt.openmpt_module_error_clear(self.mod)
-        buffer = (ctypes.c_short * (buffersize * 2))()
-        frame_count = libopenmpt.openmpt_module_read_interleaved_stereo(
-            self.mod, samplerate, buffersize, buffer
+        frame_count = SAMPLE_FORMAT_READERS[sample_format](
+            self.mod,
+            samplerate,
+            len(buffer) // sample_format.frame_size,
+            self.chunk_array,
         )
         mod_err = libopenmpt.openmpt_module_error_get_last(self.mod)
         mod_err_str = libopenmpt.openmpt_module_error_get_last_message(self.mod)
@@ -112,11 +174,21 @@ class PlayerBackendLibOpenMPT(PlayerBackend):
                 mod_err_str,
             )
             libopenmpt.openmpt_free_string(mod_err_str)
-        return frame_count, bytes(buffer)
+        return frame_count * sample_format.frame_size
 
     def get_position_seconds(self) -> float:
         return libopenmpt.openmpt_module_get_position_seconds(self.mod)
 
+    def seek(self, seconds: float) -> bool:
+        libopenmpt.openmpt_module_set_position_seconds(self.mod, seconds)
+        return True
+
+    def get_subsongs(self) -> list[int]:
+        return list(range(libopenmpt.openmpt_module_get_num_subsongs(self.mod)))
+
+    def select_subsong(self, subsong: int) -> bool:
+        return libopenmpt.openmpt_module_select_subsong(self.mod, subsong) == 1
+
     def get_module_title(self) -> Optional[str]:
         return libopenmpt.openmpt_module_get_metadata(self.mod, b"title")
 
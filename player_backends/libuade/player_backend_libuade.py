@@ -1,12 +1,15 @@
 import ctypes
+from typing import Optional
 
 import debugpy
 
+from file_cache import c_buffer, file_cache
 from player_backends.libuade import songinfo
 from player_backends.libuade.ctypes_classes import (
     UADE_BYTES_PER_FRAME,
     UADE_MAX_MESSAGE_SIZE,
     UADE_NOTIFICATION_TYPE,
+    UADE_SEEK_MODE,
     uade_config,
     uade_effect,
     uade_event,
@@ -24,6 +27,7 @@ from player_backends.libuade.ctypes_functions import libuade
 from loguru import logger
 
 from player_backends.player_backend import PlayerBackend
+from player_backends.render_history import RenderHistory
 
 
 class PlayerBackendLibUADE(PlayerBackend):
@@ -33,22 +37,48 @@ class PlayerBackendLibUADE(PlayerBackend):
         self.config_ptr: ctypes._Pointer[uade_config] = libuade.uade_new_config()
         # self.config = ctypes.cast(libuade.uade_new_config(), ctypes.POINTER(uade_config))
 
+        # Reused for every chunk
+        self.notification = uade_notification()
+        self.chunk_source: Optional[memoryview] = None
+        self.chunk_array: Optional[ctypes.Array] = None
+
+        # UADE seeks by emulating from the start of the subsong again, the
+        # interactive player keeps recent audio so backward seeks into it are
+        # replayed from memory (see set_seek_history)
+        self.history: Optional[RenderHistory] = None
+        self.replay_position: Optional[int] = None
+
         logger.debug("PlayerBackendUADE initialized")
 
-    def load_module(self, module_filename: str) -> bool:
-        self.module_size = ctypes.c_size_t()
-        ret = libuade.uade_read_file(
-            ctypes.byref(self.module_size), str.encode(module_filename)
+    @classmethod
+    def probe(cls, header: bytes, filename: str, filesize: int) -> Optional[bool]:
+        pre = ctypes.create_string_buffer(11)
+        buf = (ctypes.c_ubyte * len(header)).from_buffer_copy(header)
+
+        libuade.uade_filemagic(
+            buf, len(header), pre, filesize, filename.encode("utf-8", "surrogateescape"), 0
         )
 
-        if not ret:
+        if pre.value:
+            return True
+
+        # UADE also detects formats by file name prefix/extension, so no content
+        # match doesn't rule it out
+        return None
+
+    def load_module(self, module_filename: str) -> bool:
+        try:
+            # Kept referenced while the module is loaded
+            self.module_data = file_cache.get(module_filename)
+        except OSError:
             error_message = f"Could not read file {module_filename}"
             logger.error(error_message)
             return False
 
-        ret = libuade.uade_play_from_buffer(
-            None, ret, self.module_size, -1, self.state_ptr
-        )
+        self.module_size = len(self.module_data)
+        self.module_filename = module_filename
+
+        ret = self.play_from_buffer(-1)
 
         if ret < 1:
             error_message = f"LibUADE is unable to play {module_filename}"
@@ -63,6 +93,35 @@ class PlayerBackendLibUADE(PlayerBackend):
 
         return True
 
+    def play_from_buffer(self, subsong: int) -> int:
+        return libuade.uade_play_from_buffer(
+            str.encode(self.module_filename),
+            c_buffer(self.module_data),
+            self.module_size,
+            subsong,
+            self.state_ptr,
+        )
+
+    def get_samplerate(self, samplerate: int) -> int:
+        # UADE renders at the rate it was configured with
+        return libuade.uade_get_sampling_rate(self.state_ptr)
+
+    def get_subsongs(self) -> list[int]:
+        subsongs = libuade.uade_get_song_info(self.state_ptr).contents.subsongs
+        return list(range(subsongs.min, subsongs.max + 1))
+
+    def select_subsong(self, subsong: int) -> bool:
+        # UADE can only change subsongs by starting the song again
+        if libuade.uade_stop(self.state_ptr) != 0:
+            logger.error("uade_stop error")
+            return False
+
+        if self.history:
+            self.history.clear()
+        self.replay_position = None
+
+        return self.play_from_buffer(subsong) >= 1
+
     def get_module_length(self) -> float:
         info = libuade.uade_get_song_info(self.state_ptr).contents
         bytes_per_second = UADE_BYTES_PER_FRAME * libuade.uade_get_sampling_rate(
@@ -76,20 +135,70 @@ class PlayerBackendLibUADE(PlayerBackend):
             return deciseconds / 10.0
 
     def get_position_seconds(self) -> float:
-        info = libuade.uade_get_song_info(self.state_ptr).contents
         bytes_per_second = UADE_BYTES_PER_FRAME * libuade.uade_get_sampling_rate(
             self.state_ptr
         )
-        deciseconds = (info.subsongbytes * 10) // bytes_per_second
+
+        if self.replay_position is not None:
+            position = self.replay_position
+        else:
+            position = libuade.uade_get_song_info(self.state_ptr).contents.subsongbytes
+
+        deciseconds = (position * 10) // bytes_per_second
 
         return deciseconds / 10.0
 
     def read_chunk(self, samplerate: int, buffersize: int) -> tuple[int, bytes]:
+        buf = bytearray(buffersize)
+        nbytes = self.read_chunk_into(samplerate, memoryview(buf))
+        return nbytes, bytes(buf)
+
+    def seek(self, seconds: float) -> bool:
+        samplerate = libuade.uade_get_sampling_rate(self.state_ptr)
+        position = int(seconds * samplerate) * UADE_BYTES_PER_FRAME
+
+        if self.history and self.history.contains(position):
+            self.replay_position = position
+            return True
+
+        self.replay_position = None
+
+        info = libuade.uade_get_song_info(self.state_ptr).contents
+
+        if (
+            libuade.uade_seek(
+                UADE_SEEK_MODE.UADE_SEEK_SUBSONG_RELATIVE,
+                seconds,
+                info.subsongs.cur,
+                self.state_ptr,
+            )
+            != 0
+        ):
+            logger.error("Seeking failed")
+            return False
+        return True
+
+    def read_chunk_into(self, samplerate: int, buffer: memoryview) -> int:
         # debugpy.debug_this_thread()
-        buf = (ctypes.c_char * buffersize)()
-        n = uade_notification()
+        # After a backward seek into the history play that until it catches up
+        # with the emulation
+        if self.history and self.replay_position is not None:
+            count = self.history.read_into(self.replay_position, buffer)
+            self.replay_position += count
+
+            if self.replay_position >= self.history.end:
+                self.replay_position = None
+
+            if count:
+                return count
 
-        nbytes = libuade.uade_read(buf, ctypes.sizeof(buf), self.state_ptr)
+        if buffer is not self.chunk_source:
+            self.chunk_source = buffer
+            self.chunk_array = (ctypes.c_char * len(buffer)).from_buffer(buffer)
+
+        n = self.notification
+
+        nbytes = libuade.uade_read(self.chunk_array, len(buffer), self.state_ptr)
 
         while libuade.uade_read_notification(n, self.state_ptr):
             try:
@@ -107,11 +216,15 @@ class PlayerBackendLibUADE(PlayerBackend):
         if nbytes < 0:
             raise RuntimeError("Playback error")
 
+        if self.history and nbytes > 0:
+            subsongbytes = libuade.uade_get_song_info(self.state_ptr).contents.subsongbytes
+            self.history.append(subsongbytes - nbytes, buffer[:nbytes])
+
         if nbytes == 0:
             # raise RuntimeWarning("Song end")
             logger.info("Song end")
 
-        return nbytes, bytes(buf)
+        return nbytes
 
     def handle_notification(self, n: uade_notification) -> None:
         if n.type == UADE_NOTIFICATION_TYPE.UADE_NOTIFICATION_MESSAGE:
@@ -145,7 +258,28 @@ class PlayerBackendLibUADE(PlayerBackend):
         logger.info("event type: {}", event.type)
         return event
 
+    def set_seek_history(self, seconds: float) -> None:
+        self.replay_position = None
+
+        if seconds <= 0:
+            self.history = None
+            return
+
+        capacity = (
+            int(seconds * libuade.uade_get_sampling_rate(self.state_ptr))
+            * UADE_BYTES_PER_FRAME
+        )
+
+        if not self.history or self.history.capacity != capacity:
+            self.history = RenderHistory(capacity)
+        else:
+            self.history.clear()
+
     def free_module(self) -> None:
+        if self.history:
+            self.history.clear()
+        self.replay_position = None
+
         if self.state_ptr:
             libuade.uade_cleanup_state(self.state_ptr)
             self.state_ptr = libuade.uade_new_state(None)
@@ -1,7 +1,10 @@
+import mmap
 import os
+import struct
 from enum import Enum
 from typing import Dict, List, Union
 
+from file_cache import file_cache
 from player_backends.libuade.ctypes_functions import libuade
 from ctypes import POINTER, c_ubyte, cast, create_string_buffer
 from typing import TypedDict
@@ -35,14 +38,37 @@ class Credits(TypedDict):
     file_prefix: str
 
 
+# Characters shown as "." in asciiline
+ASCIILINE_TABLE = {
+    c: "." for c in range(256) if not chr(c).isprintable() or chr(c).isspace()
+}
+
+# Characters shown as "." in hexdump
+HEXDUMP_TABLE = {c: "." for c in range(256) if not 32 <= c < 127}
+
+# ProTracker instrument header: name, length, finetune, volume, loop start and
+# loop length, lengths are in words
+PTK_INSTRUMENT = struct.Struct(">22sHBBHH")
+PTK_INSTRUMENTS_OFFSET = 0x14
+
+# DigiBooster keeps the instrument data in tables of 31 entries each
+DIGI_INSTRUMENTS = 0x1F
+DIGI_SIZES = struct.Struct(f">{DIGI_INSTRUMENTS}I")
+DIGI_SIZES_OFFSET = 176
+DIGI_LOOP_STARTS_OFFSET = 300
+DIGI_LOOP_SIZES_OFFSET = 424
+DIGI_VOLUMES_OFFSET = 548
+DIGI_FINETUNES_OFFSET = 579
+DIGI_TITLE_OFFSET = 610
+DIGI_NAMES_OFFSET = 642
+DIGI_NAME_LENGTH = 0x1E
+
+# Tag/value pairs of the custom module tag table
+CUSTOM_TAG = struct.Struct(">II")
+
+
 def asciiline(buf: bytes) -> str:
-    dst = []
-    for c in buf[:16]:
-        if chr(c).isprintable() and not chr(c).isspace():
-            dst.append(chr(c))
-        else:
-            dst.append(".")
-    return "".join(dst)
+    return bytes(buf[:16]).decode("latin-1").translate(ASCIILINE_TABLE)
 
 
 def hexdump(filename: str, toread: int) -> str:
@@ -57,21 +83,17 @@ def hexdump(filename: str, toread: int) -> str:
 
     result = []
     rb = len(buf)
-    roff = 0
 
-    while roff < rb:
+    for roff in range(0, rb, 16):
         line = f"{roff:03x}:  "
         if roff + 16 > rb:
             line += "Aligned line  "
         else:
-            hex_part = " ".join(f"{buf[roff + i]:02x}" for i in range(16))
-            ascii_part = "".join(
-                chr(buf[roff + i]) if 32 <= buf[roff + i] < 127 else "."
-                for i in range(16)
-            )
+            row = buf[roff : roff + 16]
+            hex_part = row.hex(" ")
+            ascii_part = row.decode("latin-1").translate(HEXDUMP_TABLE)
             line += f"{hex_part[:23]}  {hex_part[24:]}  |{ascii_part}|"
         result.append(line)
-        roff += 16
 
     return "\n".join(result)
 
@@ -80,22 +102,22 @@ def find_tag(buf: bytes, startoffset: int, buflen: int, tag: bytes) -> int:
     if startoffset >= buflen:
         return -1
 
-    taglen = len(tag)
-    for i in range(startoffset, buflen - taglen + 1):
-        if buf[i : i + taglen] == tag:
-            return i
-    return -1
+    return buf.find(tag, startoffset, buflen)
 
 
 def string_checker(buf: bytes, off: int, maxoff: int) -> bool:
     if maxoff <= 0:
         raise ValueError("maxoff must be greater than 0")
 
-    while off < maxoff:
-        if buf[off] == 0:
-            return True
-        off += 1
-    return False
+    return off < maxoff and buf.find(b"\x00", off, maxoff) >= 0
+
+
+# NUL terminated string at offset, only the string itself is copied out of buf
+def c_string(buf: bytes, offset: int, maxlen: int = -1) -> str:
+    end = len(buf) if maxlen < 0 else min(offset + maxlen, len(buf))
+    nul = buf.find(b"\x00", offset, end)
+
+    return bytes(buf[offset : nul if nul >= 0 else end]).decode("cp1251")
 
 
 def process_WTWT_mod(
@@ -118,57 +140,52 @@ def process_WTWT_mod(
     offset += rel
 
     if chunk < len_buf and offset < len_buf:
-        txt_offset = int.from_bytes(buf[offset : offset + 4], "big") + chunk
-        if txt_offset < len_buf and txt_offset != chunk:
-            if not string_checker(buf, txt_offset, len_buf):
-                raise ValueError("Invalid string at MODULENAME")
-            credits["modulename"] = (
-                buf[txt_offset:].split(b"\x00", 1)[0].decode("cp1251")
-            )
-
-        txt_offset = int.from_bytes(buf[offset + 4 : offset + 8], "big") + chunk
-        if txt_offset < len_buf and txt_offset != chunk:
-            if not string_checker(buf, txt_offset, len_buf):
-                raise ValueError("Invalid string at AUTHORNAME")
-            credits["authorname"] = (
-                buf[txt_offset:].split(b"\x00", 1)[0].decode("cp1251")
-            )
-
-        txt_offset = int.from_bytes(buf[offset + 8 : offset + 12], "big") + chunk
-        if txt_offset < len_buf and txt_offset != chunk:
-            if not string_checker(buf, txt_offset, len_buf):
-                raise ValueError("Invalid string at SPECIALINFO")
-            credits["specialinfo"] = (
-                buf[txt_offset:].split(b"\x00", 1)[0].decode("cp1251")
-            )
+        fields = (
+            ("modulename", "MODULENAME"),
+            ("authorname", "AUTHORNAME"),
+            ("specialinfo", "SPECIALINFO"),
+        )
+
+        # Each offset is read on its own, a truncated file still yields the
+        # fields before the cut (a partial offset reads as a smaller value)
+        for i, (key, name) in enumerate(fields):
+            field = offset + i * 4
+            txt_offset = int.from_bytes(buf[field : field + 4], "big") + chunk
+            if txt_offset < len_buf and txt_offset != chunk:
+                if not string_checker(buf, txt_offset, len_buf):
+                    raise ValueError(f"Invalid string at {name}")
+                credits[key] = c_string(buf, txt_offset)
     else:
         raise ValueError("Invalid chunk or offset")
 
 
 def process_ahx_mod(credits: Credits, buf: bytes) -> None:
-    if len(buf) < 13:
+    len_buf = len(buf)
+    if len_buf < 13:
         raise ValueError("Buffer too short for AHX module")
 
-    offset = int.from_bytes(buf[4:6], "big")
+    (offset,) = struct.unpack_from(">H", buf, 4)
 
-    if offset >= len(buf):
+    if offset >= len_buf:
         raise ValueError("Offset out of range")
 
-    if not string_checker(buf, offset, len(buf)):
+    if not string_checker(buf, offset, len_buf):
         raise ValueError("Invalid string at song title")
 
-    credits["song_title"] = buf[offset:].split(b"\x00", 1)[0].decode("cp1251")
+    credits["song_title"] = c_string(buf, offset)
 
     instrument_names: List[InstrumentInfo] = []
     for i in range(buf[12]):
-        if not string_checker(buf, offset, len(buf)):
+        # Names follow each other, each one terminated by a NUL
+        nul = buf.find(b"\x00", offset, len_buf)
+        if nul < 0:
             break
-        offset = offset + 1 + len(buf[offset:].split(b"\x00", 1)[0])
-        if offset < len(buf):
+        offset = nul + 1
+        if offset < len_buf:
             instrument_names.append(
                 InstrumentInfo(
                     index=i + 1,
-                    name=buf[offset:].split(b"\x00", 1)[0].decode("cp1251"),
+                    name=c_string(buf, offset),
                     size=0,
                     vol=0,
                     fine=0,
@@ -185,152 +202,241 @@ def process_ptk_mod(
     inst: int,
     buf: bytes,
 ) -> None:
-    if not string_checker(buf, 0, len(buf)):
+    len_buf = len(buf)
+    if not string_checker(buf, 0, len_buf):
         raise ValueError("Invalid string at song title")
 
-    credits["song_title"] = buf[:20].split(b"\x00", 1)[0].decode("cp1251")
+    credits["song_title"] = c_string(buf, 0, 20)
 
     if inst == 31:
-        if len(buf) >= 0x43C:
+        if len_buf >= 0x43C:
             credits["max_positions"] = buf[0x3B6]
     else:
-        if len(buf) >= 0x1DA:
+        if len_buf >= 0x1DA:
             credits["max_positions"] = buf[0x1D6]
 
     inst_info: List[InstrumentInfo] = []
-    if len(buf) >= (0x14 + inst * 0x1E):
-        for i in range(inst):
-            if not string_checker(buf, 0x14 + i * 0x1E, len(buf)):
-                break
-            name = (
-                buf[0x14 + (i * 0x1E) : 0x14 + (i * 0x1E) + 22]
-                .split(b"\x00", 1)[0]
-                .decode("cp1251")
-            )
-            size = int.from_bytes(buf[42 + i * 0x1E : 44 + i * 0x1E], "big") * 2
-            vol = buf[45 + i * 0x1E]
-            fine = buf[44 + i * 0x1E]
-            lstart = int.from_bytes(buf[46 + i * 0x1E : 48 + i * 0x1E], "big") * 2
-            lsize = int.from_bytes(buf[48 + i * 0x1E : 50 + i * 0x1E], "big") * 2
-            inst_info.append(
-                InstrumentInfo(
-                    index=i + 1,
-                    name=name,
-                    size=size,
-                    vol=vol,
-                    fine=fine,
-                    lstart=lstart,
-                    lsize=lsize,
+    end = PTK_INSTRUMENTS_OFFSET + inst * PTK_INSTRUMENT.size
+    if len_buf >= end:
+        # The last NUL in the file decides how far instrument names are valid
+        last_nul = buf.rfind(b"\x00")
+
+        with memoryview(buf) as view:
+            records = PTK_INSTRUMENT.iter_unpack(view[PTK_INSTRUMENTS_OFFSET:end])
+
+            for i, (name, size, fine, vol, lstart, lsize) in enumerate(records):
+                if last_nul < PTK_INSTRUMENTS_OFFSET + i * PTK_INSTRUMENT.size:
+                    break
+                inst_info.append(
+                    InstrumentInfo(
+                        index=i + 1,
+                        name=c_string(name, 0),
+                        size=size * 2,
+                        vol=vol,
+                        fine=fine,
+                        lstart=lstart * 2,
+                        lsize=lsize * 2,
+                    )
                 )
-            )
     credits["instruments"] = inst_info
 
 
 def process_digi_mod(credits: Credits, buf: bytes) -> None:
-    if len(buf) < (642 + 0x30 * 0x1E):
+    len_buf = len(buf)
+    if len_buf < (DIGI_NAMES_OFFSET + 0x30 * DIGI_NAME_LENGTH):
         raise ValueError("Buffer too short for DigiBooster module")
 
-    if not string_checker(buf, 610, len(buf)):
+    if not string_checker(buf, DIGI_TITLE_OFFSET, len_buf):
         raise ValueError("Invalid string at song title")
 
-    credits["song_title"] = buf[610:].split(b"\x00", 1)[0].decode("cp1251")
+    credits["song_title"] = c_string(buf, DIGI_TITLE_OFFSET)
     credits["max_positions"] = buf[47]
 
+    sizes = DIGI_SIZES.unpack_from(buf, DIGI_SIZES_OFFSET)
+    lstarts = DIGI_SIZES.unpack_from(buf, DIGI_LOOP_STARTS_OFFSET)
+    lsizes = DIGI_SIZES.unpack_from(buf, DIGI_LOOP_SIZES_OFFSET)
+    vols = buf[DIGI_VOLUMES_OFFSET : DIGI_VOLUMES_OFFSET + DIGI_INSTRUMENTS]
+    fines = buf[DIGI_FINETUNES_OFFSET : DIGI_FINETUNES_OFFSET + DIGI_INSTRUMENTS]
+
+    # The last NUL in the file decides how far instrument names are valid
+    last_nul = buf.rfind(b"\x00")
+
     inst_info: List[InstrumentInfo] = []
-    if len(buf) >= (642 + 0x1F * 0x1E):
-        for i in range(0x1F):
-            if not string_checker(buf, 642 + i * 0x1E, len(buf)):
-                break
-            name = (
-                buf[642 + (i * 0x1E) : 642 + (i * 0x1E) + 30]
-                .split(b"\x00", 1)[0]
-                .decode("cp1251")
-            )
-            size = int.from_bytes(buf[176 + i * 4 : 180 + i * 4], "big")
-            vol = buf[548 + i]
-            fine = buf[579 + i]
-            lstart = int.from_bytes(buf[300 + i * 4 : 304 + i * 4], "big")
-            lsize = int.from_bytes(buf[424 + i * 4 : 428 + i * 4], "big")
-            inst_info.append(
-                InstrumentInfo(
-                    index=i + 1,
-                    name=name,
-                    size=size,
-                    vol=vol,
-                    fine=fine,
-                    lstart=lstart,
-                    lsize=lsize,
-                )
+    for i in range(DIGI_INSTRUMENTS):
+        offset = DIGI_NAMES_OFFSET + i * DIGI_NAME_LENGTH
+        if last_nul < offset:
+            break
+        inst_info.append(
+            InstrumentInfo(
+                index=i + 1,
+                name=c_string(buf, offset, DIGI_NAME_LENGTH),
+                size=sizes[i],
+                vol=vols[i],
+                fine=fines[i],
+                lstart=lstarts[i],
+                lsize=lsizes[i],
             )
+        )
     credits["instruments"] = inst_info
 
 
 def process_custom(credits: Credits, buf: bytes) -> None:
-    if len(buf) < 4:
+    len_buf = len(buf)
+    if len_buf < 4:
         raise ValueError("Buffer too short for custom module")
 
-    if int.from_bytes(buf[:4], "big") != 0x000003F3:
+    if struct.unpack_from(">I", buf)[0] != 0x000003F3:
         raise ValueError("Invalid custom module header")
 
     startpattern = b"\x70\xff\x4e\x75"
-    i = find_tag(buf, 0, len(buf), startpattern)
-    if i == -1 or (i + 12) >= len(buf):
+    i = find_tag(buf, 0, len_buf, startpattern)
+    if i == -1 or (i + 12) >= len_buf:
         raise ValueError("Start pattern not found or out of range")
 
     if buf[i + 4 : i + 12] not in [b"DELIRIUM", b"EPPLAYER"]:
         raise ValueError("Invalid custom module tag")
 
-    hunk = buf[i:]
-    hunk_size = len(buf) - i
+    # Offsets in the hunk are relative to the start pattern
+    hunk_size = len_buf - i
 
-    if 16 + i + 5 >= hunk_size:
+    if 16 + 5 >= hunk_size:
         raise ValueError("Hunk size too small")
 
-    if hunk[16:21] == b"$VER:":
-        offset = 21
-        while offset < hunk_size and hunk[offset] == b" ":
+    if buf[i + 16 : i + 21] == b"$VER:":
+        offset = i + 21
+        while offset < len_buf and buf[offset] == 0x20:
             offset += 1
-        if offset >= hunk_size:
+        if offset >= len_buf:
             raise ValueError("Invalid version string")
 
-        version_end = hunk[offset:].find(b"\x00")
-        if version_end == -1:
+        if buf.find(b"\x00", offset) == -1:
             raise ValueError("Invalid version string termination")
 
-        credits["specialinfo"] = hunk[offset : offset + version_end].decode("cp1251")
+        credits["specialinfo"] = c_string(buf, offset)
 
-    offset = int.from_bytes(hunk[12:16], "big")
-    if offset < 0:
-        raise ValueError("Invalid offset in custom module")
-
-    tag_table = hunk[offset:]
-    if tag_table >= buf[len(buf) :]:
+    (offset,) = struct.unpack_from(">I", buf, i + 12)
+    if offset >= hunk_size:
         raise ValueError("Tag table out of range")
 
-    table_size = len(tag_table) // 8
+    table_size = (hunk_size - offset) // CUSTOM_TAG.size
     if table_size <= 0:
         raise ValueError("Invalid tag table size")
 
-    for i in range(0, table_size, 2):
-        x = int.from_bytes(tag_table[4 * i : 4 * (i + 1)], "big")
-        y = int.from_bytes(tag_table[4 * (i + 1) : 4 * (i + 2)], "big")
+    with memoryview(buf) as view:
+        table_start = i + offset
+        table = view[table_start : table_start + table_size * CUSTOM_TAG.size]
 
-        if x == 0:
-            break
+        for x, y in CUSTOM_TAG.iter_unpack(table):
+            if x == 0:
+                break
 
-        if x == 0x8000445A:
-            if y >= hunk_size:
-                raise ValueError("Credit offset out of range")
-            credit_end = hunk[y:].find(b"\x00")
-            if credit_end == -1:
-                raise ValueError("Invalid credit string termination")
-            credits["authorname"] = hunk[y : y + credit_end].decode("cp1251")
+            if x == 0x8000445A:
+                if y >= hunk_size:
+                    raise ValueError("Credit offset out of range")
+                if buf.find(b"\x00", i + y) == -1:
+                    raise ValueError("Invalid credit string termination")
+                credits["authorname"] = c_string(buf, i + y)
 
 
 def process_dm2_mod(credits: Credits, buf: bytes) -> None:
     if not string_checker(buf, 0x148, len(buf)):
         raise ValueError("Invalid string at remarks")
-    credits["specialinfo"] = buf[0x148:].split(b"\x00", 1)[0].decode("cp1251")
+    credits["specialinfo"] = c_string(buf, 0x148)
+
+
+# Format handlers keyed by the prefix uade_filemagic determined
+PTK15_PREFIXES = {"MOD15", "MOD15_UST", "MOD15_MST", "MOD15_ST-IV"}
+PTK31_PREFIXES = {
+    "MOD",
+    "MOD_DOC",
+    "MOD_NTK",
+    "MOD_NTK1",
+    "MOD_NTK2",
+    "MOD_FLT4",
+    "MOD_FLT8",
+    "MOD_ADSC4",
+    "MOD_ADSC8",
+    "MOD_COMP",
+    "MOD_NTKAMP",
+    "PPK",
+    "MOD_PC",
+    "ICE",
+    "ADSC",
+}
+WTWT_TAGS = {
+    "DL": (b"UNCL", b"EART", 0x28),
+    "BSS": (b"BEAT", b"HOVE", 0x1C),
+    "GRAY": (b"FRED", b"GRAY", 0x10),
+    "JMF": (b"J.FL", b"OGEL", 0x14),
+    "SPL": (b"!SOP", b"ROL!", 0x10),
+    "HD": (b"H.DA", b"VIES", 24),
+    "RIFF": (b"RIFF", b"RAFF", 0x14),
+    "FP": (b"F.PL", b"AYER", 0x8),
+    "CORE": (b"S.PH", b"IPPS", 0x20),
+    "BDS": (b"DAGL", b"ISH!", 0x14),
+}
+
+
+# Like UADE itself, uade_filemagic is only given the start of a file
+MAGIC_HEADER_SIZE = 8192
+
+# Formats whose credits are all within the header, others need the whole file
+# for tag scans or strings at arbitrary offsets
+HEADER_PREFIXES = PTK15_PREFIXES | PTK31_PREFIXES | {"DIGI"}
+
+
+def read_header(filename: str, size: int = MAGIC_HEADER_SIZE) -> bytearray:
+    header = bytearray(size)
+
+    with open(filename, "rb", buffering=0) as f:
+        read = f.readinto(header)
+
+    del header[read:]
+    return header
+
+
+# Prefix of the format uade_filemagic detects, buf can be a header with
+# filesize the size of the whole file
+def file_prefix(buf: Union[bytes, bytearray], filename: str, filesize: int = -1) -> str:
+    modfilelen = len(buf)
+    pre = create_string_buffer(11)
+
+    # Writable buffers (bytearray, copy-on-write mappings) are passed without copying
+    if isinstance(buf, bytes):
+        buf_ctype = (c_ubyte * modfilelen).from_buffer_copy(buf)
+    else:
+        buf_ctype = (c_ubyte * modfilelen).from_buffer(buf)
+
+    buf_ptr = cast(buf_ctype, POINTER(c_ubyte))
+    libuade.uade_filemagic(
+        buf_ptr,
+        modfilelen,
+        pre,
+        filesize if filesize >= 0 else modfilelen,
+        filename.encode("cp1251"),
+        0,
+    )
+
+    return pre.value.decode("cp1251")
+
+
+def parse_credits(credits: Credits, pre_str: str, buf: bytes) -> None:
+    if pre_str == "CUST":
+        process_custom(credits, buf)
+    elif pre_str == "DM2":
+        process_dm2_mod(credits, buf)
+    elif pre_str == "DIGI":
+        process_digi_mod(credits, buf)
+    elif pre_str in ["AHX", "THX"]:
+        process_ahx_mod(credits, buf)
+    elif pre_str in PTK15_PREFIXES:
+        process_ptk_mod(credits, 15, buf)
+    elif pre_str in PTK31_PREFIXES:
+        process_ptk_mod(credits, 31, buf)
+    elif pre_str in WTWT_TAGS:
+        process_WTWT_mod(credits, buf, *WTWT_TAGS[pre_str])
+    else:
+        raise ValueError(f"Unknown file prefix: {pre_str}")
 
 
 def process_module(
@@ -339,10 +445,7 @@ def process_module(
     if not os.path.isfile(filename):
         raise FileNotFoundError(f"File {filename} not found")
 
-    with open(filename, "rb") as f:
-        buf = f.read()
-
-    modfilelen = len(buf)
+    modfilelen = os.path.getsize(filename)
     credits: Credits = {
         "song_title": "",
         "max_positions": 0,
@@ -355,68 +458,17 @@ def process_module(
         "file_prefix": "",
     }
 
-    pre = create_string_buffer(11)
-
-    buf_ctype = (c_ubyte * modfilelen).from_buffer_copy(buf)
-    buf_ptr = cast(buf_ctype, POINTER(c_ubyte))
-    libuade.uade_filemagic(
-        buf_ptr, modfilelen, pre, modfilelen, filename.encode("cp1251"), 0
-    )
-
-    pre_str = pre.value.decode("cp1251")
+    header = read_header(filename)
+    pre_str = file_prefix(header, filename, modfilelen)
 
     credits["file_prefix"] = f"{pre_str}.*"
 
-    if pre_str == "CUST":
-        process_custom(credits, buf)
-    elif pre_str == "DM2":
-        process_dm2_mod(credits, buf)
-    elif pre_str == "DIGI":
-        process_digi_mod(credits, buf)
-    elif pre_str in ["AHX", "THX"]:
-        process_ahx_mod(credits, buf)
-    elif pre_str in ["MOD15", "MOD15_UST", "MOD15_MST", "MOD15_ST-IV"]:
-        process_ptk_mod(credits, 15, buf)
-    elif pre_str in [
-        "MOD",
-        "MOD_DOC",
-        "MOD_NTK",
-        "MOD_NTK1",
-        "MOD_NTK2",
-        "MOD_FLT4",
-        "MOD_FLT8",
-        "MOD_ADSC4",
-        "MOD_ADSC8",
-        "MOD_COMP",
-        "MOD_NTKAMP",
-        "PPK",
-        "MOD_PC",
-        "ICE",
-        "ADSC",
-    ]:
-        process_ptk_mod(credits, 31, buf)
-    elif pre == "DL":
-        process_WTWT_mod(credits, buf, b"UNCL", b"EART", 0x28)
-    elif pre == "BSS":
-        process_WTWT_mod(credits, buf, b"BEAT", b"HOVE", 0x1C)
-    elif pre == "GRAY":
-        process_WTWT_mod(credits, buf, b"FRED", b"GRAY", 0x10)
-    elif pre == "JMF":
-        process_WTWT_mod(credits, buf, b"J.FL", b"OGEL", 0x14)
-    elif pre == "SPL":
-        process_WTWT_mod(credits, buf, b"!SOP", b"ROL!", 0x10)
-    elif pre == "HD":
-        process_WTWT_mod(credits, buf, b"H.DA", b"VIES", 24)
-    elif pre == "RIFF":
-        process_WTWT_mod(credits, buf, b"RIFF", b"RAFF", 0x14)
-    elif pre == "FP":
-        process_WTWT_mod(credits, buf, b"F.PL", b"AYER", 0x8)
-    elif pre == "CORE":
-        process_WTWT_mod(credits, buf, b"S.PH", b"IPPS", 0x20)
-    elif pre == "BDS":
-        process_WTWT_mod(credits, buf, b"DAGL", b"ISH!", 0x14)
-    else:
-        raise ValueError(f"Unknown file prefix: {pre}")
+    # Only formats that need more than the header read the whole file
+    buf: Union[bytes, bytearray, mmap.mmap] = header
+    if pre_str not in HEADER_PREFIXES and len(header) < modfilelen:
+        buf = file_cache.get(filename)
+
+    parse_credits(credits, pre_str, buf)
 
     return credits
 
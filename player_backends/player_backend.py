@@ -1,8 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, TypedDict
+from typing import Any, Dict, Optional, TypedDict
 import os
 
 from player_backends.libuade.songinfo import Credits
+from sample_format import SampleFormat
 
 
 class SongMetadata(TypedDict):
@@ -52,6 +53,15 @@ class PlayerBackend(ABC):
         }
         self.mod: Any = None
 
+        # Format read_chunk_into renders in
+        self.sample_format: SampleFormat = SampleFormat.INT16_STEREO
+
+    # Cheap check whether the backend recognizes a file by its first bytes,
+    # returns None if the backend can't tell without loading the file
+    @classmethod
+    def probe(cls, header: bytes, filename: str, filesize: int) -> Optional[bool]:
+        return None
+
     @abstractmethod
     def load_module(self, module_filename: str) -> bool:
         pass
@@ -64,10 +74,47 @@ class PlayerBackend(ABC):
     def read_chunk(self, samplerate: int, buffersize: int) -> tuple[int, bytes]:
         pass
 
+    # Render samples in sample_format directly into a caller supplied writable
+    # buffer, returns the number of bytes rendered (0 at the end of the module)
+    @abstractmethod
+    def read_chunk_into(self, samplerate: int, buffer: memoryview) -> int:
+        pass
+
     @abstractmethod
     def get_position_seconds(self) -> float:
         pass
 
+    # Jump to seconds into the current subsong, returns False if the backend can't
+    def seek(self, seconds: float) -> bool:
+        return False
+
+    # Keep the last seconds of rendered audio for fast backward seeks, only
+    # backends that can't seek cheaply use this, 0 turns it off
+    def set_seek_history(self, seconds: float) -> None:
+        pass
+
+    # Sample formats read_chunk_into can render, preferred first
+    def get_sample_formats(self) -> list[SampleFormat]:
+        return [SampleFormat.INT16_STEREO]
+
+    def set_sample_format(self, sample_format: SampleFormat) -> None:
+        if sample_format not in self.get_sample_formats():
+            raise ValueError(f"Unsupported sample format: {sample_format.name}")
+
+        self.sample_format = sample_format
+
+    # Sample rate the backend actually renders at when asked for samplerate
+    def get_samplerate(self, samplerate: int) -> int:
+        return samplerate
+
+    # Subsongs of the loaded module that can be passed to select_subsong
+    def get_subsongs(self) -> list[int]:
+        return [0]
+
+    # Restart rendering at the beginning of subsong
+    def select_subsong(self, subsong: int) -> bool:
+        return subsong == 0
+
     @abstractmethod
     def free_module(self) -> None:
         pass
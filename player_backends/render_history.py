@@ -0,0 +1,57 @@
+# Recently rendered audio in one preallocated circular buffer, so a backend that
+# can only seek by rendering from the start again can replay backward seeks
+# within the recent past from memory
+#
+# Positions are byte offsets into the song, the buffer holds the bytes from
+# begin up to end.
+class RenderHistory:
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = capacity
+        self.data = bytearray(capacity)
+        self.view = memoryview(self.data)
+        self.begin: int = 0
+        self.end: int = 0
+
+    def contains(self, position: int) -> bool:
+        return self.begin <= position < self.end
+
+    # Data rendered at position, history restarts if it doesn't continue at end
+    def append(self, position: int, data: memoryview) -> None:
+        if position != self.end:
+            self.begin = self.end = position
+
+        # Only the tail of data fits if it's larger than the whole buffer
+        if len(data) > self.capacity:
+            position += len(data) - self.capacity
+            data = data[len(data) - self.capacity :]
+            self.begin = self.end = position
+
+        start = position % self.capacity
+        first = min(len(data), self.capacity - start)
+
+        self.view[start : start + first] = data[:first]
+
+        if first < len(data):
+            self.view[: len(data) - first] = data[first:]
+
+        self.end = position + len(data)
+        self.begin = max(self.begin, self.end - self.capacity)
+
+    # Copy history from position into buffer, returns the number of bytes copied
+    def read_into(self, position: int, buffer: memoryview) -> int:
+        if not self.contains(position):
+            return 0
+
+        count = min(len(buffer), self.end - position)
+        start = position % self.capacity
+        first = min(count, self.capacity - start)
+
+        buffer[:first] = self.view[start : start + first]
+
+        if first < count:
+            buffer[first:count] = self.view[: count - first]
+
+        return count
+
+    def clear(self) -> None:
+        self.begin = self.end = 0
@@ -1,3 +1,4 @@
+import threading
 from typing import Optional
 
 import debugpy
@@ -6,62 +7,210 @@ from PySide6.QtCore import QThread, Signal
 
 from audio_backends.audio_backend import AudioBackend
 from player_backends.player_backend import PlayerBackend
+from position_publisher import PositionPublisher
+from track_preloader import PreloadedTrack
 
 
 class PlayerThread(QThread):
-    position_changed = Signal(int, int)  # Signal to emit position and length
+    position_changed = Signal(int, int)  # Position and length in milliseconds
     song_finished = Signal()  # Signal to emit when song is finished
+    track_changed = Signal(object)  # Queued PreloadedTrack is now playing
 
     def __init__(
         self,
         player_backend: PlayerBackend,
         audio_backend: AudioBackend,
+        seek_history: float = 0.0,
         parent: Optional[QThread] = None,
     ) -> None:
         super().__init__(parent)
         self.player_backend: PlayerBackend = player_backend
         self.audio_backend: AudioBackend = audio_backend
+
+        # Seconds of rendered audio the played backend keeps for backward seeks,
+        # only the interactive player pays for this, not preloads or renders
+        self.seek_history = seek_history
+
+        # Commands from the GUI thread, stop_flag, pause_flag and seek_seconds are
+        # only changed with control held, the player thread waits on it while paused
+        self.control = threading.Condition()
         self.stop_flag: bool = False
         self.pause_flag: bool = False
+
+        # Seek requested from the GUI, carried out between two chunks
+        self.seek_seconds: Optional[float] = None
+
+        # Played right after the current track without closing the audio stream
+        self.next_track: Optional[PreloadedTrack] = None
+        self.next_track_lock = threading.Lock()
+
+        self.module_length: float = 0.0
+        self.position_publisher = PositionPublisher(
+            self.position_changed.emit,
+            self.player_backend.get_samplerate(self.audio_backend.samplerate),
+        )
         logger.debug("PlayerThread initialized")
 
     def run(self) -> None:
         # debugpy.debug_this_thread()
-        module_length: float = self.player_backend.get_module_length()
-        logger.debug("Module length: {} seconds", module_length)
+        self.module_length = self.player_backend.get_module_length()
+        logger.debug("Module length: {} seconds", self.module_length)
 
-        count: int = 0
+        self.player_backend.set_seek_history(self.seek_history)
 
-        while not self.stop_flag:
-            if self.pause_flag:
-                self.msleep(100)  # Sleep for a short time to avoid busy-waiting
+        self.position_publisher.reset(0.0, self.module_length)
+        frame_size = self.audio_backend.sample_format.frame_size
+
+        # Set by an earlier stop
+        self.audio_backend.clear_interrupt()
+
+        song_end = False
+
+        # Chunks are rendered into the same memory over and over again
+        chunk = bytearray(
+            self.audio_backend.buffersize * self.audio_backend.sample_format.frame_size
+        )
+        chunk_view = memoryview(chunk)
+
+        while True:
+            stop, seek_seconds = self.next_command()
+
+            if stop:
+                break
+
+            if seek_seconds is not None:
+                self.perform_seek(seek_seconds)
+
+                # Paused playback waits again after seeking
                 continue
 
-            count, buffer = self.player_backend.read_chunk(
-                self.audio_backend.samplerate, self.audio_backend.buffersize
+            count = self.player_backend.read_chunk_into(
+                self.audio_backend.samplerate, chunk_view
             )
             if count == 0:
+                with self.next_track_lock:
+                    next_track = self.next_track
+                    self.next_track = None
+
+                if next_track and next_track.player_backend:
+                    self.switch_track(next_track)
+                    continue
+
                 logger.debug("End of module reached")
+                song_end = True
                 break
-            self.audio_backend.write(buffer)
+            self.audio_backend.write(chunk_view[:count])
 
-            # Emit position changed signal
-            current_position: float = self.player_backend.get_position_seconds()
-            self.position_changed.emit(int(current_position), int(module_length))
+            self.position_publisher.add_frames(count // frame_size)
+            self.position_publisher.update(self.audio_backend.get_latency)
+
+        if song_end:
+            self.audio_backend.drain()
 
         self.audio_backend.stop()
 
-        if count == 0:
+        if song_end and not self.stop_flag:
             self.song_finished.emit()
             logger.debug("Song finished")
 
         self.player_backend.free_module()
+
+        self.queue_next(None)
+
         logger.debug("Playback stopped")
 
+    # Continue with a preloaded track
+    def switch_track(self, track: PreloadedTrack) -> None:
+        self.player_backend.free_module()
+
+        if track.player_backend:
+            self.player_backend = track.player_backend
+
+        # Chunks rendered by the preloader are not part of the history, so
+        # seeking back into them re-renders
+        self.player_backend.set_seek_history(self.seek_history)
+
+        self.module_length = self.player_backend.get_module_length()
+        self.position_publisher.samplerate = self.player_backend.get_samplerate(
+            self.audio_backend.samplerate
+        )
+        self.position_publisher.reset(0.0, self.module_length)
+
+        frame_size = self.audio_backend.sample_format.frame_size
+
+        for chunk in track.chunks:
+            self.audio_backend.write(chunk)
+            self.position_publisher.add_frames(len(chunk) // frame_size)
+        track.chunks = []
+
+        logger.debug("Switched gaplessly to {}", track.filename)
+        self.track_changed.emit(track)
+
+    def perform_seek(self, seconds: float) -> None:
+        if self.player_backend.seek(seconds):
+            # Audio rendered before the seek is not played anymore
+            self.audio_backend.flush()
+            self.position_publisher.reset(seconds, self.module_length)
+            logger.debug("Seeked to {} seconds", seconds)
+        else:
+            logger.warning("Player backend can't seek")
+
+    # Blocks while paused, returns whether to stop and a pending seek
+    def next_command(self) -> tuple[bool, Optional[float]]:
+        with self.control:
+            while self.pause_flag and not self.stop_flag and self.seek_seconds is None:
+                self.control.wait()
+
+            seek_seconds = self.seek_seconds
+            self.seek_seconds = None
+
+            # The seek interrupted the audio backend, writes block again after it.
+            # Cleared with control held, so an interrupt from stop isn't lost.
+            if seek_seconds is not None and not self.stop_flag:
+                self.audio_backend.clear_interrupt()
+
+            return self.stop_flag, seek_seconds
+
+    def seek(self, seconds: float) -> None:
+        with self.control:
+            self.seek_seconds = seconds
+            self.control.notify_all()
+
+            # The player thread may be waiting for room in the audio backend,
+            # which doesn't come while paused, the seek is carried out right away
+            # instead of on resume. Interrupted with control held so next_command
+            # can't clear the interrupt before it is set.
+            self.audio_backend.interrupt()
+
+    def queue_next(self, track: Optional[PreloadedTrack]) -> None:
+        with self.next_track_lock:
+            previous = self.next_track
+            self.next_track = track
+
+        if previous and previous is not track:
+            previous.free()
+
     def stop(self) -> None:
         logger.debug("Stop signal received")
-        self.stop_flag = True
+
+        with self.control:
+            self.stop_flag = True
+            self.control.notify_all()
+
+        # The player thread may be waiting for room in the audio backend
+        self.audio_backend.interrupt()
 
     def pause(self) -> None:
-        self.pause_flag = not self.pause_flag
+        with self.control:
+            self.pause_flag = not self.pause_flag
+
+            # Silence right away instead of after the buffered audio, which
+            # stays buffered for resuming
+            if self.pause_flag:
+                self.audio_backend.pause()
+            else:
+                self.audio_backend.resume()
+
+            self.control.notify_all()
+
         logger.debug("Pause toggled: {}", self.pause_flag)
@@ -1,8 +1,16 @@
-from PySide6 import QtCore, QtGui, QtWidgets
-from PySide6.QtCore import QRect, Qt
-from PySide6.QtGui import QKeyEvent, QStandardItem, QStandardItemModel
+import datetime
+import ntpath
+import struct
+from typing import Any, Optional
+
+from PySide6 import QtCore, QtWidgets
+from PySide6.QtCore import QAbstractTableModel, QMimeData, QModelIndex, QRect, Qt
+from PySide6.QtGui import QIcon, QKeyEvent
 from PySide6.QtWidgets import QToolButton, QTreeView
 
+from uade import Song
+from util import TREEVIEWCOL
+
 
 class PlaylistExport:
     """Playlist representation for export as playlist file"""
@@ -16,20 +24,6 @@ class PlaylistExport:
         self.current_song_pos = current_song_pos
 
 
-class PlaylistItem(QStandardItem):
-    def __init__(self):
-        super().__init__()
-
-    def flags(self, index):
-        return QtGui.Qt.ItemFlag.NoItemFlags
-
-    # def dropEvent(self):
-    #     print('test')
-
-    # def dragEnterEvent(self):
-    #     pass
-
-
 class PlaylistTreeView(QTreeView):
     def __init__(self, parent=None):
         super(PlaylistTreeView, self).__init__(parent)
@@ -38,6 +32,16 @@ class PlaylistTreeView(QTreeView):
         # Currently playing row for this tab
         self.current_row: int = 0
 
+        # Stable id of the playlist, used for its file name
+        self.playlist_id: int = 0
+
+        # Playlist file whose songs are loaded once the tab is shown
+        self.pending_filename: Optional[str] = None
+
+        # Set if the playlist file could not be read, the tab is then never
+        # saved, so the file isn't replaced with an empty or partial playlist
+        self.load_error: Optional[str] = None
+
         self.setDragDropMode(self.DragDropMode.InternalMove)
         self.setSelectionMode(self.SelectionMode.ExtendedSelection)
         self.setSelectionBehavior(self.SelectionBehavior.SelectRows)
@@ -73,6 +77,8 @@ class PlaylistTabBarEdit(QtWidgets.QLineEdit):
 
 
 class PlaylistTabBar(QtWidgets.QTabBar):
+    renamed = QtCore.Signal(int)
+
     def __init__(self, parent) -> None:
         super().__init__(parent)
 
@@ -89,6 +95,7 @@ class PlaylistTabBar(QtWidgets.QTabBar):
     @QtCore.Slot()
     def editing_finished(self) -> None:
         self.setTabText(self.edit_index, self.edit_text)
+        self.renamed.emit(self.edit_index)
 
     # @ QtCore.Slot()
     # def doubleClicked(self, index) -> None:
@@ -128,13 +135,102 @@ class PlaylistTab(QtWidgets.QTabWidget):
     #     return self.widget()
 
 
-class PlaylistModel(QStandardItemModel):
-    def __init__(self, parent, length):
-        super().__init__(parent, length)
+def duration_text(song: Song) -> str:
+    if song.length_unknown():
+        return "--:--"
 
-    def flags(self, index):
-        default_flags = super().flags(index)
+    if hasattr(song, "subsong"):
+        duration = datetime.timedelta(seconds=song.subsong.bytes / 176400)
+    else:
+        duration = datetime.timedelta(seconds=song.song_file.duration)
+
+    text = str(duration).split(".")[0]
+
+    # At least that long, measuring ran out of time
+    if song.length_estimated():
+        return f"{text}+"
+
+    return text
+
+
+class PlaylistRow:
+    """Single playlist entry, display strings are created on demand from the song"""
+
+    __slots__ = ("song", "playing")
+
+    def __init__(self, song: Song, playing: bool = False) -> None:
+        self.song = song
+        self.playing = playing
 
+
+class PlaylistModel(QAbstractTableModel):
+    mime_type = "application/x-pyuade-playlist-rows"
+
+    def __init__(self, labels: list[str], play_icon: QIcon, parent=None) -> None:
+        super().__init__(parent)
+
+        self.labels = labels
+        self.play_icon = play_icon
+        self.rows: list[PlaylistRow] = []
+
+        # Set on changes that need to be saved to the playlist file
+        self.dirty: bool = False
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        # Flat list, items have no children
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(TREEVIEWCOL)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+
+        playlist_row = self.rows[index.row()]
+        song = playlist_row.song
+
+        match role:
+            case Qt.ItemDataRole.DisplayRole:
+                match index.column():
+                    case TREEVIEWCOL.FILENAME:
+                        return ntpath.basename(song.song_file.filename)
+                    case TREEVIEWCOL.SONGNAME:
+                        return song.song_file.modulename
+                    case TREEVIEWCOL.DURATION:
+                        return duration_text(song)
+                    case TREEVIEWCOL.PLAYER:
+                        return song.song_file.playername
+                    case TREEVIEWCOL.PATH:
+                        return song.song_file.filename
+                    case TREEVIEWCOL.SUBSONG:
+                        if hasattr(song, "subsong"):
+                            return str(song.subsong.nr)
+                        return "1"
+                    case TREEVIEWCOL.AUTHOR:
+                        return song.song_file.author
+            case Qt.ItemDataRole.DecorationRole:
+                if index.column() == TREEVIEWCOL.PLAYING and playlist_row.playing:
+                    return self.play_icon
+            case Qt.ItemDataRole.UserRole:
+                return song
+
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole) -> Any:
+        if (
+            orientation == Qt.Orientation.Horizontal
+            and role == Qt.ItemDataRole.DisplayRole
+            and section < len(self.labels)
+        ):
+            return self.labels[section]
+        return None
+
+    def flags(self, index):
         if index.isValid():
             return (
                 Qt.ItemFlag.ItemIsEnabled
@@ -142,9 +238,102 @@ class PlaylistModel(QStandardItemModel):
                 | Qt.ItemFlag.ItemIsDragEnabled
             )
 
-        return default_flags
+        return Qt.ItemFlag.ItemIsDropEnabled
+
+    def song(self, row: int) -> Optional[Song]:
+        if 0 <= row < len(self.rows):
+            return self.rows[row].song
+        return None
+
+    def songs(self) -> list[Song]:
+        return [playlist_row.song for playlist_row in self.rows]
+
+    # Insert songs with a single model update, at the end if row is -1
+    def insert_songs(self, songs: list[Song], row: int = -1) -> None:
+        if not songs:
+            return
+
+        if row < 0 or row > len(self.rows):
+            row = len(self.rows)
+
+        self.beginInsertRows(QModelIndex(), row, row + len(songs) - 1)
+        self.rows[row:row] = [PlaylistRow(song) for song in songs]
+        self.endInsertRows()
+        self.dirty = True
+
+    def add_songs(self, songs: list[Song]) -> None:
+        self.insert_songs(songs)
+
+    def removeRows(self, row, count, parent=QModelIndex()) -> bool:
+        if parent.isValid() or row < 0 or count <= 0 or row + count > len(self.rows):
+            return False
+
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        del self.rows[row : row + count]
+        self.endRemoveRows()
+        self.dirty = True
+        return True
+
+    def set_playing(self, row: int, playing: bool) -> None:
+        if 0 <= row < len(self.rows):
+            self.rows[row].playing = playing
+            index = self.index(row, TREEVIEWCOL.PLAYING)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    # Song data has been changed in place (e.g. subsong lengths), refresh column,
+    # callers mark the model dirty if the change needs saving
+    def column_changed(self, column: int) -> None:
+        if self.rows:
+            self.dataChanged.emit(
+                self.index(0, column), self.index(len(self.rows) - 1, column)
+            )
+
+    # Drag and drop within the same playlist: the dropped rows are inserted as
+    # copies, the view removes the original rows afterwards
+
+    def supportedDropActions(self):
+        return Qt.DropAction.MoveAction | Qt.DropAction.CopyAction
+
+    def mimeTypes(self) -> list[str]:
+        return [self.mime_type]
+
+    def mimeData(self, indexes) -> QMimeData:
+        rows = sorted({index.row() for index in indexes if index.isValid()})
+
+        mime_data = QMimeData()
+        mime_data.setData(
+            self.mime_type,
+            struct.pack(f"<Q{len(rows)}I", id(self), *rows),
+        )
+        return mime_data
+
+    def dropMimeData(self, data, action, row, col, parent) -> bool:
+        if not data.hasFormat(self.mime_type):
+            return False
+
+        payload = bytes(data.data(self.mime_type))
+        (model_id,) = struct.unpack_from("<Q", payload)
+
+        # Rows from another playlist can't be resolved here
+        if model_id != id(self):
+            return False
+
+        source_rows = struct.unpack_from(f"<{(len(payload) - 8) // 4}I", payload, 8)
+
+        if row < 0:
+            row = parent.row() if parent.isValid() else len(self.rows)
+
+        copies = [
+            PlaylistRow(self.rows[r].song, self.rows[r].playing)
+            for r in source_rows
+            if r < len(self.rows)
+        ]
+
+        if not copies:
+            return False
 
-    def dropMimeData(self, data, action, row, col, parent):
-        # Prevent shifting colums
-        response = super().dropMimeData(data, Qt.DropAction.CopyAction, row, 0, parent)
-        return response
+        self.beginInsertRows(QModelIndex(), row, row + len(copies) - 1)
+        self.rows[row:row] = copies
+        self.endInsertRows()
+        self.dirty = True
+        return True
@@ -0,0 +1,290 @@
+import mmap
+import os
+import struct
+
+from playlist import PlaylistExport
+from uade import Song, SongFile, Subsong
+
+# Binary playlist file layout (little endian):
+#
+# header    magic, version, name string, current song/position, table sizes
+# strings   offset table (count + 1 entries) followed by UTF-8 data, every
+#           distinct string (directories, player names, formats...) is stored once
+# files     one fixed size record per SongFile
+# songs     one fixed size record per playlist entry, referencing its file
+
+PLAYLIST_MAGIC = b"PYUADEPL"
+PLAYLIST_VERSION = 2
+PLAYLIST_EXTENSION = ".pyuadepl"
+
+HEADER = struct.Struct("<8sHHIiiIII")
+FILE_RECORD_V1 = struct.Struct("<10IQidB4i")
+# Version 2 adds the player backend name
+FILE_RECORD = struct.Struct("<10IQidB4iI")
+SONG_RECORD = struct.Struct("<IiQB")
+OFFSET = struct.Struct("<I")
+
+FILE_CUSTOM_SET = 1
+FILE_CUSTOM = 2
+FILE_CONTENT_SET = 4
+FILE_CONTENT = 8
+
+SONG_HAS_SUBSONG = 1
+SONG_DEFERRED = 2
+SONG_ESTIMATED = 4
+
+
+class StringTable:
+    def __init__(self) -> None:
+        self.strings: list[str] = []
+        self.indexes: dict[str, int] = {}
+
+    def add(self, string: str) -> int:
+        index = self.indexes.get(string)
+
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(string)
+            self.indexes[string] = index
+        return index
+
+    def pack(self) -> bytes:
+        data = [
+            string.encode("utf-8", "surrogateescape") for string in self.strings
+        ]
+
+        offsets = bytearray()
+        offset = 0
+
+        for encoded in data:
+            offsets += OFFSET.pack(offset)
+            offset += len(encoded)
+        offsets += OFFSET.pack(offset)
+
+        return bytes(offsets) + b"".join(data)
+
+
+def write_playlist(filename: str, playlist: PlaylistExport) -> None:
+    strings = StringTable()
+    file_indexes: dict[int, int] = {}
+    files = bytearray()
+    songs = bytearray()
+
+    name_index = strings.add(playlist.name)
+
+    for song in playlist.songs or []:
+        song_file = song.song_file
+
+        # Subsongs of a file share the same SongFile object
+        file_index = file_indexes.get(id(song_file))
+
+        if file_index is None:
+            file_index = len(file_indexes)
+            file_indexes[id(song_file)] = file_index
+
+            flags = 0
+
+            if hasattr(song_file, "custom"):
+                flags |= FILE_CUSTOM_SET | (FILE_CUSTOM if song_file.custom else 0)
+
+            if hasattr(song_file, "content"):
+                flags |= FILE_CONTENT_SET | (FILE_CONTENT if song_file.content else 0)
+
+            directory, basename = os.path.split(song_file.filename)
+
+            files += FILE_RECORD.pack(
+                strings.add(song_file.formatname),
+                strings.add(song_file.modulefname),
+                strings.add(song_file.modulemd5),
+                strings.add(song_file.modulename),
+                strings.add(directory),
+                strings.add(basename),
+                strings.add(song_file.playerfname),
+                strings.add(song_file.playername),
+                strings.add(song_file.author),
+                strings.add(song_file.ext),
+                song_file.modulebytes,
+                song_file.subsongs_min,
+                song_file.duration,
+                flags,
+                song_file.subsong_data.cur,
+                song_file.subsong_data.min,
+                song_file.subsong_data.def_,
+                song_file.subsong_data.max,
+                strings.add(getattr(song_file, "player_backend", "")),
+            )
+
+        if hasattr(song, "subsong"):
+            flags = SONG_HAS_SUBSONG
+
+            if song.length_unknown():
+                flags |= SONG_DEFERRED
+
+            if song.length_estimated():
+                flags |= SONG_ESTIMATED
+
+            songs += SONG_RECORD.pack(
+                file_index, song.subsong.nr, max(song.subsong.bytes, 0), flags
+            )
+        else:
+            songs += SONG_RECORD.pack(file_index, 0, 0, 0)
+
+    string_data = strings.pack()
+
+    header = HEADER.pack(
+        PLAYLIST_MAGIC,
+        PLAYLIST_VERSION,
+        0,
+        name_index,
+        playlist.current_song,
+        int(playlist.current_song_pos),
+        len(strings.strings),
+        len(file_indexes),
+        len(songs) // SONG_RECORD.size,
+    )
+
+    # Write to a temporary file first so a crash never leaves a broken playlist
+    temp_filename = filename + ".tmp"
+
+    with open(temp_filename, "wb") as f:
+        f.write(header)
+        f.write(string_data)
+        f.write(files)
+        f.write(songs)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temp_filename, filename)
+
+
+# Playlist files are named playlist-<id>.<ext>
+def playlist_id_from_filename(filename: str) -> int:
+    name = os.path.splitext(os.path.basename(filename))[0][len("playlist-") :]
+    return int(name) if name.isnumeric() else 0
+
+
+# Read just the playlist name, without decoding the playlist
+def read_playlist_name(filename: str) -> str:
+    with open(filename, "rb") as f:
+        header = f.read(HEADER.size)
+
+        if len(header) < HEADER.size:
+            raise ValueError("Playlist file is too short")
+
+        magic, version, _, name_index, _, _, string_count, _, _ = HEADER.unpack(header)
+
+        if magic != PLAYLIST_MAGIC:
+            raise ValueError("Not a playlist file")
+
+        if version > PLAYLIST_VERSION:
+            raise ValueError(f"Unsupported playlist version {version}")
+
+        f.seek(HEADER.size + OFFSET.size * name_index)
+        start, end = struct.unpack("<2I", f.read(OFFSET.size * 2))
+
+        f.seek(HEADER.size + OFFSET.size * (string_count + 1) + start)
+        return f.read(end - start).decode("utf-8", "surrogateescape")
+
+
+def read_playlist(filename: str) -> PlaylistExport:
+    with open(filename, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return parse_playlist(data)
+
+
+def parse_playlist(data) -> PlaylistExport:
+    if len(data) < HEADER.size:
+        raise ValueError("Playlist file is too short")
+
+    (
+        magic,
+        version,
+        _,
+        name_index,
+        current_song,
+        current_song_pos,
+        string_count,
+        file_count,
+        song_count,
+    ) = HEADER.unpack_from(data)
+
+    if magic != PLAYLIST_MAGIC:
+        raise ValueError("Not a playlist file")
+
+    if version > PLAYLIST_VERSION:
+        raise ValueError(f"Unsupported playlist version {version}")
+
+    offset = HEADER.size
+
+    offsets = struct.unpack_from(f"<{string_count + 1}I", data, offset)
+    offset += OFFSET.size * (string_count + 1)
+
+    string_data = data[offset : offset + offsets[-1]]
+    offset += offsets[-1]
+
+    strings = [
+        string_data[offsets[i] : offsets[i + 1]].decode("utf-8", "surrogateescape")
+        for i in range(string_count)
+    ]
+
+    file_record = FILE_RECORD if version >= 2 else FILE_RECORD_V1
+
+    files_end = offset + file_record.size * file_count
+    songs_end = files_end + SONG_RECORD.size * song_count
+
+    if len(data) < songs_end:
+        raise ValueError("Playlist file is truncated")
+
+    song_files: list[SongFile] = []
+
+    for record in file_record.iter_unpack(data[offset:files_end]):
+        song_file = SongFile()
+        song_file.formatname = strings[record[0]]
+        song_file.modulefname = strings[record[1]]
+        song_file.modulemd5 = strings[record[2]]
+        song_file.modulename = strings[record[3]]
+        song_file.filename = os.path.join(strings[record[4]], strings[record[5]])
+        song_file.playerfname = strings[record[6]]
+        song_file.playername = strings[record[7]]
+        song_file.author = strings[record[8]]
+        song_file.ext = strings[record[9]]
+        song_file.modulebytes = record[10]
+        song_file.subsongs_min = record[11]
+        song_file.duration = record[12]
+
+        flags = record[13]
+
+        if flags & FILE_CUSTOM_SET:
+            song_file.custom = bool(flags & FILE_CUSTOM)
+
+        if flags & FILE_CONTENT_SET:
+            song_file.content = bool(flags & FILE_CONTENT)
+
+        song_file.subsong_data.cur = record[14]
+        song_file.subsong_data.min = record[15]
+        song_file.subsong_data.def_ = record[16]
+        song_file.subsong_data.max = record[17]
+
+        if version >= 2:
+            song_file.player_backend = strings[record[18]]
+
+        song_files.append(song_file)
+
+    songs: list[Song] = []
+
+    for file_index, subsong_nr, subsong_bytes, flags in SONG_RECORD.iter_unpack(
+        data[files_end:songs_end]
+    ):
+        song = Song()
+        song.song_file = song_files[file_index]
+
+        if flags & SONG_HAS_SUBSONG:
+            song.subsong = Subsong()
+            song.subsong.nr = subsong_nr
+            song.subsong.bytes = subsong_bytes
+            song.subsong.deferred = bool(flags & SONG_DEFERRED)
+            song.subsong.estimated = bool(flags & SONG_ESTIMATED)
+
+        songs.append(song)
+
+    return PlaylistExport(strings[name_index], songs, current_song, current_song_pos)
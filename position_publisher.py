@@ -0,0 +1,54 @@
+import time
+from typing import Callable
+
+
+# Keeps track of the playback position from the frames the player thread has
+# rendered and publishes it at a fixed rate, so small buffers don't flood the
+# GUI with position updates
+#
+# Published positions are what can be heard: data still buffered in the audio
+# backend (its latency) is subtracted.
+class PositionPublisher:
+    def __init__(
+        self,
+        publish: Callable[[int, int], None],
+        samplerate: int,
+        interval: float = 0.1,
+    ) -> None:
+        # Called with position and length in milliseconds
+        self.publish = publish
+        self.samplerate = samplerate
+        self.interval = interval
+
+        self.start_seconds: float = 0.0
+        self.length_seconds: float = 0.0
+        self.frames: int = 0
+        self.next_publish: float = 0.0
+
+    # Position starts counting from seconds again, after song changes and seeks
+    def reset(self, seconds: float, length: float) -> None:
+        self.start_seconds = seconds
+        self.length_seconds = length
+        self.frames = 0
+        self.next_publish = 0.0
+
+    def add_frames(self, frames: int) -> None:
+        self.frames += frames
+
+    def position(self, latency: float = 0.0) -> float:
+        return max(
+            self.start_seconds + self.frames / self.samplerate - latency,
+            self.start_seconds,
+        )
+
+    # Publish the position if it's due, latency_func is only called then
+    def update(self, latency_func: Callable[[], float]) -> None:
+        now = time.monotonic()
+
+        if now < self.next_publish:
+            return
+
+        self.next_publish = now + self.interval
+        self.publish(
+            int(self.position(latency_func()) * 1000), int(self.length_seconds * 1000)
+        )
@@ -1,12 +1,19 @@
 import sys
 
-from PySide6 import QtWidgets
-
-from mainwindow import MainWindow
 from uade import libuade
 import atexit
 
 if __name__ == "__main__":
+    # Headless rendering: pyuade.py render [options] paths...
+    if len(sys.argv) > 1 and sys.argv[1] == "render":
+        from render import main
+
+        sys.exit(main(sys.argv[2:]))
+
+    from PySide6 import QtWidgets
+
+    from mainwindow import MainWindow
+
     app = QtWidgets.QApplication([])
 
     widget = MainWindow()
@@ -0,0 +1,323 @@
+import argparse
+import os
+import shutil
+import subprocess
+import wave
+from abc import ABC, abstractmethod
+from functools import partial
+from typing import Iterable, Iterator, Optional
+
+from loguru import logger
+
+from backend_probe import BackendProbe
+from player_backends.libopenmpt.player_backend_libopenmpt import PlayerBackendLibOpenMPT
+from player_backends.libuade.player_backend_libuade import PlayerBackendLibUADE
+from player_backends.player_backend import PlayerBackend
+from track_preloader import load_player_backend
+from worker_pool import WorkerPool
+
+FORMAT_WAV = "wav"
+FORMAT_FLAC = "flac"
+
+player_backends: dict[str, type[PlayerBackend]] = {
+    "LibUADE": PlayerBackendLibUADE,
+    "LibOpenMPT": PlayerBackendLibOpenMPT,
+}
+
+
+class RenderOptions:
+    def __init__(
+        self,
+        output_dir: str,
+        format: str = FORMAT_WAV,
+        samplerate: int = 44100,
+        max_seconds: float = 1200.0,
+        chunk_frames: int = 8192,
+        overwrite: bool = False,
+    ) -> None:
+        self.output_dir = output_dir
+        self.format = format
+        self.samplerate = samplerate
+
+        # Songs that loop forever are cut off here
+        self.max_seconds = max_seconds
+
+        self.chunk_frames = chunk_frames
+        self.overwrite = overwrite
+
+
+# Writes 16 bit stereo samples to a file as they are rendered, the file only
+# gets its final name once it is complete
+class SampleWriter(ABC):
+    def __init__(self, filename: str, samplerate: int) -> None:
+        self.filename = filename
+        self.temp_filename = f"{filename}.{os.getpid()}.tmp"
+        self.samplerate = samplerate
+
+    @abstractmethod
+    def write(self, data: memoryview) -> None:
+        pass
+
+    def finish(self) -> None:
+        os.replace(self.temp_filename, self.filename)
+
+    def abort(self) -> None:
+        try:
+            os.remove(self.temp_filename)
+        except OSError:
+            pass
+
+
+class WavWriter(SampleWriter):
+    def __init__(self, filename: str, samplerate: int) -> None:
+        super().__init__(filename, samplerate)
+
+        # The wave module fills in the header sizes when the file is closed
+        self.wav = wave.open(self.temp_filename, "wb")
+        self.wav.setnchannels(2)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(samplerate)
+
+    def write(self, data: memoryview) -> None:
+        self.wav.writeframesraw(data)
+
+    def finish(self) -> None:
+        self.wav.close()
+        super().finish()
+
+    def abort(self) -> None:
+        self.wav.close()
+        super().abort()
+
+
+# Pipes the samples into the reference flac encoder
+class FlacWriter(SampleWriter):
+    def __init__(self, filename: str, samplerate: int) -> None:
+        super().__init__(filename, samplerate)
+
+        self.process = subprocess.Popen(
+            [
+                "flac",
+                "--silent",
+                "--force",
+                "--force-raw-format",
+                "--endian=little",
+                "--sign=signed",
+                "--channels=2",
+                "--bps=16",
+                f"--sample-rate={samplerate}",
+                "--output-name",
+                self.temp_filename,
+                "-",
+            ],
+            stdin=subprocess.PIPE,
+        )
+
+    def write(self, data: memoryview) -> None:
+        if self.process.stdin:
+            self.process.stdin.write(data)
+
+    def finish(self) -> None:
+        if self.process.stdin:
+            self.process.stdin.close()
+
+        if self.process.wait() != 0:
+            super().abort()
+            raise RuntimeError(f"flac failed with exit code {self.process.returncode}")
+
+        super().finish()
+
+    def abort(self) -> None:
+        if self.process.stdin:
+            self.process.stdin.close()
+
+        self.process.wait()
+        super().abort()
+
+
+def create_writer(filename: str, format: str, samplerate: int) -> SampleWriter:
+    if format == FORMAT_FLAC:
+        return FlacWriter(filename, samplerate)
+    return WavWriter(filename, samplerate)
+
+
+# Each worker process remembers which backend worked for which file extension
+worker_backend_probe: Optional[BackendProbe] = None
+
+
+def init_worker() -> None:
+    global worker_backend_probe
+    worker_backend_probe = BackendProbe(player_backends)
+
+
+def output_filename(
+    filename: str, subsong: int, subsong_count: int, options: RenderOptions
+) -> str:
+    name = os.path.basename(filename)
+
+    if subsong_count > 1:
+        name = f"{name} - {subsong:02d}"
+
+    return os.path.join(options.output_dir, f"{name}.{options.format}")
+
+
+# Render the current subsong of player_backend into writer in chunks
+def render_subsong(
+    player_backend: PlayerBackend,
+    writer: SampleWriter,
+    samplerate: int,
+    options: RenderOptions,
+) -> int:
+    frame_size = player_backend.sample_format.frame_size
+    chunk = bytearray(options.chunk_frames * frame_size)
+    chunk_view = memoryview(chunk)
+
+    max_bytes = int(options.max_seconds * writer.samplerate) * frame_size
+    written = 0
+
+    while written < max_bytes:
+        count = player_backend.read_chunk_into(samplerate, chunk_view)
+
+        if count == 0:
+            break
+
+        count = min(count, max_bytes - written)
+        writer.write(chunk_view[:count])
+        written += count
+
+    return written
+
+
+# Render all subsongs of filename, returns the names of the files written
+def render_file(filename: str, options: RenderOptions) -> list[str]:
+    backend_name, player_backend = load_player_backend(
+        player_backends, filename, worker_backend_probe
+    )
+
+    if not player_backend:
+        raise RuntimeError("No player backend can load the file")
+
+    written_files: list[str] = []
+
+    try:
+        samplerate = player_backend.get_samplerate(options.samplerate)
+
+        # UADE renders at its configured rate, the files get the actual rate
+        if samplerate != options.samplerate:
+            logger.warning(
+                f"{backend_name} renders {filename} at {samplerate} Hz instead of {options.samplerate} Hz"
+            )
+
+        subsongs = player_backend.get_subsongs()
+
+        for subsong in subsongs:
+            output = output_filename(filename, subsong, len(subsongs), options)
+
+            if not options.overwrite and os.path.exists(output):
+                logger.debug(f"Skipping existing {output}")
+                continue
+
+            if not player_backend.select_subsong(subsong):
+                logger.warning(f"{backend_name} can not select subsong {subsong} of {filename}")
+                continue
+
+            writer = create_writer(output, options.format, samplerate)
+
+            try:
+                render_subsong(player_backend, writer, options.samplerate, options)
+            except BaseException:
+                writer.abort()
+                raise
+
+            writer.finish()
+            written_files.append(output)
+    finally:
+        player_backend.free_module()
+
+    return written_files
+
+
+def find_module_files(paths: Iterable[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for filename in sorted(files):
+                    yield os.path.join(root, filename)
+        else:
+            yield path
+
+
+# Renders module files in parallel, one file per task
+class Renderer:
+    log_prefix = "[Renderer] "
+
+    def __init__(self, options: RenderOptions, workers: int = 0) -> None:
+        self.options = options
+        self.workers: int = workers if workers > 0 else (os.cpu_count() or 1)
+
+    # Yields (filename, written files, error) as files are finished, error is
+    # empty on success, a file crashing its worker only fails that file
+    def render(self, filenames: Iterable[str]) -> Iterator[tuple[str, list[str], str]]:
+        pool = WorkerPool(self.workers, init_worker)
+
+        # Keep enough files in flight to saturate all workers without
+        # submitting a whole collection up front
+        for filename, written_files, error in pool.map(
+            partial(render_file, options=self.options), filenames, self.workers * 4
+        ):
+            if error:
+                yield filename, [], str(error) or "Worker process crashed"
+            else:
+                yield filename, written_files, ""
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="pyuade render",
+        description="Render module files to WAV or FLAC, one file per subsong",
+    )
+    parser.add_argument("paths", nargs="+", help="module files or directories")
+    parser.add_argument("-o", "--output-dir", default=".", help="output directory")
+    parser.add_argument(
+        "-f", "--format", choices=[FORMAT_WAV, FORMAT_FLAC], default=FORMAT_WAV
+    )
+    parser.add_argument("-r", "--samplerate", type=int, default=44100)
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=0, help="worker processes (default: CPU count)"
+    )
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=1200.0,
+        help="cut off subsongs after this many seconds",
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="render existing output files again"
+    )
+    args = parser.parse_args(argv)
+
+    if args.format == FORMAT_FLAC and not shutil.which("flac"):
+        parser.error("FLAC output needs the flac encoder in PATH")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    options = RenderOptions(
+        args.output_dir,
+        args.format,
+        args.samplerate,
+        args.max_seconds,
+        overwrite=args.overwrite,
+    )
+
+    renderer = Renderer(options, args.jobs)
+    failed = 0
+
+    for filename, written_files, error in renderer.render(find_module_files(args.paths)):
+        if error:
+            failed += 1
+            logger.error(f"{renderer.log_prefix}Rendering {filename} failed: {error}")
+        else:
+            for written_file in written_files:
+                logger.info(f"{renderer.log_prefix}Wrote {written_file}")
+
+    return 1 if failed else 0
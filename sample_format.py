@@ -0,0 +1,46 @@
+from enum import Enum
+
+
+# Layout of the interleaved samples passed from player backends to audio
+# backends, every backend supports INT16_STEREO
+class SampleFormat(Enum):
+    INT16_STEREO = ("int16", 2)
+    FLOAT32_STEREO = ("float32", 2)
+    INT16_QUAD = ("int16", 4)
+    FLOAT32_QUAD = ("float32", 4)
+
+    @property
+    def is_float(self) -> bool:
+        return self.value[0] == "float32"
+
+    @property
+    def channels(self) -> int:
+        return self.value[1]
+
+    @property
+    def sample_size(self) -> int:
+        return 4 if self.is_float else 2
+
+    @property
+    def frame_size(self) -> int:
+        return self.sample_size * self.channels
+
+
+# All formats, the ones matching the wanted sample type and channel count first
+def preferred_sample_formats(float_samples: bool, quad: bool) -> list[SampleFormat]:
+    return sorted(
+        SampleFormat,
+        key=lambda f: ((f.channels == 4) != quad, f.is_float != float_samples),
+    )
+
+
+# First format in preferred order both sides support
+def negotiate_sample_format(
+    preferred: list[SampleFormat],
+    player_formats: list[SampleFormat],
+    audio_formats: list[SampleFormat],
+) -> SampleFormat:
+    for sample_format in preferred:
+        if sample_format in player_formats and sample_format in audio_formats:
+            return sample_format
+    return SampleFormat.INT16_STEREO
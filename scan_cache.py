@@ -0,0 +1,159 @@
+import os
+import pickle
+import sqlite3
+import threading
+from typing import Optional
+
+from loguru import logger
+
+from hashing import hash_service
+from uade import Song
+
+SCHEMA_VERSION = 1
+
+
+# Persistent cache of scan results (song file info + subsongs) keyed by file identity
+class ScanCache:
+    log_prefix = "[ScanCache] "
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+        if version != SCHEMA_VERSION:
+            # Cache content is disposable, just start over on schema changes
+            self.connection.execute("DROP TABLE IF EXISTS files")
+            self.connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                modulemd5 TEXT,
+                songs BLOB
+            )"""
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS files_size_md5 ON files (size, modulemd5)"
+        )
+        self.connection.commit()
+
+    # Return cached songs for filename, an empty list if the file is known to be
+    # unplayable, or None if the file has to be (re)scanned
+    def get_songs(self, filename: str) -> Optional[list[Song]]:
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT mtime_ns, size, songs FROM files WHERE path=?", (filename,)
+            ).fetchone()
+
+        if row and row[0] == stat.st_mtime_ns and row[1] == stat.st_size:
+            return self.unpickle_songs(row[2], filename)
+
+        # File is new or changed, check for identical content elsewhere (copied or
+        # moved files), but only hash the file if there are candidates of that size
+        with self.lock:
+            candidates = self.connection.execute(
+                "SELECT modulemd5, songs FROM files WHERE size=? AND modulemd5 IS NOT NULL",
+                (stat.st_size,),
+            ).fetchall()
+
+        if candidates:
+            digests = hash_service.digests(filename)
+
+            if not digests:
+                return None
+
+            md5 = digests.md5
+
+            for modulemd5, blob in candidates:
+                if modulemd5 == md5:
+                    songs = self.unpickle_songs(blob, filename)
+
+                    if songs is not None:
+                        self.put_songs(filename, songs)
+                    return songs
+
+        return None
+
+    def put_songs(self, filename: str, songs: list[Song]) -> None:
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return
+
+        modulemd5 = None
+        blob = None
+
+        if songs:
+            modulemd5 = songs[0].song_file.modulemd5 or None
+            blob = pickle.dumps(songs, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, modulemd5, songs) VALUES (?, ?, ?, ?, ?)",
+                (filename, stat.st_mtime_ns, stat.st_size, modulemd5, blob),
+            )
+            self.connection.commit()
+
+    # Store a subsong length determined after the initial scan, estimated if it is
+    # only a lower bound
+    def put_subsong_length(
+        self, filename: str, subsong_nr: int, subsong_bytes: int, estimated: bool = False
+    ) -> None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT songs FROM files WHERE path=?", (filename,)
+            ).fetchone()
+
+        if not row:
+            return
+
+        songs = self.unpickle_songs(row[0], filename)
+
+        if not songs:
+            return
+
+        for song in songs:
+            if hasattr(song, "subsong") and song.subsong.nr == subsong_nr:
+                song.subsong.bytes = subsong_bytes
+                song.subsong.deferred = False
+                song.subsong.estimated = estimated
+
+        with self.lock:
+            self.connection.execute(
+                "UPDATE files SET songs=? WHERE path=?",
+                (pickle.dumps(songs, protocol=pickle.HIGHEST_PROTOCOL), filename),
+            )
+            self.connection.commit()
+
+    def unpickle_songs(self, blob: Optional[bytes], filename: str) -> Optional[list[Song]]:
+        if blob is None:
+            return []
+
+        try:
+            songs: list[Song] = pickle.loads(blob)
+        except Exception as e:
+            logger.warning(f"{self.log_prefix}Dropping unreadable entry for {filename}: {e}")
+            return None
+
+        # Entries may come from a copy of the file at another location
+        if songs:
+            songs[0].song_file.filename = filename
+
+        return songs
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
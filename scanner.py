@@ -0,0 +1,105 @@
+import os
+import time
+from functools import partial
+from typing import Iterable, Iterator, Optional
+
+from loguru import logger
+
+from scan_cache import ScanCache
+from uade import Song, SongFile, Subsong, Uade, uade
+from worker_pool import WorkerPool
+
+# Each worker process owns its own Uade instance (and with it its own libuade state)
+worker_uade: Optional[Uade] = None
+
+
+def init_worker(niceness: int = 0) -> None:
+    global worker_uade
+    worker_uade = Uade()
+
+    if niceness:
+        os.nice(niceness)
+
+
+# Scan a file with libuade, returns an empty list if the file is not playable,
+# with measure set to False subsong lengths are left to be determined later
+def scan_file(
+    filename: str, time_budget: float = 0.0, measure: bool = True
+) -> list[Song]:
+    scanner_uade = worker_uade if worker_uade else uade
+
+    try:
+        song_file = scanner_uade.scan_song_file(filename)
+    except:
+        logger.error(
+            f'Loading {filename.encode("utf-8", "surrogateescape").decode("ISO-8859-1")} failed, song skipped'
+        )
+        return []
+
+    return scanner_uade.split_subsongs(song_file, time_budget, measure)
+
+
+# Determine length of a single subsong, measuring stops after time_budget seconds
+# (0 = no limit) counted from here, so time spent queued for a worker doesn't
+# count. Returns the subsong and the seconds spent on it.
+def measure_subsong(
+    song_file: SongFile, subsong_nr: int, time_budget: float = 0.0
+) -> tuple[Subsong, float]:
+    scanner_uade = worker_uade if worker_uade else uade
+    start = time.monotonic()
+    deadline = start + time_budget if time_budget > 0 else 0.0
+
+    subsong = scanner_uade.scan_subsong(song_file, subsong_nr, deadline)
+
+    return subsong, time.monotonic() - start
+
+
+class Scanner:
+    log_prefix = "[Scanner] "
+
+    def __init__(
+        self,
+        workers: int = 0,
+        measure: bool = True,
+        niceness: int = 0,
+    ) -> None:
+        self.workers: int = workers if workers > 0 else (os.cpu_count() or 1)
+
+        # Determine subsong lengths right away or leave them for later
+        self.measure: bool = measure
+
+        self.pool = WorkerPool(self.workers, init_worker, (niceness,))
+
+    # Scan files in parallel and yield (filename, songs) in the order of filenames
+    def scan(
+        self, filenames: Iterable[str], scan_cache: Optional[ScanCache] = None
+    ) -> Iterator[tuple[str, list[Song]]]:
+        # Files answered from the cache, they don't need to be stored again
+        cached: set[str] = set()
+
+        def lookup(filename: str) -> Optional[list[Song]]:
+            songs = scan_cache.get_songs(filename) if scan_cache else None
+
+            if songs is not None:
+                cached.add(filename)
+            return songs
+
+        # Keep enough files in flight to saturate all workers
+        for filename, songs, error in self.pool.map(
+            partial(scan_file, measure=self.measure),
+            filenames,
+            self.workers * 4,
+            lookup,
+        ):
+            if error:
+                logger.error(f"{self.log_prefix}Scanning {filename} failed: {error}")
+                songs = []
+            elif filename in cached:
+                cached.discard(filename)
+            elif scan_cache:
+                scan_cache.put_songs(filename, songs)
+
+            yield filename, songs
+
+    def shutdown(self) -> None:
+        self.pool.shutdown()
@@ -0,0 +1,242 @@
+import re
+from html.parser import HTMLParser
+from typing import Dict, Optional
+from xml.etree import ElementTree
+
+# Pages are fed to the parsers in blocks, parsing stops as soon as the
+# interesting part of the page has been seen
+FEED_SIZE = 1 << 14
+
+
+class ParsingDone(Exception):
+    pass
+
+
+# Streaming HTML parser that only keeps track of what it is looking for
+class ExtractingParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+
+    # Parse content, starting at the tag containing marker if it is found
+    def parse(self, content: bytes, tag: bytes = b"", marker: bytes = b"") -> None:
+        start = 0
+
+        if marker:
+            position = content.find(marker)
+
+            if position >= 0:
+                start = max(content.rfind(b"<" + tag, 0, position), 0)
+
+        text = content[start:].decode("utf-8", "replace")
+
+        try:
+            for offset in range(0, len(text), FEED_SIZE):
+                self.feed(text[offset : offset + FEED_SIZE])
+            self.close()
+        except ParsingDone:
+            pass
+
+
+class TableCell:
+    def __init__(self, tag: str) -> None:
+        self.tag: str = tag
+        self.text: str = ""
+        # Text of the first link in the cell
+        self.link_text: Optional[str] = None
+
+
+# Collects caption and cells of the table with the given id
+class TableParser(ExtractingParser):
+    def __init__(self, table_id: str) -> None:
+        super().__init__()
+
+        self.table_id = table_id
+        self.table_depth: int = 0
+        self.caption: Optional[list[str]] = None
+        self.in_caption: bool = False
+        self.rows: list[list[TableCell]] = []
+        self.cell: Optional[TableCell] = None
+        self.link_text: Optional[list[str]] = None
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if self.table_depth == 0:
+            if tag == "table" and ("id", self.table_id) in attrs:
+                self.table_depth = 1
+            return
+
+        match tag:
+            case "table":
+                self.table_depth += 1
+            case "caption":
+                self.caption = []
+                self.in_caption = True
+            case "tr":
+                self.rows.append([])
+                self.cell = None
+            case "td" | "th":
+                if not self.rows:
+                    self.rows.append([])
+                self.cell = TableCell(tag)
+                self.rows[-1].append(self.cell)
+            case "a":
+                if self.cell and self.cell.link_text is None:
+                    self.link_text = []
+
+    def handle_endtag(self, tag: str) -> None:
+        if self.table_depth == 0:
+            return
+
+        match tag:
+            case "table":
+                self.table_depth -= 1
+
+                if self.table_depth == 0:
+                    raise ParsingDone
+            case "caption":
+                self.in_caption = False
+            case "td" | "th":
+                self.cell = None
+            case "a":
+                if self.cell and self.link_text is not None:
+                    self.cell.link_text = "".join(self.link_text)
+                self.link_text = None
+
+    def handle_data(self, data: str) -> None:
+        if self.table_depth == 0:
+            return
+
+        if self.in_caption and self.caption is not None:
+            self.caption.append(data)
+
+        if self.cell:
+            self.cell.text += data
+
+            if self.link_text is not None:
+                self.link_text.append(data)
+
+
+# Collects the text of the first h1
+class HeadingParser(ExtractingParser):
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.h1: Optional[list[str]] = None
+        self.heading: Optional[str] = None
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag == "h1":
+            self.h1 = []
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "h1" and self.h1 is not None:
+            self.heading = "".join(self.h1)
+            raise ParsingDone
+
+    def handle_data(self, data: str) -> None:
+        if self.h1 is not None:
+            self.h1.append(data)
+
+
+# Collects the list items of the first div
+class ListParser(ExtractingParser):
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.div_depth: int = 0
+        self.item: Optional[list[str]] = None
+        self.items: Optional[list[str]] = None
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag == "div":
+            self.div_depth += 1
+
+            if self.items is None:
+                self.items = []
+        elif tag == "li" and self.div_depth:
+            self.item = []
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "div" and self.div_depth:
+            self.div_depth -= 1
+
+            if self.div_depth == 0:
+                raise ParsingDone
+        elif tag == "li" and self.item is not None and self.items is not None:
+            self.items.append("".join(self.item))
+            self.item = None
+
+    def handle_data(self, data: str) -> None:
+        if self.item is not None:
+            self.item.append(data)
+
+
+modland_results_pattern = re.compile("^Search - ([0-9]+) result.*?$")
+
+
+# Value of column for the first result on a Modland search result page
+def parse_modland(content: bytes, column: str) -> str:
+    parser = TableParser("ml_resultstable")
+    parser.parse(content, b"table", b'id="ml_resultstable"')
+
+    if parser.caption is None:
+        return ""
+
+    match = modland_results_pattern.match("".join(parser.caption))
+
+    if not match or int(match.group(1)) == 0:
+        return ""
+
+    column_nr = -1
+
+    # Find out which row contains the column (just to make it a little more flexible)
+    for row in parser.rows:
+        for c, cell in enumerate(cell for cell in row if cell.tag == "th"):
+            if (cell.link_text or "").strip() == column:
+                column_nr = c
+                break
+
+        if column_nr >= 0:
+            tds = [cell for cell in row if cell.tag == "td"]
+
+            if len(tds) > column_nr:
+                return (tds[column_nr].link_text or "").strip()
+    return ""
+
+
+# Module name and links from a .Mod Sample Master module page, only the page
+# heading and the links section are parsed
+def parse_msm(content: bytes) -> Dict[str, str]:
+    data: Dict = {}
+
+    page = content.find(b'class="page"')
+
+    if page < 0:
+        return data
+
+    heading_parser = HeadingParser()
+    heading_parser.parse(content[page:])
+
+    if not heading_parser.heading:
+        return data
+
+    data["name"] = heading_parser.heading
+
+    links = content.find(b">Links</h1>", page)
+
+    if links >= 0:
+        list_parser = ListParser()
+        list_parser.parse(content[links + len(b">Links</h1>") :])
+
+        if list_parser.items is not None:
+            data["urls"] = list_parser.items
+    return data
+
+
+# Results count and first artist alias from a ModArchive hash search
+def parse_modarchive(content: bytes) -> tuple[int, str]:
+    xml_tree = ElementTree.fromstring(content)
+
+    results = xml_tree.findtext("results")
+    alias = xml_tree.findtext("module/artist_info/artist/alias")
+
+    return int(results or 0), alias or ""
@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from loguru import logger
+from PySide6.QtCore import QThread, Signal
+
+from http_client import HttpClient
+from scraping import (
+    lookup_msm,
+    lookup_msm_modarchive,
+    scrape_modarchive,
+    scrape_modland,
+)
+from uade import Song
+
+SOURCE_MODARCHIVE = "modarchive"
+SOURCE_MODLAND = "modland"
+
+# Look up web pages for songs instead of authors
+SOURCE_MSM = "msm"
+SOURCE_MSM_MODARCHIVE = "msm_modarchive"
+URL_SOURCES = (SOURCE_MSM, SOURCE_MSM_MODARCHIVE)
+
+
+# Looks up authors for many songs concurrently, requests per host are limited by
+# the HttpClient, results are handed to the GUI through signals
+class ScrapeThread(QThread):
+    finished = Signal()
+    progress_changed = Signal(int)  # Number of songs looked up so far
+    song_scraped = Signal(object, str)  # Song and the author found for it
+    url_found = Signal(object, str)  # Song and the web page found for it
+
+    log_prefix = "[ScrapeThread] "
+
+    def __init__(
+        self, parent, client: HttpClient, appname: str, workers: int = 8
+    ) -> None:
+        super().__init__(parent)
+
+        self.client = client
+        self.appname = appname
+        self.workers = workers
+
+        self.songs: list[Song] = []
+        self.source: str = SOURCE_MODLAND
+        self.cancel_flag: bool = False
+
+    def scrape_song(self, song: Song) -> str:
+        if self.cancel_flag:
+            return ""
+
+        if self.source == SOURCE_MODARCHIVE:
+            return scrape_modarchive(self.appname, song, self.client)
+        if self.source == SOURCE_MSM:
+            return lookup_msm(song, self.client)
+        if self.source == SOURCE_MSM_MODARCHIVE:
+            return lookup_msm_modarchive(song, self.client)
+        return scrape_modland(song, "Author", self.client)
+
+    def run(self) -> None:
+        self.cancel_flag = False
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.scrape_song, song): song for song in self.songs}
+
+            for i, future in enumerate(as_completed(futures)):
+                song = futures[future]
+
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(
+                        f"{self.log_prefix}Looking up {song.song_file.filename} failed: {e}"
+                    )
+                    result = ""
+
+                if result and self.source in URL_SOURCES:
+                    self.url_found.emit(song, result)
+                elif result:
+                    self.song_scraped.emit(song, result)
+
+                self.progress_changed.emit(i + 1)
+
+        self.finished.emit()
+
+    def cancel(self) -> None:
+        self.cancel_flag = True
@@ -1,204 +1,111 @@
-import hashlib
-import re
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Dict
 
-import requests
-from bs4 import BeautifulSoup
 from loguru import logger
 from platformdirs import user_config_dir
 
+from hashing import hash_service
+from http_client import HttpClient, http_client
+from scrape_parsers import parse_modarchive, parse_modland, parse_msm
 from uade import Song
 
 
-def scrape_modarchive(username: str, song: Song) -> Optional[Song]:
+# Lookup endpoints, module level so they can be pointed at a local stand-in server
+MODARCHIVE_URL = "https://modarchive.org/data/xml-tools.php"
+MODLAND_URL = "https://www.exotica.org.uk/mediawiki/index.php"
+MSM_URL = "https://modsamplemaster.thegang.nu/module.php"
+
+
+# Look up the author of song on ModArchive via the md5 of the module
+def scrape_modarchive(
+    username: str, song: Song, client: HttpClient = http_client
+) -> str:
     license_file = Path(user_config_dir(username)) / "modarchive-api.key"
 
     if not license_file.exists():
         logger.error("No modarchive-api.key found in config folder!")
-        return None
+        return ""
 
     with open(license_file, "r") as f:
-        api_key = f.read()
-
-    with requests.Session() as session:
-        md5 = hashlib.md5()
-
-        logger.info(f"Looking up {song.song_file.filename} in ModArchive.")
-
-        with open(song.song_file.filename, "rb") as f:
-            data = f.read()
-
-            if data:
-                md5.update(data)
-
-                md5_request = f"request=search&type=hash&query={md5.hexdigest()}"
-
-                query = f"https://modarchive.org/data/xml-tools.php?key={api_key}&{md5_request}"
-
-                response = session.get(query)
-
-                xml_tree = ElementTree.fromstring(response.content)
-
-                xml_module = xml_tree.find("module")
-
-                if xml_module:
-                    if int(xml_tree.find("results").text) > 0:
-                        logger.success(
-                            f"ModArchive Metadata found for {song.song_file.filename}."
-                        )
-                        xml_artist_info = xml_module.find("artist_info")
-
-                        for artist_idx in range(
-                            int(xml_artist_info.find("artists").text)
-                        ):
-                            xml_artist = xml_artist_info.find("artist")
-
-                            song.song_file.author = xml_artist.find("alias").text
-
-                            logger.info(
-                                f"Artist {song.song_file.author} found for {song.song_file.filename}."
-                            )
-
-                    else:
-                        logger.warning(
-                            f"More than 1 results for md5 of {song.song_file.filename} found!"
-                        )
+        api_key = f.read().strip()
 
-                else:
-                    logger.warning(
-                        f"No ModArchive results found for {song.song_file.filename}!"
-                    )
+    author = ""
 
-    return song
+    logger.info(f"Looking up {song.song_file.filename} in ModArchive.")
 
+    md5 = hash_service.md5(song.song_file.filename, song.song_file.modulemd5)
 
-def scrape_modland(song: Song, column: str) -> str:
-    md5 = hashlib.md5()
+    if md5:
+        md5_request = f"request=search&type=hash&query={md5}"
 
-    with open(song.song_file.filename, "rb") as f:
-        data = f.read()
+        query = f"{MODARCHIVE_URL}?key={api_key}&{md5_request}"
 
-        if data:
-            md5.update(data)
+        content = client.get(query)
 
-            url = (
-                "https://www.exotica.org.uk/mediawiki/index.php?title=Special%3AModland&md=qsearch&qs="
-                + md5.hexdigest()
-            )
+        if content:
+            results, author = parse_modarchive(content)
 
-            response = requests.get(url)
-            if response.status_code == 200:
-                website = requests.get(url)
-                results = BeautifulSoup(website.content, "html5lib")
+            if results > 1:
+                logger.warning(
+                    f"More than 1 results for md5 of {song.song_file.filename} found!"
+                )
 
-                table = results.find("table", id="ml_resultstable")
-                if table:
-                    search_results = table.find("caption")
+            if author:
+                logger.success(f"ModArchive Metadata found for {song.song_file.filename}.")
+                logger.info(f"Artist {author} found for {song.song_file.filename}.")
+            else:
+                logger.warning(
+                    f"No ModArchive results found for {song.song_file.filename}!"
+                )
 
-                    pattern = re.compile("^Search - ([0-9]+) result.*?$")
-                    match = pattern.match(search_results.text)
-                    if match:
-                        if int(match.group(1)) > 0:
-                            # webbrowser.open(url, new=2)
-                            table_body = table.find("tbody")
+    return author
 
-                            author_col_nr = -1
 
-                            # Find out which row contains author (just to make a little more flexible)
+def scrape_modland(song: Song, column: str, client: HttpClient = http_client) -> str:
+    md5 = hash_service.md5(song.song_file.filename, song.song_file.modulemd5)
 
-                            table_rows = table_body.find_all("tr")
-                            for table_row in table_rows:
-                                cols = table_row.find_all("th")
+    if md5:
+        url = f"{MODLAND_URL}?title=Special%3AModland&md=qsearch&qs={md5}"
 
-                                for c, col in enumerate(cols):
-                                    header_name = col.find("a")
-
-                                    if header_name.text.strip() == column:
-                                        author_col_nr = c
-                                        break
-
-                                if author_col_nr >= 0:
-                                    tds = table_row.find_all("td")
-
-                                    if tds:
-                                        td = tds[author_col_nr]
-                                        return td.find("a").text.strip()
+        content = client.get(url)
+        if content:
+            return parse_modland(content, column)
     return ""
 
 
-def scrape_msm(song: Song) -> Dict[str, str]:
+def scrape_msm(song: Song, client: HttpClient = http_client) -> Dict[str, str]:
     # Lookup in .Mod Sample Master database via sha1 and return data
     return_data: Dict[str, str] = {}
 
-    sha1 = hashlib.sha1()
-
-    with open(song.song_file.filename, "rb") as f:
-        data = f.read()
-
-        if data:
-            sha1.update(data)
-
-            url = (
-                "https://modsamplemaster.thegang.nu/module.php?sha1=" + sha1.hexdigest()
-            )
-
-            response = requests.get(url)
-            if response.status_code == 200:
-                website = requests.get(url)
-                results = BeautifulSoup(website.content, "html5lib")
-
-                page = results.find("div", class_="page")
-                if page:
-                    # Check if we have a result
-                    name = page.find("h1")
+    sha1 = hash_service.sha1(song.song_file.filename)
 
-                    if name.text:
-                        return_data["name"] = name.text
+    if sha1:
+        url = f"{MSM_URL}?sha1={sha1}"
 
-                        # Find h1 "Links"
-                        links = page.find("h1", string="Links")
-                        details = links.find_next_sibling("div")
-
-                        if details:
-                            # Read all list items
-                            list_items = details.find_all("li")
-
-                            urls = []
-
-                            # Loop through all list items and add them to the return_data
-                            for item in list_items:
-                                urls.append(item.text)
-
-                            return_data["urls"] = urls
+        content = client.get(url)
+        if content:
+            return_data = parse_msm(content)
 
     return return_data
 
 
-def lookup_msm(song: Song) -> str:
+def lookup_msm(song: Song, client: HttpClient = http_client) -> str:
     # Experimental lookup in .Mod Sample Master database
 
-    sha1 = hashlib.sha1()
+    sha1 = hash_service.sha1(song.song_file.filename)
 
-    with open(song.song_file.filename, "rb") as f:
-        data = f.read()
+    if sha1:
+        url = f"{MSM_URL}?sha1={sha1}"
 
-        if data:
-            sha1.update(data)
-
-            url = (
-                "https://modsamplemaster.thegang.nu/module.php?sha1=" + sha1.hexdigest()
-            )
-
-            response = requests.get(url)
-            if response.status_code == 200:
-                website = requests.get(url)
-                results = BeautifulSoup(website.content, "html5lib")
+        content = client.get(url)
+        if content:
+            return parse_msm(content).get("name", "")
+    return ""
 
-                page = results.find("div", class_="page")
-                if page:
-                    name = page.find("h1")
 
-                    if name.text:
-                        return name.text
+# ModArchive page linked from the .Mod Sample Master entry of song
+def lookup_msm_modarchive(song: Song, client: HttpClient = http_client) -> str:
+    for url in scrape_msm(song, client).get("urls", []):
+        if "modarchive.org" in url:
+            return url
     return ""
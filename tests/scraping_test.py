@@ -0,0 +1,242 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+import scraping
+from http_client import HttpClient, ResponseCache
+
+MODLAND_PAGE = b"""<html><body>
+<table id="ml_resultstable">
+<caption>Search - 1 result</caption>
+<tr><th><a href="#">Format</a></th><th><a href="#">Author</a></th></tr>
+<tr><td><a href="#">Protracker</a></td><td><a href="#">%s</a></td></tr>
+</table>
+</body></html>"""
+
+MODARCHIVE_PAGE = b"""<?xml version="1.0"?>
+<modarchive><results>1</results><module><artist_info><artist>
+<alias>%s</alias>
+</artist></artist_info></module></modarchive>"""
+
+MSM_PAGE = b"""<html><body><div class="page">
+<h1>%s</h1>
+<h1>Links</h1><div><ul><li>http://example.com/a</li></ul></div>
+</div></body></html>"""
+
+
+# Stand-in for the lookup sites, the module digest in the query selects the
+# author, paths starting with /slow and /error misbehave
+class LookupHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        server = self.server
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        with server.lock:
+            server.requests.append(self.path)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+
+        try:
+            time.sleep(server.delay)
+
+            if url.path.startswith("/slow"):
+                time.sleep(server.slow_delay)
+
+            if url.path.startswith("/error"):
+                self.respond(500, b"Internal Server Error")
+            elif url.path.endswith("/modland"):
+                self.respond(200, MODLAND_PAGE % query["qs"][0].encode())
+            elif url.path.endswith("/modarchive"):
+                self.respond(200, MODARCHIVE_PAGE % query["query"][0].encode())
+            elif url.path.endswith("/msm"):
+                self.respond(200, MSM_PAGE % query["sha1"][0].encode())
+            else:
+                self.respond(404, b"Not Found")
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def respond(self, status: int, content: bytes) -> None:
+        try:
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        except OSError:
+            # Client gave up waiting
+            pass
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class LookupServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), LookupHandler)
+
+        self.lock = threading.Lock()
+        self.requests: list[str] = []
+        self.active: int = 0
+        self.max_active: int = 0
+        self.delay: float = 0.0
+        self.slow_delay: float = 1.0
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+def make_song(md5: str, filename: str = "") -> SimpleNamespace:
+    return SimpleNamespace(
+        song_file=SimpleNamespace(filename=filename or f"{md5}.mod", modulemd5=md5)
+    )
+
+
+class ScrapingTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = LookupServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(os.path.join(self.temp_dir.name, "cache"))
+        self.client = HttpClient(self.cache, max_per_host=4, min_interval=0.0, timeout=5.0)
+
+        for name, path in (
+            ("MODLAND_URL", "/modland"),
+            ("MODARCHIVE_URL", "/modarchive"),
+            ("MSM_URL", "/msm"),
+        ):
+            patcher = mock.patch.object(scraping, name, self.server.url(path))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+        self.temp_dir.cleanup()
+
+    def test_modland_author(self) -> None:
+        self.assertEqual(
+            scraping.scrape_modland(make_song("4b1d"), "Author", self.client), "4b1d"
+        )
+
+    def test_modarchive_author(self) -> None:
+        config_dir = os.path.join(self.temp_dir.name, "config")
+        os.makedirs(os.path.join(config_dir, "pyuade-test"))
+
+        with open(os.path.join(config_dir, "pyuade-test", "modarchive-api.key"), "w") as f:
+            f.write("secret\n")
+
+        with mock.patch.dict(os.environ, {"XDG_CONFIG_HOME": config_dir}):
+            author = scraping.scrape_modarchive(
+                "pyuade-test", make_song("c0ffee"), self.client
+            )
+
+        self.assertEqual(author, "c0ffee")
+        self.assertIn("key=secret", self.server.requests[0])
+
+    def test_msm_lookup(self) -> None:
+        filename = os.path.join(self.temp_dir.name, "song.mod")
+
+        with open(filename, "wb") as f:
+            f.write(b"module data")
+
+        sha1 = hashlib.sha1(b"module data").hexdigest()
+        data = scraping.scrape_msm(make_song("", filename), self.client)
+
+        self.assertEqual(data["name"], sha1)
+        self.assertEqual(data["urls"], ["http://example.com/a"])
+
+    def test_concurrent_fetches(self) -> None:
+        self.server.delay = 0.2
+        songs = [make_song(f"{i:04x}") for i in range(8)]
+
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            authors = list(
+                executor.map(
+                    lambda song: scraping.scrape_modland(song, "Author", self.client),
+                    songs,
+                )
+            )
+
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(authors, [song.song_file.modulemd5 for song in songs])
+
+        # Requests overlap, but no more than max_per_host at a time
+        self.assertGreater(self.server.max_active, 1)
+        self.assertLessEqual(self.server.max_active, 4)
+        self.assertLess(elapsed, len(songs) * self.server.delay)
+
+    def test_cached_response_skips_server(self) -> None:
+        song = make_song("beef")
+
+        self.assertEqual(scraping.scrape_modland(song, "Author", self.client), "beef")
+        self.assertEqual(scraping.scrape_modland(song, "Author", self.client), "beef")
+        self.assertEqual(len(self.server.requests), 1)
+
+        # A new client with the same cache directory doesn't ask again either
+        client = HttpClient(ResponseCache(self.cache.directory), min_interval=0.0)
+
+        try:
+            self.assertEqual(scraping.scrape_modland(song, "Author", client), "beef")
+        finally:
+            client.close()
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_error_status(self) -> None:
+        with mock.patch.object(scraping, "MODLAND_URL", self.server.url("/error/modland")):
+            self.assertEqual(
+                scraping.scrape_modland(make_song("dead"), "Author", self.client), ""
+            )
+            self.assertEqual(
+                scraping.scrape_modland(make_song("dead"), "Author", self.client), ""
+            )
+
+        # Failed responses are not cached
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_not_found(self) -> None:
+        self.assertIsNone(self.client.get(self.server.url("/missing")))
+
+    def test_timeout(self) -> None:
+        client = HttpClient(self.cache, min_interval=0.0, timeout=0.2)
+
+        try:
+            start = time.monotonic()
+            content = client.get(self.server.url("/slow/modland?qs=cafe"))
+            elapsed = time.monotonic() - start
+        finally:
+            client.close()
+
+        self.assertIsNone(content)
+        self.assertLess(elapsed, self.server.slow_delay)
+        self.assertIsNone(self.cache.get(self.server.url("/slow/modland?qs=cafe")))
+
+    def test_connection_refused(self) -> None:
+        # Nothing listens on the port anymore once the server is closed
+        url = self.server.url("/modland?qs=f00d")
+        self.server.shutdown()
+        self.server.server_close()
+
+        self.assertIsNone(self.client.get(url))
+
+
+if __name__ == "__main__":
+    unittest.main()
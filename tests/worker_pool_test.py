@@ -0,0 +1,56 @@
+import os
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+from worker_pool import WorkerPool
+
+CRASHING = 3
+
+
+# Runs in the workers, item CRASHING takes its process down like a libuade crash
+def square(item: int) -> int:
+    if item == CRASHING:
+        os._exit(1)
+
+    if item < 0:
+        raise ValueError("negative")
+
+    return item * item
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def test_results_in_order(self) -> None:
+        pool = WorkerPool(2)
+        results = list(pool.map(square, [5, 1, -1, 2], 4, lambda item: None))
+
+        self.assertEqual(
+            [(i, r) for i, r, _ in results], [(5, 25), (1, 1), (-1, None), (2, 4)]
+        )
+        self.assertIsInstance(results[2][2], ValueError)
+
+    def test_precomputed_results(self) -> None:
+        pool = WorkerPool(2)
+        results = list(pool.map(square, [1, 2], 4, lambda item: -item))
+
+        self.assertEqual([r for _, r, _ in results], [-1, -2])
+        self.assertIsNone(pool.executor)
+
+    def test_only_crashing_item_fails(self) -> None:
+        pool = WorkerPool(2)
+
+        # The crash fails the futures of 0 to 7, but only 3 is to blame
+        items = list(range(12))
+        results = list(pool.map(square, items, 8))
+
+        self.assertEqual([i for i, _, _ in results], items)
+
+        for item, result, error in results:
+            if item == CRASHING:
+                self.assertIsInstance(error, BrokenProcessPool)
+            else:
+                self.assertIsNone(error)
+                self.assertEqual(result, item * item)
+
+
+if __name__ == "__main__":
+    unittest.main()
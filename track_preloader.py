@@ -0,0 +1,123 @@
+from typing import Optional
+
+from loguru import logger
+from PySide6.QtCore import QThread, Signal
+
+from backend_probe import BackendProbe
+from player_backends.player_backend import PlayerBackend
+from sample_format import SampleFormat
+
+
+# Try the available player backends until one can load the module, in the order
+# suggested by backend_probe if given, preferred is tried first
+def load_player_backend(
+    player_backends: dict[str, type[PlayerBackend]],
+    filename: str,
+    backend_probe: Optional[BackendProbe] = None,
+    preferred: str = "",
+) -> tuple[str, Optional[PlayerBackend]]:
+    if backend_probe:
+        backend_names = backend_probe.order(filename, preferred)
+    else:
+        backend_names = list(player_backends)
+
+    for backend_name in backend_names:
+        logger.debug(f"Trying player backend: {backend_name}")
+
+        player_backend = player_backends[backend_name]()
+        if player_backend is not None:
+            if player_backend.load_module(filename):
+                if backend_probe:
+                    backend_probe.remember(filename, backend_name)
+                return backend_name, player_backend
+    return "", None
+
+
+# Next track with its backend loaded and first chunks already rendered
+class PreloadedTrack:
+    def __init__(self, row: int, filename: str, preferred_backend: str = "") -> None:
+        self.row: int = row
+        self.filename: str = filename
+        self.preferred_backend: str = preferred_backend
+        self.backend_name: str = ""
+        self.player_backend: Optional[PlayerBackend] = None
+        self.chunks: list[bytes] = []
+
+    def free(self) -> None:
+        if self.player_backend:
+            self.player_backend.free_module()
+            self.player_backend = None
+        self.chunks = []
+
+
+# Prepares the next playlist entry while the current one is playing, so
+# PlayerThread can switch over without a gap
+class TrackPreloader(QThread):
+    preloaded = Signal(object)  # PreloadedTrack
+
+    log_prefix = "[TrackPreloader] "
+
+    def __init__(
+        self,
+        parent,
+        player_backends: dict[str, type[PlayerBackend]],
+        backend_probe: BackendProbe,
+        track: PreloadedTrack,
+        samplerate: int,
+        buffersize: int,
+        sample_format: SampleFormat = SampleFormat.INT16_STEREO,
+        prerender_chunks: int = 4,
+    ) -> None:
+        super().__init__(parent)
+
+        self.player_backends = player_backends
+        self.backend_probe = backend_probe
+        self.track = track
+        self.samplerate = samplerate
+        self.buffersize = buffersize
+        self.sample_format = sample_format
+        self.prerender_chunks = prerender_chunks
+
+    def run(self) -> None:
+        track = self.track
+
+        try:
+            track.backend_name, track.player_backend = load_player_backend(
+                self.player_backends,
+                track.filename,
+                self.backend_probe,
+                track.preferred_backend,
+            )
+        except Exception as e:
+            logger.error(f"{self.log_prefix}Loading {track.filename} failed: {e}")
+            return
+
+        if not track.player_backend:
+            logger.warning(f"{self.log_prefix}No player backend for {track.filename}")
+            return
+
+        # The track can only follow gaplessly if it renders in the format the
+        # audio stream is open with
+        if self.sample_format not in track.player_backend.get_sample_formats():
+            logger.debug(
+                f"{self.log_prefix}{track.backend_name} can't render {self.sample_format.name}"
+            )
+            track.free()
+            return
+
+        track.player_backend.set_sample_format(self.sample_format)
+
+        chunk = bytearray(self.buffersize * self.sample_format.frame_size)
+        chunk_view = memoryview(chunk)
+
+        for _ in range(self.prerender_chunks):
+            count = track.player_backend.read_chunk_into(self.samplerate, chunk_view)
+
+            if count == 0:
+                break
+            track.chunks.append(bytes(chunk_view[:count]))
+
+        logger.debug(
+            f"{self.log_prefix}Preloaded {track.filename} with {track.backend_name}"
+        )
+        self.preloaded.emit(track)
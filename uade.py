@@ -1,10 +1,14 @@
+import time
 from ctypes import byref, c_char, c_size_t, c_ubyte, c_void_p
+from typing import Optional
 
 from loguru import logger
 from PySide6 import QtCore
 from PySide6.QtCore import QObject, Signal
 
+from file_cache import c_buffer, file_cache
 from player_backends.libuade.ctypes_classes import (
+    UADE_BYTES_PER_FRAME,
     UADE_MAX_MESSAGE_SIZE,
     UADE_NOTIFICATION_TYPE,
     UADE_SEEK_MODE,
@@ -48,6 +52,9 @@ class SongFile:
         self.content: bool
         self.ext: str = ""
 
+        # Name of the player backend that played this file last
+        self.player_backend: str = ""
+
         self.subsong_data: SubsongData = SubsongData()
 
 
@@ -56,6 +63,10 @@ class Subsong:
     def __init__(self) -> None:
         self.nr: int = 0
         self.bytes: int = 0
+        # Length in bytes is determined later on (see LengthResolver)
+        self.deferred: bool = False
+        # Measuring ran out of time budget, bytes is only a lower bound
+        self.estimated: bool = False
 
 
 # Represents a specific subsong of a song as playable in the playlist
@@ -64,6 +75,120 @@ class Song:
         self.song_file: SongFile
         self.subsong: Subsong
 
+    def length_unknown(self) -> bool:
+        return hasattr(self, "subsong") and getattr(self.subsong, "deferred", False)
+
+    def length_estimated(self) -> bool:
+        return hasattr(self, "subsong") and getattr(self.subsong, "estimated", False)
+
+
+# Detects when rendered output starts repeating itself (i.e. the song loops) by
+# taking signatures of the output in regular intervals and looking for them in
+# the output that follows
+#
+# Every signature is searched for in every chunk, so their number is capped:
+# once max_signatures are taken, every other one is dropped and the interval
+# doubles. Long songs cost the same per chunk as short ones, the detected loop
+# offset is just up to one (larger) interval late.
+class LoopDetector:
+    def __init__(
+        self,
+        interval: int,
+        min_period: int,
+        signature_len: int = 16384,
+        max_signatures: int = 64,
+    ) -> None:
+        # All offsets are byte offsets into the rendered output
+        self.interval = interval
+        self.min_period = max(min_period, signature_len)
+        self.signature_len = signature_len
+        self.max_signatures = max_signatures
+
+        self.signatures: list[tuple[int, bytes]] = []
+        self.next_signature: int = interval
+
+        # Output window, the tail of the previous chunk is kept so signatures
+        # spanning chunk boundaries can be found
+        self.window = bytearray()
+        self.window_offset: int = 0
+
+        # Repeat of signature (index, offset of repeat) waiting for confirmation
+        self.candidate: Optional[tuple[int, int]] = None
+
+    def is_silent(self, signature: bytes) -> bool:
+        # Silence and plain DC would match anywhere
+        return len(set(signature[::64])) < 8
+
+    # Feed rendered output, returns the offset where the output starts to repeat
+    # once a loop has been confirmed
+    def feed(self, data: bytes | memoryview) -> Optional[int]:
+        keep = self.signature_len - 1
+
+        if len(self.window) > keep:
+            self.window_offset += len(self.window) - keep
+            del self.window[:-keep]
+
+        self.window += data
+        window_end = self.window_offset + len(self.window)
+
+        # Confirm a candidate by checking the signature following the repeated one
+        if self.candidate:
+            index, found = self.candidate
+
+            if index + 1 >= len(self.signatures):
+                self.candidate = None
+                return found
+
+            offset, signature = self.signatures[index + 1]
+            expected = found + offset - self.signatures[index][0]
+
+            if expected + self.signature_len <= window_end:
+                start = expected - self.window_offset
+                self.candidate = None
+
+                if (
+                    start >= 0
+                    and self.window[start : start + self.signature_len] == signature
+                ):
+                    return found
+
+        # Look for repeats of earlier signatures, keep the earliest one
+        if not self.candidate:
+            earliest = -1
+
+            for index, (offset, signature) in enumerate(self.signatures):
+                start = max(offset + self.min_period - self.window_offset, 0)
+
+                if start + self.signature_len > len(self.window):
+                    continue
+
+                position = self.window.find(signature, start)
+
+                if position >= 0 and (
+                    earliest < 0 or position + self.window_offset < earliest
+                ):
+                    earliest = position + self.window_offset
+                    self.candidate = (index, earliest)
+
+        # Take new signatures
+        while self.next_signature + self.signature_len <= window_end:
+            start = self.next_signature - self.window_offset
+
+            if start >= 0:
+                signature = bytes(self.window[start : start + self.signature_len])
+
+                if not self.is_silent(signature):
+                    self.signatures.append((self.next_signature, signature))
+
+            self.next_signature += self.interval
+
+        # The candidate refers to signatures by index, thin out once it's settled
+        if len(self.signatures) > self.max_signatures and not self.candidate:
+            del self.signatures[1::2]
+            self.interval *= 2
+
+        return None
+
 
 class Uade(QObject):
     song_end = Signal()
@@ -74,6 +199,13 @@ class Uade(QObject):
     buf_len = 8192
     buf = (c_char * buf_len)()
 
+    # Output of length scans is discarded, so render in much bigger chunks
+    scan_buf_len = 1 << 18
+    scan_buf = (c_char * scan_buf_len)()
+
+    # Workaround: If the song is longer than 10 min, we’re probably looping forever
+    max_subsong_seconds = 60 * 10
+
     seek_position = 0
 
     def __init__(self):
@@ -144,19 +276,25 @@ class Uade(QObject):
     def position_changed(self, seconds: float):
         self.seek_seconds(seconds)
 
-    def scan_subsong(self, song_file: SongFile, subsong_nr: int) -> Subsong:
+    def scan_subsong(
+        self, song_file: SongFile, subsong_nr: int, deadline: float = 0.0
+    ) -> Subsong:
         self.state = libuade.uade_new_state(None)
 
-        size = c_size_t()
-
-        ret = libuade.uade_read_file(byref(size), str.encode(song_file.filename))
-
-        if not ret:
+        try:
+            data = file_cache.get(song_file.filename)
+        except OSError:
             raise ValueError(f"Can not read file")
 
         subsong = Subsong()
 
-        match libuade.uade_play(str.encode(song_file.filename), subsong_nr, self.state):
+        match libuade.uade_play_from_buffer(
+            str.encode(song_file.filename),
+            c_buffer(data),
+            len(data),
+            subsong_nr,
+            self.state,
+        ):
             case -1:
                 # Fatal error
                 raise RuntimeError(f"Fatal error")
@@ -164,39 +302,89 @@ class Uade(QObject):
                 # Not playable
                 raise ValueError(f"Not playable")
             case 1:
-                nbytes = 1
+                subsong.nr = subsong_nr
 
-                last_subsongbytes = 0
+                try:
+                    subsong.bytes, subsong.estimated = self.measure_subsong(
+                        subsong_nr, deadline
+                    )
+                finally:
+                    libuade.uade_cleanup_state(self.state)
 
-                songinfo = libuade.uade_get_song_info(self.state).contents
+                if subsong.estimated:
+                    logger.warning(
+                        f"Time budget exceeded while scanning {song_file.filename}, subsong {subsong_nr}"
+                    )
 
-                # last_hash: int = 0
+        return subsong
 
-                # Determine length of subsong
+    # Determine length of currently playing subsong in bytes and whether it was
+    # cut off at deadline, which makes it only a lower bound
+    def measure_subsong(
+        self, subsong_nr: int, deadline: float = 0.0
+    ) -> tuple[int, bool]:
+        songinfo = libuade.uade_get_song_info(self.state).contents
 
-                while nbytes > 0 and songinfo.subsongs.cur == subsong_nr:
-                    last_subsongbytes = songinfo.subsongbytes
+        bytes_per_second = UADE_BYTES_PER_FRAME * libuade.uade_get_sampling_rate(
+            self.state
+        )
 
-                    nbytes = libuade.uade_read(self.buf, self.buf_len, self.state)
+        # Length from UADE's song length database, no need to emulate
+        if songinfo.duration > 0:
+            return int(songinfo.duration * bytes_per_second), False
 
-                    if nbytes < 0:
-                        raise RuntimeError("Playback error.")
-                    elif nbytes == 0:
-                        raise EOFError("Song end.")
+        max_bytes = bytes_per_second * self.max_subsong_seconds
 
-                    # self.check_notifications()
-                    # event = self.get_event(self.state)
+        loop_detector = LoopDetector(
+            interval=bytes_per_second * 2, min_period=bytes_per_second * 4
+        )
 
-                    # Workaround: If the song is longer than 10 min, we’re probably looping forever
-                    if last_subsongbytes >= 176400 * 60 * 10:
-                        break
+        notification = uade_notification()
+        subsongbytes = 0
+        cut_off = False
 
-                libuade.uade_cleanup_state(self.state)
+        while songinfo.subsongs.cur == subsong_nr and subsongbytes < max_bytes:
+            nbytes = libuade.uade_read(self.scan_buf, self.scan_buf_len, self.state)
 
-                subsong.nr = subsong_nr
-                subsong.bytes = last_subsongbytes
+            if nbytes < 0:
+                raise RuntimeError("Playback error.")
+            elif nbytes == 0:
+                break
 
-        return subsong
+            subsongbytes = songinfo.subsongbytes
+
+            song_end = False
+
+            while libuade.uade_read_notification(notification, self.state) == 1:
+                if (
+                    notification.type
+                    == UADE_NOTIFICATION_TYPE.UADE_NOTIFICATION_SONG_END
+                ):
+                    song_end = True
+                    end_bytes = (
+                        notification.uade_notification_union.song_end.subsongbytes
+                    )
+
+                    if end_bytes > 0:
+                        subsongbytes = end_bytes
+
+                libuade.uade_cleanup_notification(notification)
+
+            if song_end:
+                break
+
+            loop_offset = loop_detector.feed(memoryview(self.scan_buf)[:nbytes])
+
+            if loop_offset is not None:
+                logger.debug(f"Loop detected after {loop_offset / bytes_per_second:.1f} s")
+                subsongbytes = loop_offset
+                break
+
+            if deadline and time.monotonic() >= deadline:
+                cut_off = True
+                break
+
+        return min(subsongbytes, max_bytes), cut_off
 
     # Scan song file and return representation of that song
 
@@ -207,16 +395,16 @@ class Uade(QObject):
 
         # samplerate = libuade.uade_get_sampling_rate(self.state)
 
-        size = c_size_t()
-
-        ret = libuade.uade_read_file(byref(size), str.encode(filename))
-
-        if not ret:
+        try:
+            data = file_cache.get(filename)
+        except OSError:
             raise ValueError(f"Can not read file {filename}")
 
         song_file = SongFile()
 
-        match libuade.uade_play(str.encode(filename), -1, self.state):
+        match libuade.uade_play_from_buffer(
+            str.encode(filename), c_buffer(data), len(data), -1, self.state
+        ):
             case -1:
                 # Fatal error
                 libuade.uade_cleanup_state(self.state)
@@ -268,11 +456,18 @@ class Uade(QObject):
 
         return song_file
 
-    def split_subsongs(self, song_file: SongFile) -> list[Song]:
+    # Split song file into its subsongs, time_budget limits the time in seconds
+    # spent on determining subsong lengths for the whole file (0 = no limit),
+    # with measure set to False subsong lengths are left to be determined later
+    def split_subsongs(
+        self, song_file: SongFile, time_budget: float = 0.0, measure: bool = True
+    ) -> list[Song]:
         # libuade.uade_cleanup_state(self.state)
 
         songs: list[Song] = []
 
+        deadline = time.monotonic() + time_budget if time_budget > 0 else 0.0
+
         if max(song_file.subsong_data.min, song_file.subsong_data.max) <= 1:
             song: Song = Song()
             song.song_file = song_file
@@ -292,8 +487,17 @@ class Uade(QObject):
                 subsong: Song = Song()
                 subsong.song_file = song_file
 
+                # Subsongs the budget doesn't cover anymore are left for later
+                # instead of being cut off right at the start
+                if not measure or (deadline and time.monotonic() >= deadline):
+                    subsong.subsong = Subsong()
+                    subsong.subsong.nr = s
+                    subsong.subsong.deferred = True
+                    songs.append(subsong)
+                    continue
+
                 try:
-                    s = self.scan_subsong(song_file, s)
+                    s = self.scan_subsong(song_file, s, deadline)
 
                     if s:
                         subsong.subsong = s
@@ -316,11 +520,9 @@ class Uade(QObject):
 
         samplerate = libuade.uade_get_sampling_rate(self.state)
 
-        size = c_size_t()
-
-        ret = libuade.uade_read_file(byref(size), str.encode(song.song_file.filename))
-
-        if not ret:
+        try:
+            data = file_cache.get(song.song_file.filename)
+        except OSError:
             raise ValueError(f"Can not read file {song.song_file.filename}")
 
         subsong_nr = -1
@@ -328,8 +530,12 @@ class Uade(QObject):
         if hasattr(song, "subsong"):
             subsong_nr = song.subsong.nr
 
-        match libuade.uade_play(
-            str.encode(song.song_file.filename), subsong_nr, self.state
+        match libuade.uade_play_from_buffer(
+            str.encode(song.song_file.filename),
+            c_buffer(data),
+            len(data),
+            subsong_nr,
+            self.state,
         ):
             case -1:
                 # Fatal error
@@ -0,0 +1,149 @@
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+
+# Worker processes for scanning and rendering that survive a worker crashing
+# (e.g. libuade taking its process down), which breaks a ProcessPoolExecutor
+# and fails every future submitted to it
+class WorkerPool:
+    log_prefix = "[WorkerPool] "
+
+    def __init__(
+        self,
+        workers: int,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+    ) -> None:
+        self.workers = workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def create_executor(self, workers: int) -> ProcessPoolExecutor:
+        # Don't fork the GUI process, start fresh interpreters instead
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer,
+            initargs=self.initargs,
+        )
+
+    # Raises BrokenProcessPool if a worker crashed since the last restart
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        # Only start worker processes once there is work
+        if not self.executor:
+            logger.debug(f"{self.log_prefix}Starting {self.workers} workers")
+            self.executor = self.create_executor(self.workers)
+
+        return self.executor.submit(fn, *args)
+
+    # Like submit, but a broken pool is reported through the future
+    def submit_or_fail(self, fn: Callable, *args: Any) -> Future:
+        try:
+            return self.submit(fn, *args)
+        except BrokenProcessPool as e:
+            future: Future = Future()
+            future.set_exception(e)
+            return future
+
+    # Workers are started again with the next submit
+    def restart(self) -> None:
+        logger.warning(f"{self.log_prefix}Worker crashed, restarting workers")
+        self.shutdown()
+
+    # Run fn in a worker of its own, raises BrokenProcessPool if it crashes that
+    # worker too, which makes it the one to blame for a crash
+    def run_isolated(self, fn: Callable, *args: Any) -> Any:
+        executor = self.create_executor(1)
+
+        try:
+            return executor.submit(fn, *args).result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # Call fn for each item in parallel and yield (item, result, error) in the
+    # order of items, error is None on success
+    #
+    # precomputed may return the result for an item without a worker (None if
+    # there is none). When a worker crashes, the oldest pending item is run on its
+    # own to find out whether it caused the crash, only then it fails, all other
+    # pending items are resubmitted to new workers.
+    def map(
+        self,
+        fn: Callable[[T], Any],
+        items: Iterable[T],
+        look_ahead: int,
+        precomputed: Optional[Callable[[T], Any]] = None,
+    ) -> Iterator[tuple[T, Any, Optional[Exception]]]:
+        pending: deque[tuple[T, Future]] = deque()
+        item_iter = iter(items)
+        exhausted = False
+
+        try:
+            while True:
+                while not exhausted and len(pending) < look_ahead:
+                    try:
+                        item = next(item_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+
+                    result = precomputed(item) if precomputed else None
+
+                    if result is None:
+                        future = self.submit_or_fail(fn, item)
+                    else:
+                        future = Future()
+                        future.set_result(result)
+
+                    pending.append((item, future))
+
+                if not pending:
+                    break
+
+                item, future = pending.popleft()
+                error: Optional[Exception] = None
+
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    self.resubmit(fn, pending)
+
+                    try:
+                        result = self.run_isolated(fn, item)
+                    except BrokenProcessPool as e:
+                        logger.error(f"{self.log_prefix}{item} crashes the worker")
+                        result, error = None, e
+                    except Exception as e:
+                        result, error = None, e
+                except Exception as e:
+                    result, error = None, e
+
+                yield item, result, error
+        finally:
+            self.shutdown()
+
+    # Start new workers and resubmit the pending items a crash took down with it,
+    # results that were already complete are kept
+    def resubmit(self, fn: Callable, pending: deque[tuple[T, Future]]) -> None:
+        self.restart()
+
+        for i, (item, future) in enumerate(pending):
+            if (
+                not future.done()
+                or future.cancelled()
+                or isinstance(future.exception(), BrokenProcessPool)
+            ):
+                pending[i] = (item, self.submit_or_fail(fn, item))
+
+    def shutdown(self) -> None:
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None